@@ -1,92 +1,3503 @@
+import time
+STARTUP_T0 = time.perf_counter()  # [新增] 启动耗时统计的起点 (尽量早)
 import sys
 import os
 import json
 import subprocess
 import threading
-import time
-import webbrowser
-from datetime import date
+import codecs
+import uuid
+import re
+import hashlib
+import glob
+import shlex
+import shutil
+import gzip
+import math
+import heapq
+import signal
+import copy
+import mmap
+# [修改] sqlite3 / zipfile / ast / http.client / concurrent.futures / webbrowser 改为用到时才导入 (实测约省 30 ms);
+# 导入阶段的大头是 PySide6 (约 90 ms), 界面类都继承 Qt 控件, 无法推迟, 各阶段实测见 startup_profile.txt
+from array import array
+from collections import deque
+from datetime import date, datetime, timedelta, timezone
 from PySide6.QtWidgets import (QApplication, QWidget, QVBoxLayout, QHBoxLayout, 
                                QPushButton, QLabel, QLineEdit, QMessageBox, 
                                QGroupBox, QCheckBox, QFrame, QDialog, QComboBox, 
-                               QDateEdit, QTextEdit)
-from PySide6.QtGui import QTextCursor, QFont
-from PySide6.QtCore import Qt, Signal, QThread, Slot, QDate
+                               QDateEdit, QTextEdit, QPlainTextEdit, QTableWidget,
+                               QTableWidgetItem, QAbstractItemView, QHeaderView, QListWidget,
+                               QListWidgetItem, QSpinBox, QSplitter, QGridLayout)
+from PySide6.QtGui import QTextCursor, QFont, QPainter, QPen, QColor
+from PySide6.QtCore import Qt, Signal, QThread, Slot, QDate, QTimer, QObject, QFileSystemWatcher, QEventLoop, QPointF
+
+# ==========================================
+# 0. 基础配置与路径
+# ==========================================
+def get_app_path():
+    """获取程序运行时的绝对路径 (兼容 EXE 和 Python 脚本)"""
+    if getattr(sys, 'frozen', False):
+        # [修改] 目录版打包后 exe 在 kq4 文件夹里, 文件夹放在 freqtrade 根目录下: exe 旁边没有 docker-compose.yml 时取上一级
+        exe_dir = os.path.dirname(sys.executable)
+        parent = os.path.dirname(exe_dir)
+        if not os.path.exists(os.path.join(exe_dir, "docker-compose.yml")) and os.path.exists(os.path.join(parent, "docker-compose.yml")):
+            return parent
+        return exe_dir
+    else:
+        return os.path.dirname(os.path.abspath(__file__))
+
+APP_ROOT = get_app_path()
+USER_DATA_DIR = os.path.join(APP_ROOT, "user_data")
+STRATEGY_DIR = os.path.join(USER_DATA_DIR, "strategies")
+CONFIG_PATH = os.path.join(USER_DATA_DIR, "config.json")
+# [新增] 历史记录文件路径
+HISTORY_PATH = os.path.join(USER_DATA_DIR, "pairs_history.json")
+# [新增] 任务完整日志落盘目录
+LOG_DIR = os.path.join(USER_DATA_DIR, "logs")
+JOB_LOG_DIR = os.path.join(LOG_DIR, "jobs")  # [新增] 每个任务一个目录: 分段日志 + index.json
+STARTUP_PROFILE_PATH = os.path.join(LOG_DIR, "startup_profile.txt")  # [新增] 最近一次启动的分阶段耗时
+# [新增] 实验室任务队列 (重启后恢复)
+JOBS_PATH = os.path.join(USER_DATA_DIR, "lab_jobs.json")
+
+# [新增] 回测结果缓存 (按策略/配置/时间/币种/数据内容寻址)
+CACHE_DIR = os.path.join(USER_DATA_DIR, "kq4_cache")
+CACHE_MAX_MB = 2048
+BACKTEST_RESULTS_DIR = os.path.join(USER_DATA_DIR, "backtest_results")
+DATA_DIR = os.path.join(USER_DATA_DIR, "data")
+
+# [新增] 增量下载规划: 交易所单次请求返回的K线数量 (用于估算节省的请求数)
+DL_CANDLE_LIMIT = 1000
+
+# [新增] 分片并行下载: 下载任务以 I/O 为主, 不占用 CPU 并发名额, 单独限制并行数;
+# 各交易所每秒请求预算由同时运行的分片平分 (通过 ccxt rateLimit 配置片段实现)
+DL_MAX_PARALLEL = 4
+DL_SHARD_PAIRS = 10
+DL_DEFAULT_RATE = 5
+EXCHANGE_RATE_BUDGET = {"binance": 20, "bybit": 10, "okx": 10, "gate": 10, "kucoin": 10, "bitget": 10}
+SHARD_DIR = os.path.join(USER_DATA_DIR, "kq4_shards")
+
+# [新增] 滚动窗口优化 (Walk-forward): 每次运行一个目录, 保存进度检查点与各窗口参数
+WF_DIR = os.path.join(USER_DATA_DIR, "kq4_walkforward")
+
+# [新增] 回测/优化结果索引 (SQLite), 按文件 修改时间/大小/哈希 增量导入
+RESULTS_DB = os.path.join(USER_DATA_DIR, "kq4_results.sqlite")
+HYPEROPT_RESULTS_DIR = os.path.join(USER_DATA_DIR, "hyperopt_results")
+RESULT_BROWSER_LIMIT = 500  # 结果浏览器每次最多显示的运行数
+# [新增] 优化结果流式读取: 只在有界堆中保留前 N 个 epoch, 选中的参数写入此目录供回测使用
+FTHYPT_TOP_N = 20
+FTHYPT_PROGRESS_LINES = 2000  # 每读这么多行报告一次进度
+PARAMS_DIR = os.path.join(USER_DATA_DIR, "kq4_params")
+# [新增] 交易分析: 滚动指标的窗口天数, 基准测试的模拟交易数
+ROLLING_DAYS = 30
+ANALYTICS_BENCH_TRADES = 100_000
+# [新增] 策略索引: AST 解析结果按 修改时间/大小/哈希 缓存, 文件变化后防抖刷新
+STRATEGY_INDEX_PATH = os.path.join(USER_DATA_DIR, "kq4_strategy_index.json")
+STRATEGY_WATCH_DEBOUNCE_MS = 300
+# [新增] 配置存储: 连续修改合并为一次写入的防抖毫秒数
+CONFIG_WRITE_DEBOUNCE_MS = 300
+
+# [新增] 基准测试: 基线文件, 回归判定的相对容差, 各项默认规模
+BENCH_BASELINE_PATH = os.path.join(USER_DATA_DIR, "kq4_bench_baseline.json")
+BENCH_TOLERANCE = 0.25
+BENCH_LOG_LINES = 200_000
+BENCH_LINE_BYTES = 120
+BENCH_ROUNDS = 3
+BENCH_STATUS_EVENTS = 200
+BENCH_STARTUP_RUNS = 3
+BENCH_PROBE_MS = 10
+
+# 程序自身的状态文件, 不是 freqtrade 配置
+APP_STATE_FILES = (HISTORY_PATH, JOBS_PATH, STRATEGY_INDEX_PATH, BENCH_BASELINE_PATH)
+
+# [新增] 常驻容器池: 用 docker exec 派发命令, 每个容器执行 N 个任务或配置/策略变化后重建
+WARM_POOL_SIZE = 2
+WARM_MAX_JOBS = 20
+WARM_PREFIX = "kq4_warm"
+COMPOSE_RUN_PREFIX = "docker compose run --rm freqtrade "
+
+# [新增] 任务调度参数: 并发数按 CPU 核数与内存估算, 每个任务约占 2 核 / 2GB
+JOB_CORES = 2
+JOB_MEM_GB = 2
+JOB_HISTORY_MAX = 50  # 已结束任务最多保留条数
+JOB_PRIORITIES = [("普通", 1), ("高", 0), ("低", 2)]
+# [新增] 资源调度: 为实盘机器人 (docker compose up -d) 预留的 CPU/内存, 实验室任务只分配剩余部分
+LIVE_RESERVE_CORES = 1
+LIVE_RESERVE_MEM_GB = 1
+JOB_CONTAINER_PREFIX = "kq4_job"
+LIMIT_APPLY_TIMEOUT = 120  # 等待任务容器创建的最长秒数, 创建后才能设置资源上限
+JOB_CANCEL_GRACE = 10  # 程序退出时等待被取消任务的线程结束的秒数
+JOB_STATUS_TEXT = {"queued": "⏳ 排队", "running": "▶ 运行中", "done": "✅ 完成",
+                   "failed": "❌ 失败", "cancelled": "⏹ 已取消"}
+
+# [新增] 日志管线参数: 工作线程合并读取, 界面按固定帧率刷新, 日志框只保留最近 N 行
+# 每帧最多渲染 LOG_FRAME_MAX_LINES 行, 输出洪峰时只显示最新部分 (完整内容在磁盘日志中)
+LOG_FLUSH_MS = 40
+LOG_FRAME_MAX_LINES = 500
+LOG_VIEW_MAX_LINES = 5000
+LOG_READ_CHUNK = 65536
+
+# [新增] 任务日志归档: 单段大小上限 (超过后轮转并 gzip 压缩), 行偏移索引间隔, 保留策略, 搜索结果上限
+LOG_SEGMENT_BYTES = 4 * 1024 * 1024
+LOG_INDEX_STRIDE = 1000
+LOG_INDEX_SAVE_SEC = 5  # 写入中的日志每隔几秒保存一次 index.json, 程序崩溃后索引也不会太旧
+LOG_RETENTION_DAYS = 30
+LOG_RETENTION_MB = 512
+LOG_SEARCH_MAX_HITS = 1000
+LOG_CONTEXT_LINES = 40
+
+# [新增] 实时日志 (docker compose logs -f): 内存中最多保留的行数、首次连接时回看的行数、过滤输入防抖
+LOG_TAIL_MAX_LINES = 20000
+LOG_TAIL_INITIAL = 200
+LOG_FILTER_DEBOUNCE_MS = 250
+
+# [新增] 无界面模式 (命令行 / 本地 HTTP): 默认下载周期与实验室界面一致, HTTP 只监听本机
+HEADLESS_TIMEFRAMES = ["1m", "5m", "15m", "1h", "4h", "1d"]
+HEADLESS_PORT = 8765
+
+# [新增] 机器人 REST 接口: 轮询间隔、请求超时、各接口缓存秒数、出错后的最长退避秒数
+API_POLL_SEC = 5
+API_TIMEOUT = 3
+API_TTL = {"status": 5, "profit": 15, "balance": 30, "daily": 60}
+API_BACKOFF_MAX = 60
+API_WORKERS = 3  # 并发请求的线程数, 每个线程一条长连接
+
+# [新增] Docker 状态引擎参数: 事件流断线后按指数退避重连, 退避期间降级为轮询
+STATUS_POLL_SEC = 3
+STATUS_BACKOFF_MAX = 30
+STATUS_STREAM_HEALTHY = 30  # 事件流持续这么久才算稳定, 退避时间清零
+
+# [新增] 容器资源遥测 (一条 docker stats 数据流): 每个容器保留的采样点数, 内存告警阈值与解除阈值 (滞回, %),
+# 容器停止多少秒后从面板移除, 界面合并刷新的毫秒数
+TELEMETRY_HISTORY = 120
+TELEMETRY_MEM_ALERT = 90
+TELEMETRY_MEM_CLEAR = 80
+TELEMETRY_STALE_SEC = 10
+TELEMETRY_REFRESH_MS = 250
+
+# [新增] 优化进度遥测: 最优 Loss 曲线保留的点数, 早停默认耐心轮数, 早停时等待 freqtrade 自行退出的秒数
+HYPEROPT_TRAJECTORY_MAX = 200
+HYPEROPT_PATIENCE = 200
+HYPEROPT_STOP_GRACE = 30
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+# 非 Windows 平台没有 CREATE_NO_WINDOW
+NO_WINDOW = getattr(subprocess, "CREATE_NO_WINDOW", 0)
+
+# --- 样式表 ---
+STYLE_LIGHT_ON = "background-color: #2ecc71; border-radius: 10px; border: 2px solid #27ae60;" 
+STYLE_LIGHT_OFF = "background-color: #e74c3c; border-radius: 10px; border: 2px solid #c0392b;" 
+# [新增] 单个服务的状态样式
+STYLE_SVC_OK = "color: #27ae60; font-weight: bold;"
+STYLE_SVC_WARN = "color: #e67e22; font-weight: bold;"
+STYLE_SVC_OFF = "color: #c0392b; font-weight: bold;"
+SERVICE_RUNNING_STATES = ("running", "healthy", "starting", "unhealthy")
+SERVICE_STATE_TEXT = {
+    "running": ("运行中", STYLE_SVC_OK), "healthy": ("健康", STYLE_SVC_OK),
+    "starting": ("启动中", STYLE_SVC_WARN), "unhealthy": ("不健康", STYLE_SVC_WARN),
+    "restarting": ("重启中", STYLE_SVC_WARN), "paused": ("已暂停", STYLE_SVC_WARN),
+    "exited": ("已停止", STYLE_SVC_OFF), "removed": ("已移除", STYLE_SVC_OFF),
+    "unknown": ("未知", STYLE_SVC_OFF),
+}
+STYLE_BTN_GREEN = "background-color: #dff0d8; color: #3c763d; font-weight: bold;"
+STYLE_BTN_BLUE = "background-color: #d9edf7; color: #31708f; font-weight: bold;"
+STYLE_BTN_PURPLE = "background-color: #e8daef; color: #8e44ad; font-weight: bold;"
+STYLE_BTN_ORANGE = "background-color: #f39c12; color: white; font-weight: bold;"
+STYLE_BTN_RED = "background-color: #ffcccc; color: #cc0000; font-weight: bold; font-size: 11pt;"
+
+# ==========================================
+# 1. 后台任务线程 (执行回测/下载/优化)
+# ==========================================
+class LogBuffer:
+    """线程安全的日志缓冲: 工作线程批量写入, 界面定时取出; 完整日志同时写入磁盘 (JobLog 分段归档)"""
+    def __init__(self, spill_path=None, max_pending=LOG_FRAME_MAX_LINES):
+        self._lock = threading.Lock()
+        self._pending = deque(maxlen=max_pending)
+        self.total = 0
+        self.dropped = 0  # 界面来不及显示而丢弃的行数 (磁盘日志中仍完整保留)
+        self.spill_path = spill_path
+        self._spill = JobLog(spill_path) if spill_path else None
+
+    def push(self, text):
+        self.push_many(text.split("\n"))
+
+    def push_many(self, lines):
+        if not lines: return
+        with self._lock:
+            overflow = len(self._pending) + len(lines) - self._pending.maxlen
+            if overflow > 0: self.dropped += overflow
+            self._pending.extend(lines)
+            self.total += len(lines)
+            if self._spill:
+                self._spill.write_lines(lines)
+
+    def drain(self):
+        """取出所有待显示的行 (界面线程调用)"""
+        with self._lock:
+            lines = list(self._pending)
+            self._pending.clear()
+        return lines
+
+    def close(self):
+        with self._lock:
+            if self._spill:
+                self._spill.close()
+                self._spill = None
+
+
+# freqtrade 自身的日志行 (以时间戳开头), 用于测量启动到首行输出的延迟
+FT_LOG_LINE = re.compile(r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d")
+
+def stream_command(cmd, on_lines, on_start=None):
+    """
+    运行命令 (stderr 合并到 stdout), 按块读取输出: 每次取走管道中已有的全部输出, 拆行后一次性交给 on_lines。
+    on_start(process) 在进程启动后立即调用。界面工作线程与无界面模式共用, 返回退出码。
+    """
+    # 独立进程组/会话, 取消时可以结束整个进程树 (shell + docker CLI)
+    process = subprocess.Popen(
+        cmd, 
+        shell=True, 
+        cwd=APP_ROOT, 
+        stdout=subprocess.PIPE, 
+        stderr=subprocess.STDOUT, 
+        creationflags=NO_WINDOW,
+        start_new_session=(sys.platform != "win32")
+    )
+    if on_start: on_start(process)
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    carry = ""
+    while True:
+        chunk = process.stdout.read1(LOG_READ_CHUNK)
+        if not chunk:
+            break
+        lines = (carry + decoder.decode(chunk)).split("\n")
+        carry = lines.pop()
+        on_lines([l.rstrip() for l in lines])
+    carry += decoder.decode(b"", final=True)
+    if carry.strip():
+        on_lines([carry.rstrip()])
+    return process.wait()
+
+def kill_process_tree(p, sig=None):
+    """结束进程 p 及其子进程 (可从任意线程调用); sig 为 None 时强制结束"""
+    if not p or p.poll() is not None: return
+    try:
+        if sys.platform == "win32":
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(p.pid)], capture_output=True,
+                           creationflags=NO_WINDOW)
+        else:
+            os.killpg(p.pid, sig or signal.SIGKILL)
+    except OSError: pass
+
+class DockerWorker(QThread):
+    finish_signal = Signal()
+
+    def __init__(self, cmd, log_path=None, prepare=None, spill=True, max_pending=LOG_FRAME_MAX_LINES):
+        super().__init__()
+        self.cmd = cmd
+        self.prepare = prepare  # 可选: 在工作线程中执行的准备步骤, 返回 (最终命令, 启动类型)
+        self.start_kind = "cold"
+        self.first_output = None  # 启动到 freqtrade 首行日志的秒数
+        self.line_hooks = []  # 在工作线程中逐块接收新行的回调 (解析导出文件、进度等)
+        self.returncode = None
+        self.process = None
+        self.cancelled = False
+        if log_path is None and spill:
+            log_path = os.path.join(JOB_LOG_DIR, f"lab_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        self.log = LogBuffer(log_path if spill else None, max_pending)
+
+    def run(self):
+        try:
+            started = time.monotonic()
+            cmd = self.cmd
+            if self.prepare:
+                cmd, self.start_kind = self.prepare(self.log)
+            if self.cancelled: return
+            self.log.push(f"🚀 执行命令:\n{cmd}\n{'='*40}")
+
+            def on_start(process):
+                self.process = process
+                if self.cancelled: self.kill_tree()
+
+            def on_lines(lines):
+                if self.first_output is None and any(FT_LOG_LINE.match(l) for l in lines):
+                    self.first_output = time.monotonic() - started
+                self.log.push_many(lines)
+                for hook in self.line_hooks: hook(lines)
+
+            # [修改] 启动与分块读取抽成 stream_command, 与无界面模式共用
+            self.returncode = stream_command(cmd, on_lines, on_start)
+
+            self.log.push(f"\n{'='*40}\n✅ 任务结束 (退出码 {self.returncode})")
+        except Exception as e:
+            self.log.push(f"❌ 发生错误: {str(e)}")
+        finally:
+            self.log.close()
+            self.finish_signal.emit()
+
+    def kill_tree(self):
+        """结束本地进程树 (可从任意线程调用); 进程尚未启动时标记取消, 不再启动"""
+        self.cancelled = True
+        kill_process_tree(self.process)
+
+# ==========================================
+# 1.1 常驻容器池 (docker exec 代替 run --rm)
+# ==========================================
+def env_fingerprint():
+    """配置、策略和 compose 文件的修改指纹, 变化后常驻容器需要重建"""
+    files = [os.path.join(APP_ROOT, "docker-compose.yml")]
+    files += [f for f in glob.glob(os.path.join(USER_DATA_DIR, "*.json")) if f not in APP_STATE_FILES]
+    files += glob.glob(os.path.join(STRATEGY_DIR, "*.py"))
+    h = hashlib.sha1()
+    for f in sorted(files):
+        try:
+            st = os.stat(f)
+            h.update(f"{f}|{st.st_mtime_ns}|{st.st_size}".encode())
+        except OSError: pass
+    return h.hexdigest()
+
+def docker_quiet(args, timeout=60):
+    """执行一条 docker 命令, 返回 (退出码, 输出)"""
+    try:
+        r = subprocess.run(args, cwd=APP_ROOT, capture_output=True, text=True, encoding='utf-8',
+                           errors='replace', timeout=timeout, creationflags=NO_WINDOW)
+        return r.returncode, (r.stdout + r.stderr).strip()
+    except Exception as e:
+        return -1, str(e)
+
+def container_cpu_seconds(name):
+    """容器 cgroup 累计 CPU 时间 (秒, cgroup v2 / v1), 读取失败返回 None"""
+    code, out = docker_quiet(["docker", "exec", name, "sh", "-c",
+                              "cat /sys/fs/cgroup/cpu.stat 2>/dev/null || cat /sys/fs/cgroup/cpuacct/cpuacct.usage"],
+                             timeout=10)
+    if code != 0: return None
+    m = re.search(r"usage_usec (\d+)", out)
+    if m: return int(m.group(1)) / 1e6
+    return int(out.strip()) / 1e9 if out.strip().isdigit() else None
+
+class WarmPool:
+    """
+    常驻 freqtrade 容器池。容器以 sleep infinity 保持运行, 任务通过 docker exec 派发,
+    省去每次 docker compose run --rm 的容器创建与销毁。
+    注意: 每次 exec 仍会重新启动 freqtrade 进程 (导入与策略加载无法跨命令复用)。
+    """
+    def __init__(self, size=WARM_POOL_SIZE, max_jobs=WARM_MAX_JOBS):
+        self.lock = threading.Lock()
+        self.max_jobs = max_jobs
+        self.slots = {f"{WARM_PREFIX}_{i}": {"busy": False, "jobs": 0, "fingerprint": None}
+                      for i in range(1, size + 1)}
+        self.latency = {"cold": [], "warm": []}
+
+    @staticmethod
+    def supports(cmd):
+        return cmd.startswith(COMPOSE_RUN_PREFIX)
+
+    def acquire(self):
+        with self.lock:
+            for name, slot in self.slots.items():
+                if not slot["busy"]:
+                    slot["busy"] = True
+                    return name
+        return None
+
+    def release(self, name):
+        with self.lock:
+            self.slots[name]["busy"] = False
+
+    def is_running(self, name):
+        code, out = docker_quiet(["docker", "inspect", "-f", "{{.State.Running}}", name], timeout=15)
+        return code == 0 and out.strip() == "true"
+
+    def prepare(self, name, cmd, log):
+        """在工作线程中调用: 必要时回收/启动常驻容器, 返回 (exec 命令, 启动类型)"""
+        slot = self.slots[name]
+        fingerprint = env_fingerprint()
+        alive = self.is_running(name)
+        if alive and (slot["jobs"] >= self.max_jobs or slot["fingerprint"] != fingerprint):
+            reason = "配置/策略已变化" if slot["fingerprint"] != fingerprint else f"已执行 {slot['jobs']} 个任务"
+            log.push(f"♻️ 回收常驻容器 {name} ({reason})")
+            docker_quiet(["docker", "rm", "-f", name])
+            alive = False
+        kind = "warm"
+        if not alive:
+            kind = "cold"
+            docker_quiet(["docker", "rm", "-f", name])
+            log.push(f"♨️ 启动常驻容器 {name} ...")
+            code, out = docker_quiet(["docker", "compose", "run", "-d", "--rm", "--name", name,
+                                      "--entrypoint", "sleep", "freqtrade", "infinity"], timeout=300)
+            if code != 0:
+                log.push(f"⚠️ 常驻容器启动失败, 改用普通模式: {out}")
+                return cmd, "cold"
+            slot["jobs"] = 0
+            slot["fingerprint"] = fingerprint
+        slot["jobs"] += 1
+        return f"docker exec {name} freqtrade {cmd[len(COMPOSE_RUN_PREFIX):]}", kind
+
+    def record(self, kind, seconds):
+        if seconds is None: return
+        samples = self.latency[kind]
+        samples.append(seconds)
+        del samples[:-50]
+
+    def report(self):
+        avg = {k: (sum(v) / len(v) if v else None) for k, v in self.latency.items()}
+        parts = [f"冷启动 {avg['cold']:.1f}s (n={len(self.latency['cold'])})" if avg["cold"] is not None else "冷启动 -",
+                 f"热启动 {avg['warm']:.1f}s (n={len(self.latency['warm'])})" if avg["warm"] is not None else "热启动 -"]
+        if avg["cold"] is not None and avg["warm"] is not None:
+            parts.append(f"每个任务约节省 {avg['cold'] - avg['warm']:.1f}s (仅容器创建, freqtrade 进程仍每次新建)")
+        return "♨️ 首行输出延迟: " + " / ".join(parts)
+
+    def shutdown(self):
+        docker_quiet(["docker", "rm", "-f", *self.slots], timeout=30)
+
+# ==========================================
+# 1.2 回测结果缓存 (命中时不启动容器)
+# ==========================================
+NEGATIVE_INT = re.compile(r"-\d+")
+
+def parse_cmd_args(cmd):
+    """拆解 freqtrade 命令: 返回 (子命令, {选项: [值...]})"""
+    tokens = shlex.split(cmd, posix=(os.name != "nt"))
+    if "freqtrade" not in tokens: return None, {}
+    tokens = tokens[tokens.index("freqtrade") + 1:]
+    if not tokens: return None, {}
+    sub, opts, key = tokens[0], {}, None
+    for tok in tokens[1:]:
+        # 负数 (如 -j -1) 紧跟在选项后面时是值, 不是新选项
+        if tok.startswith("-") and not (key and not opts[key] and NEGATIVE_INT.fullmatch(tok)):
+            key = tok
+            opts.setdefault(key, [])
+        elif key:
+            opts[key].append(tok)
+    return sub, opts
+
+def hyperopt_workers(opts):
+    """优化命令的 -j 值; 未指定时与 freqtrade 默认一致为 -1 (占满所有核心)"""
+    try:
+        return int((opts.get("-j") or opts.get("--job-workers") or ["-1"])[0])
+    except ValueError:
+        return -1
+
+def set_hyperopt_workers(cmd, jobs):
+    """把优化命令中的 -j / --job-workers 改为 jobs"""
+    return re.sub(r"(\s(?:-j|--job-workers))\s+-?\d+", lambda m: f"{m.group(1)} {jobs}", cmd, count=1)
+
+def host_path(path):
+    """容器内路径 (/freqtrade/user_data/...) 或相对路径 -> 本机路径"""
+    path = path.replace("\\", "/")
+    if "user_data/" in path:
+        path = path[path.index("user_data/"):]
+    return os.path.normpath(os.path.join(APP_ROOT, path))
+
+def load_merged_config(config_args):
+    """按 freqtrade 的规则合并多个 --config (含 add_config_files), 后者覆盖前者"""
+    def merge(base, extra):
+        for k, v in extra.items():
+            if isinstance(v, dict) and isinstance(base.get(k), dict): merge(base[k], v)
+            else: base[k] = v
+        return base
+
+    def load(path, seen):
+        if path in seen or not os.path.exists(path): return {}
+        seen.add(path)
+        data = config_store().get(path)  # [修改] 走配置缓存, 文件未变化时不重新解析
+        result = {}
+        for sub in data.get("add_config_files", []):
+            merge(result, load(os.path.normpath(os.path.join(os.path.dirname(path), sub)), seen))
+        return merge(result, data)
+
+    merged, seen = {}, set()
+    for c in config_args or [os.path.join("user_data", "config.json")]:
+        merge(merged, load(host_path(c), seen))
+    return merged
+
+def pair_to_filename(pair):
+    for ch in ["/", " ", ".", "@", "$", "+", ":"]:
+        pair = pair.replace(ch, "_")
+    return pair
+
+def find_strategy_file(name, extra_dirs=()):
+    """找到定义了策略类 name 的源文件"""
+    pattern = re.compile(rf"^class\s+{re.escape(name)}\s*\(", re.M)
+    # [修改] user_data/strategies 先查策略索引, 未收录 (如语法错误) 时再逐个文件匹配
+    found = None if extra_dirs else strategy_index().find(name)
+    if found: return found
+    for d in [*extra_dirs, STRATEGY_DIR]:
+        for f in sorted(glob.glob(os.path.join(d, "*.py"))):
+            try:
+                with open(f, 'r', encoding='utf-8', errors='replace') as fh:
+                    if pattern.search(fh.read()): return f
+            except OSError: pass
+    return None
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""): h.update(block)
+    return h.hexdigest()
+
+def backtest_key_inputs(opts):
+    """指纹中与时间参数/周期无关的部分: 策略源码 (含参数文件)、合并后的配置、所用数据文件; 无法确定时返回 None"""
+    config = load_merged_config(opts.get("--config"))
+    strategy_dirs = [host_path(p) for p in opts.get("--strategy-path", [])]
+    strategy_file = find_strategy_file(opts["--strategy"][0], strategy_dirs)
+    if not config or not strategy_file: return None
+
+    parts = {"strategy": file_digest(strategy_file), "config": config}
+    params_file = os.path.splitext(strategy_file)[0] + ".json"
+    if os.path.exists(params_file): parts["params"] = file_digest(params_file)
+
+    # 数据文件按 名称/大小/修改时间 计入 (新下载的K线会使缓存失效)
+    exchange = config.get("exchange", {})
+    datadir = host_path(config["datadir"]) if config.get("datadir") else os.path.join(DATA_DIR, exchange.get("name", ""))
+    pairs = opts.get("--pairs") or exchange.get("pair_whitelist", [])
+    patterns = ["*"] if any(ch in p for p in pairs for ch in "*[]()|^$") else [f"{pair_to_filename(p)}-*" for p in pairs]
+    data = []
+    for d in (datadir, os.path.join(datadir, "futures")):
+        for pat in patterns:
+            for f in glob.glob(os.path.join(d, pat)):
+                st = os.stat(f)
+                data.append(f"{os.path.relpath(f, datadir)}|{st.st_size}|{st.st_mtime_ns}")
+    parts["data"] = sorted(set(data))
+    return parts
+
+def backtest_cache_key(cmd, inputs_cache=None):
+    """
+    回测命令的内容指纹: 策略源码 (含参数文件)、合并后的配置、时间参数、币种、周期以及所用数据文件。
+    无法确定输入时返回 None (不缓存)。inputs_cache (dict) 在多次调用间复用 backtest_key_inputs 的结果,
+    网格展开时策略哈希和数据文件扫描每个 策略×配置 只做一次。
+    """
+    sub, opts = parse_cmd_args(cmd)
+    if sub != "backtesting" or not opts.get("--strategy"): return None
+    if inputs_cache is None:
+        inputs = backtest_key_inputs(opts)
+    else:
+        # 决定 backtest_key_inputs 结果的参数
+        scope = tuple(tuple(opts.get(k, ())) for k in ("--strategy", "--strategy-path", "--config", "--pairs"))
+        if scope not in inputs_cache: inputs_cache[scope] = backtest_key_inputs(opts)
+        inputs = inputs_cache[scope]
+    if inputs is None: return None
+    parts = dict(inputs, args={k: v for k, v in sorted(opts.items()) if k not in ("--config", "--strategy-path")})
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+# freqtrade 回测 SUMMARY METRICS 表格中的指标 -> 字段名
+BT_METRIC_KEYS = {
+    "Total profit %": "profit_pct", "Absolute profit": "profit_abs", "Total/Daily Avg Trades": "trades",
+    "Sharpe": "sharpe", "Sortino": "sortino", "Calmar": "calmar", "Profit factor": "profit_factor",
+    "Absolute Drawdown (Account)": "drawdown_pct", "Max % of account underwater": "drawdown_pct",
+}
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+class BacktestMetrics:
+    """行回调: 从回测输出的汇总表格中提取关键指标"""
+    def __init__(self):
+        self.metrics = {}
+
+    def __call__(self, lines):
+        for line in lines:
+            if "│" not in line and "|" not in line: continue
+            cells = [c.strip() for c in re.split(r"[│|┃]", line) if c.strip()]
+            if len(cells) != 2 or cells[0] not in BT_METRIC_KEYS: continue
+            m = NUMBER.search(cells[1].replace(",", ""))
+            if m: self.metrics.setdefault(BT_METRIC_KEYS[cells[0]], float(m.group()))
+
+# freqtrade 导出回测结果时在日志中打印的文件路径
+EXPORT_PATH = re.compile(r"""([^"'\s]*backtest_results[/\\]backtest-result[^"'\s]*\.(?:zip|json))""")
+
+class ExportCollector:
+    """行回调: 记录任务导出的回测结果文件"""
+    def __init__(self):
+        self.files = []
+
+    def __call__(self, lines):
+        for line in lines:
+            if "backtest-result" not in line: continue
+            for m in EXPORT_PATH.finditer(line):
+                path = host_path(m.group(1))
+                if path not in self.files: self.files.append(path)
+
+    def exports(self):
+        files = [f for f in self.files if os.path.exists(f)]
+        if not files:  # 日志中没找到时退回 .last_result.json
+            try:
+                with open(os.path.join(BACKTEST_RESULTS_DIR, ".last_result.json"), 'r', encoding='utf-8') as f:
+                    files = [os.path.join(BACKTEST_RESULTS_DIR, json.load(f)["latest_backtest"])]
+            except Exception: return []
+        for f in list(files):
+            meta = os.path.splitext(f)[0] + ".meta.json"
+            if os.path.exists(meta) and meta not in files: files.append(meta)
+        return [f for f in files if os.path.exists(f)]
+
+class ResultCache:
+    """回测结果缓存: 每个指纹一个目录 (完整日志 + 导出文件), 总大小超限时按最近使用时间淘汰"""
+    def __init__(self, root=CACHE_DIR, max_bytes=CACHE_MAX_MB * 2**20):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _meta_path(self, key):
+        return os.path.join(self.root, key, "meta.json")
+
+    def _write_meta(self, key, meta):
+        tmp = self._meta_path(key) + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f: json.dump(meta, f, ensure_ascii=False, indent=4)
+        os.replace(tmp, self._meta_path(key))
+
+    def lookup(self, key):
+        try:
+            with open(self._meta_path(key), 'r', encoding='utf-8') as f: meta = json.load(f)
+        except Exception: return None
+        entry_dir = os.path.join(self.root, key)
+        if not all(os.path.exists(os.path.join(entry_dir, n)) for n in meta["exports"] + ["output.log"]):
+            return None
+        meta["last_used"] = time.time()
+        self._write_meta(key, meta)
+        meta["dir"] = entry_dir
+        return meta
+
+    def store(self, key, cmd, log_path, exports):
+        entry_dir = os.path.join(self.root, key)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.makedirs(entry_dir)
+        export_log(log_path, os.path.join(entry_dir, "output.log"))
+        for f in exports: shutil.copy2(f, entry_dir)
+        names = [os.path.basename(f) for f in exports]
+        size = sum(os.path.getsize(os.path.join(entry_dir, n)) for n in names + ["output.log"])
+        self._write_meta(key, {"cmd": cmd, "created": time.time(), "last_used": time.time(),
+                               "exports": names, "size": size})
+        self.evict()
+
+    def restore(self, meta):
+        """把缓存的导出文件放回 backtest_results 并设为最新结果 (FreqUI 可直接查看)"""
+        os.makedirs(BACKTEST_RESULTS_DIR, exist_ok=True)
+        for name in meta["exports"]:
+            shutil.copy2(os.path.join(meta["dir"], name), BACKTEST_RESULTS_DIR)
+        main = [n for n in meta["exports"] if not n.endswith(".meta.json")]
+        if main:
+            with open(os.path.join(BACKTEST_RESULTS_DIR, ".last_result.json"), 'w', encoding='utf-8') as f:
+                json.dump({"latest_backtest": main[0]}, f)
+
+    def evict(self):
+        entries = []
+        for key in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            try:
+                with open(self._meta_path(key), 'r', encoding='utf-8') as f: meta = json.load(f)
+                entries.append((meta["last_used"], meta["size"], key))
+            except Exception:
+                shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+        total = sum(e[1] for e in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes: break
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+            total -= size
+
+# ==========================================
+# 1.3 任务队列与并发调度 (多个回测/下载同时运行)
+# ==========================================
+def host_capacity():
+    """返回 (CPU 核数, 物理内存 GB), 内存获取失败时为 0"""
+    cores = os.cpu_count() or 1
+    mem_gb = 0
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            class MEMORYSTATUSEX(ctypes.Structure):
+                _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                            ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                            ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                            ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                            ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+            stat = MEMORYSTATUSEX()
+            stat.dwLength = ctypes.sizeof(stat)
+            ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(stat))
+            mem_gb = stat.ullTotalPhys / 2**30
+        else:
+            mem_gb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 2**30
+    except Exception: pass
+    return cores, mem_gb
+
+def max_concurrent_jobs():
+    cores, mem_gb = host_capacity()
+    slots = (cores - LIVE_RESERVE_CORES) // JOB_CORES
+    if mem_gb: slots = min(slots, int((mem_gb - LIVE_RESERVE_MEM_GB) // JOB_MEM_GB))
+    return max(1, slots)
+
+class ResourceGovernor:
+    """
+    按主机容量、运行中任务已分配的资源和实盘预留, 决定每个任务的 -j 与容器 CPU/内存上限。
+    docker compose run 不支持 --cpus/--memory, 上限在容器创建后用 docker update 设置。
+    下载任务以网络为主, 限制为 1 核但不计入分配。
+    """
+    def __init__(self, max_running):
+        self.cores, self.mem_gb = host_capacity()
+        self.max_running = max_running
+        self.assigned = {}  # 任务 ID -> (核数, 内存 GB)
+
+    def budget(self):
+        """扣除实盘预留后可分配的 (核数, 内存 GB), 内存未知时为 0 (不限制内存)"""
+        mem = max(1.0, self.mem_gb - LIVE_RESERVE_MEM_GB) if self.mem_gb else 0
+        return max(1, self.cores - LIVE_RESERVE_CORES), mem
+
+    def free(self):
+        cores, mem = self.budget()
+        used = list(self.assigned.values())
+        return cores - sum(c for c, _ in used), mem - sum(m for _, m in used)
+
+    def slot_cores(self):
+        """并发运行时一个任务槽位的核数 (多个优化同时运行时的 -j)"""
+        return max(1, self.budget()[0] // self.max_running)
+
+    def plan(self, kind, cmd=""):
+        """返回 {"cpus": 核数, "mem_gb": 内存上限 (0 为不限制), "jobs": 优化进程数}"""
+        free_cpu, free_mem = self.free()
+        budget_mem = self.budget()[1]
+        if kind == "hyperopt":
+            cpus, mem = max(1, free_cpu), free_mem
+            _, opts = parse_cmd_args(cmd) if cmd else (None, {})
+            requested = hyperopt_workers(opts)
+            if requested > 0: cpus = min(cpus, requested)
+        elif kind == "download":
+            cpus, mem = 1, JOB_MEM_GB
+        else:
+            cpus, mem = min(JOB_CORES, max(1, free_cpu)), max(JOB_MEM_GB, budget_mem / self.max_running)
+        mem = round(max(1.0, min(mem, free_mem)), 1) if budget_mem else 0
+        return {"cpus": cpus, "mem_gb": mem, "jobs": cpus}
+
+    def describe(self, plan, kind):
+        used = sum(c for c, _ in self.assigned.values())
+        mem = f"{plan['mem_gb']} GB" if plan["mem_gb"] else "内存不限"
+        head = f"-j {plan['jobs']} | " if kind == "hyperopt" else ""
+        return (f"🧮 资源分配: {head}容器上限 {plan['cpus']} 核 / {mem} | 主机 {self.cores} 核 / {self.mem_gb:.1f} GB, "
+                f"预留实盘 {LIVE_RESERVE_CORES} 核 / {LIVE_RESERVE_MEM_GB} GB, 运行中任务已占 {used} 核 "
+                f"(启动时按当时空闲核心重新计算, -j 超出时自动调小)")
+
+    def apply(self, cmd, name, plan, log, alive):
+        """
+        在工作线程中调用: 给命令指定容器名并设置资源上限, 返回最终命令。
+        docker exec (常驻容器) 直接更新该容器; compose run 的容器在命令启动后才存在, 由后台线程重试设置。
+        """
+        if cmd.startswith("docker exec "):
+            self.update(cmd.split()[2], plan, log, lambda: False)
+        elif cmd.startswith(COMPOSE_RUN_PREFIX):
+            cmd = cmd.replace("docker compose run --rm ", f"docker compose run --rm --name {name} ", 1)
+            threading.Thread(target=self.update, args=(name, plan, log, alive), daemon=True).start()
+        return cmd
+
+    def update(self, name, plan, log, alive):
+        args = ["docker", "update", f"--cpus={plan['cpus']}"]
+        if plan["mem_gb"]:
+            mem = f"{int(plan['mem_gb'] * 1024)}m"
+            args += [f"--memory={mem}", f"--memory-swap={mem}"]
+        deadline = time.monotonic() + LIMIT_APPLY_TIMEOUT
+        while True:
+            code, out = docker_quiet(args + [name], timeout=15)
+            if code == 0:
+                mem = f"{plan['mem_gb']} GB" if plan["mem_gb"] else "内存不限"
+                log.push(f"🧮 容器 {name} 资源上限: {plan['cpus']} 核 / {mem}")
+                return True
+            if not alive() or time.monotonic() > deadline:
+                if alive(): log.push(f"⚠️ 无法设置容器 {name} 的资源上限: {out}")
+                return False
+            time.sleep(0.5)
+
+def job_kind(cmd):
+    """根据命令判断任务类型"""
+    if " download-data" in cmd: return "download"
+    if " backtesting" in cmd: return "backtest"
+    if " hyperopt" in cmd: return "hyperopt"
+    return "other"
+
+class LabJob:
+    """实验室任务, 除日志尾部外全部字段都会持久化到 lab_jobs.json"""
+    FIELDS = ("id", "kind", "cmd", "priority", "status", "created", "started", "finished",
+              "returncode", "log_path", "force", "cached", "group", "candles", "metrics",
+              "patience", "progress", "timeout")
+
+    def __init__(self, cmd, priority=1, **fields):
+        self.id = uuid.uuid4().hex[:8]
+        self.cmd = cmd
+        self.kind = job_kind(cmd)
+        self.priority = priority
+        self.status = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.returncode = None
+        self.log_path = None
+        self.force = False   # 忽略结果缓存, 强制重新运行
+        self.cached = False  # 结果直接取自缓存
+        self.group = None    # 同一批提交的下载分片
+        self.candles = None  # 下载任务写入的K线数
+        self.metrics = None  # 回测结果摘要 (收益/回撤/夏普等)
+        self.patience = None  # 优化早停: 最优 Loss 连续 N 轮没有改进时结束
+        self.progress = None  # 优化进度的最终快照
+        self.timeout = None   # 运行时限 (秒), 超过后自动取消
+        for k, v in fields.items():
+            if k in self.FIELDS: setattr(self, k, v)
+        self.tail = deque(maxlen=LOG_VIEW_MAX_LINES)  # 最近的日志, 切换任务时直接显示
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+    def elapsed(self):
+        if not self.started: return 0
+        return (self.finished or time.time()) - self.started
+
+    @property
+    def exclusive(self):
+        # 优化命令使用 -j -1 (或未指定 -j) 时占满所有核心, 只能单独运行
+        if self.kind != "hyperopt": return False
+        _, opts = parse_cmd_args(self.cmd)
+        return hyperopt_workers(opts) == -1
+
+class JobScheduler(QObject):
+    """持久化的优先级任务队列: 按并发上限同时运行多个 DockerWorker, 每个任务独立日志"""
+    job_changed = Signal(str)
+    job_output = Signal(str, str)
+    job_finished = Signal(str)
+    group_finished = Signal(str, str)
+    index_updated = Signal(str)
+
+    def __init__(self, parent=None, path=JOBS_PATH, max_running=None):
+        super().__init__(parent)
+        self.path = path
+        self.max_running = max_running or max_concurrent_jobs()
+        self.governor = ResourceGovernor(self.max_running)
+        self.jobs = {}
+        self.workers = {}
+        # [新增] 常驻容器池 (默认关闭), 冷/热启动延迟统计始终记录
+        self.warm_pool = WarmPool()
+        self.warm_enabled = False
+        self.warm_used = False
+        self.containers = {}  # 任务 ID -> 占用的常驻容器
+        # [新增] 回测结果缓存
+        self.result_cache = ResultCache()
+        self.cache_keys = {}  # 任务 ID -> (缓存指纹, 导出收集器)
+        self.counters = {}    # 任务 ID -> 输出解析器 (下载K线计数 / 回测指标)
+        self.cancelling = {}  # 任务 ID -> 取消原因
+        self.cpu_baseline = {}  # 任务 ID -> 常驻容器开始执行时的累计 CPU 秒数
+        # [新增] 结果索引: 回测/优化结束后在后台增量导入
+        self.result_index = ResultIndex()
+        self.index_worker = None
+        self.index_dirty = False
+        self.watchdog = QTimer(self)  # 检查运行时限
+        self.watchdog.setInterval(1000)
+        self.watchdog.timeout.connect(self.check_timeouts)
+        self.watchdog.start()
+        self.log_timer = QTimer(self)
+        self.log_timer.setInterval(LOG_FLUSH_MS)
+        self.log_timer.timeout.connect(self.flush_logs)
+        self.load()
+        # [新增] 启动时在后台按保留策略清理旧任务日志 (排队中的任务日志保留)
+        keep = {j.log_path for j in self.jobs.values() if j.status == "queued"}
+        threading.Thread(target=prune_job_logs, args=(keep,), daemon=True).start()
+
+    # --- 持久化 ---
+    def load(self):
+        if not os.path.exists(self.path): return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for d in json.load(f):
+                    job = LabJob(d.pop("cmd"), **d)
+                    if job.status == "running":  # 上次退出时未跑完的任务重新排队
+                        job.status, job.started = "queued", None
+                    self.jobs[job.id] = job
+        except: pass
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump([j.to_dict() for j in self.jobs.values()], f, ensure_ascii=False, indent=4)
+            os.replace(tmp, self.path)
+        except: pass
+
+    # --- 队列操作 ---
+    def submit(self, cmd, priority=1, force=False, group=None, patience=None, timeout=None):
+        job = LabJob(cmd, priority, force=force, group=group, patience=patience, timeout=timeout)
+        job.log_path = os.path.join(JOB_LOG_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{job.id}")
+        self.jobs[job.id] = job
+        self.save()
+        self.job_changed.emit(job.id)
+        self.schedule()
+        return job
+
+    def clear_finished(self):
+        for job_id in [j.id for j in self.jobs.values() if j.status not in ("queued", "running")]:
+            del self.jobs[job_id]
+        self.save()
+
+    def running_jobs(self):
+        return [j for j in self.jobs.values() if j.status == "running"]
+
+    def schedule(self):
+        """按优先级 (数值小优先) 和提交时间启动排队中的任务, 直到达到并发上限"""
+        queued = sorted((j for j in self.jobs.values() if j.status == "queued"),
+                        key=lambda j: (j.priority, j.created))
+        cpu_blocked = False  # 计算型任务严格按顺序启动, 排在前面的任务没启动时后面的也不启动
+        for job in queued:
+            running = self.running_jobs()
+            if job.kind == "download":
+                if sum(j.kind == "download" for j in running) < DL_MAX_PARALLEL: self.start_job(job)
+                continue
+            running = [j for j in running if j.kind != "download"]
+            if cpu_blocked or len(running) >= self.max_running or any(j.exclusive for j in running) \
+                    or (job.exclusive and running) or (running and self.governor.free()[0] < 1):
+                cpu_blocked = True
+                continue
+            self.start_job(job)
+
+    def start_job(self, job):
+        job.status = "running"
+        job.started = time.time()
+        job.finished = job.returncode = None
+        key = None
+        if job.kind == "backtest":
+            try:
+                key = backtest_cache_key(job.cmd)
+            except Exception: pass
+            if key and not job.force and self.finish_from_cache(job, key):
+                return
+        # [新增] 资源上限: 容器命名为 kq4_job_<任务ID>, 创建后设置 CPU/内存上限
+        plan = self.governor.plan(job.kind, job.cmd)
+        resized = None
+        if job.kind == "hyperopt":  # 预览时写入的 -j 按启动时的空闲核心调小, 避免进程数超过容器的 CPU 上限
+            requested = hyperopt_workers(parse_cmd_args(job.cmd)[1])
+            if requested > plan["jobs"]:
+                job.cmd, resized = set_hyperopt_workers(job.cmd, plan["jobs"]), requested
+        prepare = None
+        if self.warm_enabled and WarmPool.supports(job.cmd):
+            name = self.warm_pool.acquire()
+            if name:  # 容器池已满时退回普通模式
+                self.containers[job.id] = name
+                self.warm_used = True
+                pool = self.warm_pool
+                prepare = lambda log, name=name, cmd=job.cmd: pool.prepare(name, cmd, log)
+        if job.kind != "download": self.governor.assigned[job.id] = (plan["cpus"], plan["mem_gb"])
+        governor, warm = self.governor, prepare
+        def prepare(log, job=job, plan=plan):
+            write_rate_limit_configs(job.cmd)
+            if resized: log.push(f"🧮 启动时空闲 {plan['cpus']} 核, -j 由 {resized} 调整为 {plan['jobs']}")
+            cmd, kind = warm(log) if warm else (job.cmd, "cold")
+            if warm and cmd.startswith("docker exec "):  # 常驻容器的 CPU 累计值包含之前的任务, 记下起点
+                self.cpu_baseline[job.id] = container_cpu_seconds(self.containers[job.id]) or 0
+            return governor.apply(cmd, f"{JOB_CONTAINER_PREFIX}_{job.id}", plan, log,
+                                  lambda: job.status == "running"), kind
+        worker = DockerWorker(job.cmd, job.log_path, prepare)
+        if key:
+            collector = ExportCollector()
+            worker.line_hooks.append(collector)
+            self.cache_keys[job.id] = (key, collector)
+        if job.kind == "backtest":
+            self.counters[job.id] = BacktestMetrics()
+            worker.line_hooks.append(self.counters[job.id])
+        if job.kind == "download":
+            self.counters[job.id] = DownloadCounter()
+            worker.line_hooks.append(self.counters[job.id])
+        if job.kind == "hyperopt":
+            _, opts = parse_cmd_args(job.cmd)
+            epochs = (opts.get("--epochs") or opts.get("-e") or ["0"])[0]
+            self.counters[job.id] = HyperoptProgress(int(epochs) if epochs.isdigit() else 0, job.patience)
+            worker.line_hooks.append(self.counters[job.id])
+        # 使用 QThread.finished (run 返回后才发出), 之后才能安全释放线程对象
+        worker.finished.connect(lambda job_id=job.id: self.on_worker_finished(job_id))
+        self.workers[job.id] = worker
+        worker.start()
+        self.log_timer.start()
+        self.save()
+        self.job_changed.emit(job.id)
+
+    def finish_from_cache(self, job, key):
+        """缓存命中: 恢复导出文件并回放日志, 不启动容器"""
+        meta = self.result_cache.lookup(key)
+        if not meta: return False
+        try:
+            self.result_cache.restore(meta)
+        except OSError:
+            return False
+        job.cached = True
+        job.log_path = os.path.join(meta["dir"], "output.log")
+        tail, metrics = deque(maxlen=LOG_FRAME_MAX_LINES), BacktestMetrics()
+        with open(job.log_path, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                tail.append(line.rstrip("\n"))
+                metrics([tail[-1]])
+        job.metrics = metrics.metrics
+        lines = list(tail)
+        created = datetime.fromtimestamp(meta["created"]).strftime("%Y-%m-%d %H:%M")
+        lines.insert(0, f"⚡ 命中结果缓存 ({created} 的运行结果, 勾选【强制重新运行】可忽略缓存)")
+        lines.append(f"📦 已恢复导出文件: {', '.join(meta['exports']) or '无'}")
+        self.emit_output(job.id, lines)
+        job.finished = time.time()
+        job.returncode = 0
+        job.status = "done"
+        self.save()
+        self.job_changed.emit(job.id)
+        self.job_finished.emit(job.id)
+        return True
+
+    def flush_logs(self):
+        for job_id, worker in list(self.workers.items()):
+            lines = worker.log.drain()
+            if lines: self.emit_output(job_id, lines)
+            counter = self.counters.get(job_id)
+            if isinstance(counter, HyperoptProgress) and counter.stop_reason and not counter.stop_sent:
+                counter.stop_sent = True
+                self.stop_job(job_id, f"⏹ 早停: {counter.stop_reason}")
+
+    def hyperopt_progress(self, job_id):
+        """运行中的优化返回实时快照, 已结束的返回保存的最终快照"""
+        counter = self.counters.get(job_id)
+        if isinstance(counter, HyperoptProgress): return counter.snapshot()
+        job = self.jobs.get(job_id)
+        return job.progress if job else None
+
+    def stop_job(self, job_id, reason):
+        """
+        向任务容器发送 SIGINT, freqtrade 会像按下 Ctrl+C 一样保存结果并打印最优参数后退出;
+        超过 HYPEROPT_STOP_GRACE 秒仍未退出时 docker stop (常驻容器直接 docker rm -f, 下次使用时重建,
+        否则不响应 SIGINT 的 freqtrade 会留在容器里与下一个任务抢 CPU)。
+        """
+        job = self.jobs[job_id]
+        self.emit_output(job_id, [reason])
+        warm = self.containers.get(job_id)
+        if warm:  # 常驻容器的 1 号进程是 sleep, 只中断 exec 进来的 freqtrade
+            signal_args, stop_args = ["docker", "exec", warm, "sh", "-c", "kill -INT -1"], ["docker", "rm", "-f", warm]
+        else:
+            name = f"{JOB_CONTAINER_PREFIX}_{job_id}"
+            signal_args, stop_args = ["docker", "kill", "--signal=INT", name], ["docker", "stop", "-t", "10", name]
+        def run():
+            docker_quiet(signal_args, timeout=30)
+            deadline = time.monotonic() + HYPEROPT_STOP_GRACE
+            while job.status == "running" and time.monotonic() < deadline:
+                time.sleep(0.5)
+            if job.status == "running":
+                docker_quiet(stop_args, timeout=60)
+            if job.status == "running" and job_id in self.workers:
+                self.workers[job_id].kill_tree()
+        threading.Thread(target=run, daemon=True).start()
+
+    def emit_output(self, job_id, lines):
+        self.jobs[job_id].tail.extend(lines)
+        self.job_output.emit(job_id, "\n".join(lines))
+
+    def on_worker_finished(self, job_id):
+        worker = self.workers.pop(job_id)
+        job = self.jobs[job_id]
+        lines = worker.log.drain()
+        if worker.log.dropped:
+            lines.append(f"⚠️ 输出过快, 界面省略了 {worker.log.dropped} 行")
+        lines.append(f"📄 完整日志: {worker.log.spill_path}")
+        self.emit_output(job_id, lines)
+        job.finished = time.time()
+        job.returncode = worker.returncode
+        job.status = "done" if worker.returncode == 0 else "failed"
+        if self.cancelling.pop(job_id, None) is not None: job.status = "cancelled"
+        self.cpu_baseline.pop(job_id, None)
+        self.governor.assigned.pop(job_id, None)
+        if job.id in self.containers:
+            self.warm_pool.release(self.containers.pop(job.id))
+        if WarmPool.supports(job.cmd):
+            self.warm_pool.record(worker.start_kind, worker.first_output)
+        if job.id in self.counters:
+            counter = self.counters.pop(job.id)
+            if job.kind == "download": job.candles = counter.candles
+            elif job.kind == "hyperopt": job.progress = dict(counter.snapshot(), eta=None)
+            else: job.metrics = counter.metrics
+        if job.id in self.cache_keys:
+            key, collector = self.cache_keys.pop(job.id)
+            if job.status == "done":
+                try:
+                    self.result_cache.store(key, job.cmd, job.log_path, collector.exports())
+                except OSError: pass
+        worker.deleteLater()
+        if not self.workers: self.log_timer.stop()
+        self.trim_history()
+        self.save()
+        self.job_changed.emit(job_id)
+        self.job_finished.emit(job_id)
+        self.check_group(job.group)
+        if job.kind in ("backtest", "hyperopt") and job.status == "done": self.refresh_index()
+        self.schedule()
+
+    def refresh_index(self):
+        """后台更新结果索引; 正在更新时记下, 结束后再跑一次"""
+        if self.index_worker:
+            self.index_dirty = True
+            return
+        self.index_dirty = False
+        self.index_worker = IndexWorker(self.result_index)
+        self.index_worker.done.connect(self.index_updated)
+        self.index_worker.finished.connect(self.on_index_finished)
+        self.index_worker.start()
+
+    def on_index_finished(self):
+        self.index_worker.deleteLater()
+        self.index_worker = None
+        if self.index_dirty: self.refresh_index()
+
+    def check_group(self, group):
+        """一批分片全部结束后输出合并报告"""
+        if not group: return
+        members = [j for j in self.jobs.values() if j.group == group]
+        if any(j.status in ("queued", "running") for j in members): return
+        self.group_finished.emit(group, download_group_report(members))
+
+    # --- [新增] 取消与超时 ---
+    def cancel_job(self, job_id, reason="手动取消"):
+        """
+        取消任务: 排队中的直接标记取消; 运行中的读取容器 CPU 用量后强制删除容器并结束本地进程树,
+        在后台线程执行, 返回该线程 (排队任务返回 None)。
+        """
+        job = self.jobs.get(job_id)
+        if not job or job.status not in ("queued", "running") or job_id in self.cancelling: return None
+        if job.status == "queued":
+            job.status, job.finished = "cancelled", time.time()
+            self.emit_output(job_id, [f"⏹ 任务已取消 ({reason}), 未开始运行"])
+            self.save()
+            self.job_changed.emit(job_id)
+            self.job_finished.emit(job_id)
+            self.check_group(job.group)
+            return None
+        self.cancelling[job_id] = reason
+        worker = self.workers[job_id]
+        warm = self.containers.get(job_id)
+        name = warm or f"{JOB_CONTAINER_PREFIX}_{job_id}"
+        def run():
+            worker.log.push(f"⏹ 正在取消 ({reason}) ...")
+            cpu = container_cpu_seconds(name)
+            if cpu is not None and warm: cpu -= self.cpu_baseline.get(job_id, 0)
+            elapsed = job.elapsed()
+            text = f"⏹ 任务已取消 ({reason}): 运行 {time.strftime('%H:%M:%S', time.gmtime(elapsed))}"
+            if cpu is not None:
+                text += f", CPU {cpu:.1f} 核·秒 (平均 {cpu / max(elapsed, 1):.2f} 核)"
+            worker.log.push(text)
+            docker_quiet(["docker", "rm", "-f", name], timeout=30)  # 常驻容器下次使用时会重建
+            worker.kill_tree()
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def check_timeouts(self):
+        for job in self.running_jobs():
+            if job.timeout and job.elapsed() > job.timeout and job.id not in self.cancelling:
+                self.cancel_job(job.id, f"超过运行时限 {time.strftime('%H:%M:%S', time.gmtime(job.timeout))}")
+
+    def shutdown(self):
+        """程序退出: 停止运行中任务的容器与进程树 (下次启动时重新排队), 清理常驻容器"""
+        self.watchdog.stop()
+        running = self.running_jobs()
+        threads = [self.cancel_job(j.id, "程序退出") for j in running]
+        for thread in filter(None, threads): thread.join(JOB_CANCEL_GRACE)
+        for worker in self.workers.values(): worker.wait(JOB_CANCEL_GRACE * 1000)
+        if self.index_worker: self.index_worker.wait()
+        for job in running:
+            job.status, job.started = "queued", None
+        self.save()
+        if self.warm_used:
+            self.warm_pool.shutdown()
+
+    def trim_history(self):
+        ended = [j for j in self.jobs.values() if j.status not in ("queued", "running")
+                 and not (j.group and any(o.group == j.group and o.status in ("queued", "running")
+                                          for o in self.jobs.values()))]
+        for job in sorted(ended, key=lambda j: j.finished or 0)[:-JOB_HISTORY_MAX]:
+            del self.jobs[job.id]
+
+# ==========================================
+# 1.4 增量下载规划 (只下载本地缺失的K线区间)
+# ==========================================
+def timeframe_seconds(tf):
+    units = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800, "M": 2592000}
+    return int(tf[:-1]) * units[tf[-1]]
+
+def parse_timerange(text):
+    """'20240101-20240201' -> (开始毫秒, 结束毫秒), 结束为空表示现在"""
+    start, _, end = text.partition("-")
+    to_ms = lambda d: int(datetime.strptime(d, "%Y%m%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return to_ms(start), (to_ms(end) if end else int(time.time() * 1000))
+
+def ms_to_day(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime("%Y%m%d")
+
+# freqtrade K线文件名: {币种}-{周期}[-{类型}].{格式}
+CANDLE_FILE = re.compile(r"^(?P<pair>.+)-(?P<tf>\d+[smhdwM])(?:-(?P<ctype>futures|mark|index|premiumIndex|funding_rate))?\.(?P<ext>json|json\.gz|jsongz|feather|parquet)$")
+
+def _json_candle_bounds(head, tail):
+    """从 JSON K线文件的开头和结尾片段中取首尾时间戳"""
+    first = re.match(r"\s*\[\s*\[\s*(\d+)", head.decode('ascii', 'ignore'))
+    last = re.findall(r"\[\s*(\d+)\s*,", tail.decode('ascii', 'ignore'))
+    return (int(first.group(1)), int(last[-1])) if first and last else None
+
+def read_candle_range(path):
+    """
+    读取K线文件的首尾时间 (毫秒), 不解析全部数据; 无法读取时返回 None。
+    .json 直接 seek 到文件尾; .json.gz 无法随机访问, 只能流式解压一遍 (只保留最后 512 字节, 不做 JSON 解析),
+    最快的仍是 feather/parquet (只读 date 列)。
+    """
+    if path.endswith(".json"):
+        with open(path, 'rb') as f:
+            head = f.read(256)
+            f.seek(max(0, os.path.getsize(path) - 512))
+            return _json_candle_bounds(head, f.read())
+    if path.endswith((".json.gz", ".jsongz")):
+        with gzip.open(path, 'rb') as f:
+            head = tail = f.read(256)
+            while True:
+                chunk = f.read(1 << 20)
+                if not chunk: break
+                tail = tail[-512:] + chunk
+            return _json_candle_bounds(head, tail[-512:])
+    try:
+        import pyarrow.feather, pyarrow.compute
+    except ImportError:
+        return None
+    if path.endswith(".parquet"):
+        import pyarrow.parquet
+        table = pyarrow.parquet.read_table(path, columns=["date"])
+    else:
+        table = pyarrow.feather.read_table(path, columns=["date"])
+    if table.num_rows == 0: return None
+    bounds = pyarrow.compute.min_max(table.column("date").cast("int64")).as_py()
+    # feather/parquet 中的 date 为纳秒或毫秒时间戳
+    scale = 1_000_000 if bounds["max"] > 10**15 else 1
+    return bounds["min"] // scale, bounds["max"] // scale
+
+def scan_local_coverage(datadir, futures):
+    """扫描本地数据目录: 返回 ({(文件名币种, 周期): (首, 尾)}, 无法读取的文件列表)"""
+    coverage, unknown = {}, []
+    folder = os.path.join(datadir, "futures") if futures else datadir
+    want_type = "futures" if futures else None
+    for name in os.listdir(folder) if os.path.isdir(folder) else []:
+        m = CANDLE_FILE.match(name)
+        if not m or m.group("ctype") != want_type: continue
+        try:
+            rng = read_candle_range(os.path.join(folder, name))
+        except Exception:
+            rng = None
+        if rng: coverage[(m.group("pair"), m.group("tf"))] = rng
+        else: unknown.append(name)
+    return coverage, unknown
+
+def parse_list_data(lines, futures):
+    """解析 freqtrade list-data --show-timerange 的表格输出"""
+    coverage = {}
+    want_type = "futures" if futures else "spot"
+    for line in lines:
+        cells = [c.strip() for c in re.split(r"[│|┃]", line) if c.strip()]
+        if len(cells) < 5 or cells[2] != want_type: continue
+        try:
+            rng = [int(datetime.strptime(c, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp() * 1000)
+                   for c in cells[3:5]]
+        except ValueError:
+            continue
+        coverage[(pair_to_filename(cells[0]), cells[1])] = tuple(rng)
+    return coverage
+
+def plan_downloads(pairs, timeframes, start_ms, end_ms, coverage, candle_limit=DL_CANDLE_LIMIT):
+    """
+    计算缺失区间: 返回 ([(周期, 模式, timerange, [币种])], 统计)。
+    模式 append 从已有数据末尾续传, prepend 补齐开头 (--prepend), full 为本地无数据。
+    相同 周期/模式/timerange 的币种合并为一条下载命令。
+    """
+    groups = {}
+    stats = {"candles_total": 0, "candles_skipped": 0, "requests_total": 0, "requests_skipped": 0,
+             "up_to_date": 0, "pairs": len(pairs) * len(timeframes)}
+    for tf in timeframes:
+        step = timeframe_seconds(tf) * 1000
+        for pair in pairs:
+            total = max(0, (end_ms - start_ms) // step)
+            have = coverage.get((pair_to_filename(pair), tf))
+            ranges = []
+            if not have:
+                ranges.append(("full", start_ms, end_ms))
+            else:
+                first, last = have
+                if start_ms < first - step: ranges.append(("prepend", start_ms, first))
+                # 最后一根K线可能尚未收盘, 落后不足两根视为最新
+                if last + 2 * step < end_ms: ranges.append(("append", max(last, start_ms), end_ms))
+            missing = sum(max(0, (b - a) // step) for _, a, b in ranges)
+            stats["candles_total"] += total
+            stats["candles_skipped"] += total - min(total, missing)
+            stats["requests_total"] += math.ceil(total / candle_limit)
+            stats["requests_skipped"] += math.ceil(total / candle_limit) - math.ceil(min(total, missing) / candle_limit)
+            if not ranges: stats["up_to_date"] += 1
+            for mode, a, b in ranges:
+                end_day = "" if b >= int(time.time() * 1000) - step else ms_to_day(b)
+                groups.setdefault((tf, mode, f"{ms_to_day(a)}-{end_day}"), []).append(pair)
+    return [(tf, mode, tr, ps) for (tf, mode, tr), ps in groups.items()], stats
+
+# ==========================================
+# 1.5 分片并行下载 (共享交易所请求预算)
+# ==========================================
+def shard_pairs(pairs, size=DL_SHARD_PAIRS):
+    return [pairs[i:i + size] for i in range(0, len(pairs), size)] or [[]]
+
+# 限速配置片段的文件名包含交易所与并行数, 运行时据此重新算出内容
+RATE_LIMIT_FILE = re.compile(rf"user_data/{re.escape(os.path.basename(SHARD_DIR))}/ratelimit_(?P<exchange>[^\s/]+)_(?P<parallel>\d+)\.json")
+
+def rate_limit_config(exchange, parallel):
+    """
+    ccxt 限速配置片段 (作为额外的 --config 叠加) 的容器内相对路径。只生成路径, 不写文件:
+    构建指令 (预览/--dry-run/POST /build) 没有副作用, 文件在任务启动时由 write_rate_limit_configs 写出。
+    """
+    return f"user_data/{os.path.basename(SHARD_DIR)}/ratelimit_{exchange or 'default'}_{parallel}.json"
+
+def write_rate_limit_configs(cmd):
+    """
+    任务启动前写出指令引用的限速配置: 每个分片的请求间隔 = 1000ms × 并行数 / 每秒预算,
+    保证所有分片同时运行时总请求速率不超过交易所预算。
+    """
+    for m in RATE_LIMIT_FILE.finditer(cmd):
+        exchange, parallel = m.group("exchange"), int(m.group("parallel"))
+        budget = EXCHANGE_RATE_BUDGET.get("" if exchange == "default" else exchange, DL_DEFAULT_RATE)
+        limits = {"enableRateLimit": True, "rateLimit": math.ceil(1000 * parallel / budget)}
+        os.makedirs(SHARD_DIR, exist_ok=True)
+        with open(host_path(m.group(0)), 'w', encoding='utf-8') as f:
+            json.dump({"exchange": {"ccxt_config": limits, "ccxt_async_config": limits}}, f, indent=4)
+
+# freqtrade 下载完成时的日志: Downloaded data for BTC/USDT with length 1500.
+DOWNLOADED_LINE = re.compile(r"Downloaded data for .*?length (\d+)")
+
+class DownloadCounter:
+    """行回调: 累计下载任务写入的K线数"""
+    def __init__(self):
+        self.candles = 0
+
+    def __call__(self, lines):
+        for line in lines:
+            if "Downloaded data" in line:
+                m = DOWNLOADED_LINE.search(line)
+                if m: self.candles += int(m.group(1))
+
+def download_group_report(jobs):
+    """合并一批下载分片的结果: 每个分片的K线数、用时与吞吐 (根/秒)"""
+    jobs = sorted(jobs, key=lambda j: j.created)
+    started = min((j.started for j in jobs if j.started), default=None)
+    finished = max((j.finished for j in jobs if j.finished), default=None)
+    wall = (finished - started) if started and finished else 0
+    total = sum(j.candles or 0 for j in jobs)
+    lines = [f"📦 分片下载完成: {len(jobs)} 个分片, 共 {total} 根K线, 墙钟用时 {wall:.1f}s, "
+             f"合计 {total / wall if wall else 0:.0f} 根/秒"]
+    for i, job in enumerate(jobs, 1):
+        _, opts = parse_cmd_args(job.cmd)
+        tfs = " ".join(opts.get("-t", opts.get("--timeframes", [])))
+        pairs = opts.get("--pairs", [])
+        elapsed = job.elapsed()
+        rate = (job.candles or 0) / elapsed if elapsed else 0
+        lines.append(f"  分片 {i}: {tfs} × {len(pairs) or '白名单'} 币种  {JOB_STATUS_TEXT.get(job.status, job.status)}  "
+                     f"{job.candles or 0} 根  {elapsed:.1f}s  {rate:.0f} 根/秒")
+    return "\n".join(lines)
+
+# ==========================================
+# 1.6 参数网格批量回测 (去重 + 实时排行榜)
+# ==========================================
+def time_flags(days=None, timerange=None, is_backtest=False, today=None):
+    """
+    时间参数 (实验室界面与无界面模式共用): days > 0 时下载用 --days N, 回测/优化换算为截至今天的 --timerange;
+    否则使用 timerange ('YYYYMMDD-YYYYMMDD')。
+    """
+    if days and int(days) > 0:
+        if not is_backtest: return f"--days {int(days)}"
+        today = today or date.today()
+        return f"--timerange {(today - timedelta(days=int(days))):%Y%m%d}-{today:%Y%m%d}"
+    if not timerange: raise ValueError("需要 days 或 timerange")
+    return f"--timerange {timerange}"
+
+def trading_mode_flag(futures):
+    return "--trading-mode futures" if futures else "--trading-mode spot"
+
+def build_download_cmds(config_file, units, mode_flag, shard=False):
+    """units: [(周期列表, 时间参数, 币种列表)] -> 下载指令; 分片时按 周期 × 币种块 拆分并叠加限速配置"""
+    extra_conf = ""
+    if shard:
+        units = [([tf], time_flag, chunk) for tfs, time_flag, pairs in units
+                 for tf in tfs for chunk in shard_pairs(pairs)]
+        if len(units) > 1:
+            exchange = load_merged_config([f"user_data/{config_file}"]).get("exchange", {}).get("name", "")
+            extra_conf = f" --config {rate_limit_config(exchange, min(len(units), DL_MAX_PARALLEL))}"
+    lines = []
+    for tfs, time_flag, pairs in units:
+        pairs_flag = f" --pairs {' '.join(pairs)}" if pairs else ""
+        lines.append(f"docker compose run --rm freqtrade download-data --config user_data/{config_file}{extra_conf} "
+                     f"{time_flag}{pairs_flag} {mode_flag} -t {' '.join(tfs)}")
+    return lines
+
+def build_backtest_cmd(config_file, time_flag, pairs, strategy, export=True, timeframe=None):
+    """回测指令 (实验室按钮与网格回测共用)"""
+    cmd = f"--config user_data/{config_file} {time_flag}"
+    if pairs: cmd += f" --pairs {' '.join(pairs)}"
+    if timeframe: cmd += f" --timeframe {timeframe}"
+    export_flag = "--export trades" if export else ""
+    return f"docker compose run --rm freqtrade backtesting {cmd} --strategy {strategy} {export_flag}"
+
+def split_timerange(timerange, windows):
+    """把 'YYYYMMDD-YYYYMMDD' 等分为 windows 个连续窗口"""
+    start_ms, end_ms = parse_timerange(timerange)
+    step = (end_ms - start_ms) // max(1, windows)
+    days = [ms_to_day(start_ms + i * step) for i in range(windows)] + [ms_to_day(end_ms)]
+    return sorted({f"{a}-{b}" for a, b in zip(days, days[1:]) if a < b})
+
+def expand_grid(strategies, configs, timeframes, timeranges, pairs, export=True):
+    """展开 策略 × 配置 × 周期 × 时间窗口; 参数相同或输入内容完全一致 (如内容相同的两个配置文件) 的单元只保留一个"""
+    cells, seen, inputs_cache = [], set(), {}
+    for strategy in strategies:
+        for config in configs:
+            for tf in timeframes or [None]:
+                for tr in timeranges:
+                    cmd = build_backtest_cmd(config, f"--timerange {tr}", pairs, strategy, export, tf)
+                    try:
+                        key = backtest_cache_key(cmd, inputs_cache) or cmd
+                    except Exception:
+                        key = cmd
+                    if key in seen: continue
+                    seen.add(key)
+                    cells.append({"strategy": strategy, "config": config, "timeframe": tf or "默认",
+                                  "timerange": tr, "cmd": cmd})
+    return cells
+
+def build_hyperopt_cmd(config_file, time_flag, pairs, strategy, loss_func, spaces, epochs, jobs="-1", print_all=False):
+    """优化指令 (实验室按钮与滚动窗口优化共用)"""
+    cmd = f"--config user_data/{config_file} {time_flag}"
+    if pairs: cmd += f" --pairs {' '.join(pairs)}"
+    spaces_flag = f"--spaces {' '.join(spaces)}" if spaces else "--spaces buy sell"
+    cmd = (f"docker compose run --rm freqtrade hyperopt {cmd} "
+           f"--strategy {strategy} --hyperopt-loss {loss_func} "
+           f"{spaces_flag} --epochs {epochs} -j {jobs}")
+    return cmd + " --print-all" if print_all else cmd
+
+# 排行榜排序方式: (显示名, 指标, 越大越好)
+LEADERBOARD_SORT = [("收益 %", "profit_pct", True), ("夏普 Sharpe", "sharpe", True), ("回撤 %", "drawdown_pct", False)]
+
+class SweepWindow(QDialog):
+    """参数网格批量回测: 单元作为普通任务并行运行, 每完成一个就刷新排行榜"""
+    def __init__(self, lab, parent=None):
+        super().__init__(parent)
+        self.lab = lab
+        self.scheduler = lab.scheduler
+        self.cells = {}  # 任务 ID -> 网格单元
+        self.setWindowTitle("🧮 参数网格批量回测")
+        self.resize(900, 700)
+        self.init_ui()
+        self.scheduler.job_finished.connect(self.on_job_finished)
+        self.scheduler.job_changed.connect(self.on_job_changed)
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        hbox_lists = QHBoxLayout()
+        self.list_strat = self.make_checklist([self.lab.combo_strat.itemText(i) for i in range(self.lab.combo_strat.count())],
+                                              self.lab.combo_strat.currentText())
+        self.list_conf = self.make_checklist([self.lab.combo_conf.itemText(i) for i in range(self.lab.combo_conf.count())],
+                                             self.lab.combo_conf.currentText())
+        for title, widget in (("策略", self.list_strat), ("配置", self.list_conf)):
+            box = QVBoxLayout()
+            box.addWidget(QLabel(title))
+            box.addWidget(widget)
+            hbox_lists.addLayout(box)
+        layout.addLayout(hbox_lists)
+
+        hbox_opts = QHBoxLayout()
+        hbox_opts.addWidget(QLabel("K线周期 (空格分隔, 留空用策略默认):"))
+        self.line_tfs = QLineEdit()
+        hbox_opts.addWidget(self.line_tfs)
+        hbox_opts.addWidget(QLabel("时间窗口数:"))
+        self.spin_windows = QSpinBox()
+        self.spin_windows.setRange(1, 52)
+        self.spin_windows.setToolTip("把实验室中的时间范围等分为 N 个连续窗口分别回测")
+        hbox_opts.addWidget(self.spin_windows)
+        layout.addLayout(hbox_opts)
+
+        hbox_run = QHBoxLayout()
+        self.btn_start = QPushButton("▶ 开始网格回测")
+        self.btn_start.setStyleSheet(STYLE_BTN_GREEN)
+        self.btn_start.clicked.connect(self.start_sweep)
+        hbox_run.addWidget(self.btn_start, stretch=1)
+        hbox_run.addWidget(QLabel("排序:"))
+        self.combo_sort = QComboBox()
+        for text, key, _ in LEADERBOARD_SORT:
+            self.combo_sort.addItem(text, key)
+        self.combo_sort.currentIndexChanged.connect(self.refresh_board)
+        hbox_run.addWidget(self.combo_sort)
+        layout.addLayout(hbox_run)
+
+        self.lbl_summary = QLabel("尚未开始")
+        layout.addWidget(self.lbl_summary)
+        self.tbl_board = QTableWidget(0, 10)
+        self.tbl_board.setHorizontalHeaderLabels(["排名", "策略", "配置", "周期", "时间范围", "收益 %",
+                                                  "回撤 %", "Sharpe", "交易数", "状态"])
+        self.tbl_board.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tbl_board.verticalHeader().setVisible(False)
+        self.tbl_board.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        layout.addWidget(self.tbl_board)
+        self.setLayout(layout)
+
+    @staticmethod
+    def make_checklist(items, checked):
+        widget = QListWidget()
+        for text in items:
+            item = QListWidgetItem(text)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if text == checked else Qt.Unchecked)
+            widget.addItem(item)
+        return widget
+
+    @staticmethod
+    def checked_items(widget):
+        return [widget.item(i).text() for i in range(widget.count()) if widget.item(i).checkState() == Qt.Checked]
+
+    def start_sweep(self):
+        strategies, configs = self.checked_items(self.list_strat), self.checked_items(self.list_conf)
+        if not strategies or not configs:
+            QMessageBox.warning(self, "提示", "请至少勾选一个策略和一个配置！")
+            return
+        timerange = self.lab.get_time_flags(is_backtest=True).split()[-1]
+        pairs = self.lab.line_pairs.currentText().split()
+        grid = len(strategies) * len(configs) * max(1, len(self.line_tfs.text().split())) * self.spin_windows.value()
+        cells = expand_grid(strategies, configs, self.line_tfs.text().split(),
+                            split_timerange(timerange, self.spin_windows.value()), pairs, self.lab.chk_export.isChecked())
+        if QMessageBox.question(self, "确认", f"网格共 {grid} 个组合, 去重后 {len(cells)} 个回测任务, 确定开始吗？") != QMessageBox.Yes:
+            return
+        for cell in cells:
+            job = self.scheduler.submit(cell["cmd"], self.lab.combo_priority.currentData(), self.lab.chk_force.isChecked())
+            self.cells[job.id] = cell
+        self.refresh_board()
+
+    def on_job_finished(self, job_id):
+        if job_id in self.cells: self.refresh_board()
+
+    def on_job_changed(self, job_id):
+        if job_id in self.cells: self.refresh_board()
+
+    def refresh_board(self):
+        key = self.combo_sort.currentData()
+        desc = next(d for _, k, d in LEADERBOARD_SORT if k == key)
+        rows = []
+        for job_id, cell in self.cells.items():
+            job = self.scheduler.jobs.get(job_id)
+            rows.append((cell, job, (job.metrics or {}) if job else {}))
+        # 有结果的按指标排序在前, 其余按状态排在后面
+        scored = sorted((r for r in rows if key in r[2]), key=lambda r: r[2][key], reverse=desc)
+        rows = scored + [r for r in rows if key not in r[2]]
+        done = sum(1 for _, job, _ in rows if job and job.status not in ("queued", "running"))
+        self.lbl_summary.setText(f"进度: {done}/{len(rows)} 完成")
+        self.tbl_board.setRowCount(len(rows))
+        fmt = lambda m, k: f"{m[k]:.2f}" if k in m else "-"
+        for row, (cell, job, m) in enumerate(rows):
+            values = [str(row + 1) if key in m else "-", cell["strategy"], cell["config"], cell["timeframe"],
+                      cell["timerange"], fmt(m, "profit_pct"), fmt(m, "drawdown_pct"), fmt(m, "sharpe"),
+                      str(int(m["trades"])) if "trades" in m else "-",
+                      JOB_STATUS_TEXT.get(job.status, job.status) + (" ⚡" if job.cached else "") if job else "已清除"]
+            for col, text in enumerate(values):
+                self.tbl_board.setItem(row, col, QTableWidgetItem(text))
+
+# ==========================================
+# 1.7 滚动窗口优化 (Walk-forward: 样本内优化 -> 样本外回测)
+# ==========================================
+def walk_forward_windows(timerange, is_days, oos_days):
+    """把时间范围切成滚动窗口: [(样本内 timerange, 样本外 timerange)], 每次向前滚动一个样本外长度"""
+    start_ms, end_ms = parse_timerange(timerange)
+    day = 86400 * 1000
+    windows, s = [], start_ms
+    while s + (is_days + oos_days) * day <= end_ms:
+        is_end, oos_end = s + is_days * day, s + (is_days + oos_days) * day
+        windows.append((f"{ms_to_day(s)}-{ms_to_day(is_end)}", f"{ms_to_day(is_end)}-{ms_to_day(oos_end)}"))
+        s += oos_days * day
+    return windows
+
+def iter_fthypt(path, progress=None):
+    """
+    逐行读取 .fthypt 优化结果 (每行一个 epoch 的 JSON), 内存占用与文件大小无关。
+    progress(已读字节, 总字节) 每 FTHYPT_PROGRESS_LINES 行调用一次, 返回 False 时停止读取。
+    """
+    total = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        for n, line in enumerate(f, 1):
+            if progress and n % FTHYPT_PROGRESS_LINES == 0 and progress(f.tell(), total) is False: return
+            line = line.strip()
+            if not line: continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+# 按评估函数给 epoch 打分 (越小越好), 指标取自每个 epoch 的 results_metrics;
+# 这样同一个文件可以按实验室中选择的任意评估函数重新排序。
+DRAWDOWN_MULT = 0.075  # 与 ProfitDrawDownHyperOptLoss 相同
+HYPEROPT_LOSS_SCORES = {
+    "SharpeHyperOptLoss": lambda m: -m["sharpe"],
+    "SortinoHyperOptLoss": lambda m: -m["sortino"],
+    "CalmarHyperOptLoss": lambda m: -m["calmar"],
+    "ProfitDrawDownHyperOptLoss": lambda m: -(m["profit_total_abs"] - m["max_drawdown_account"]
+                                               * m["profit_total_abs"] * (1 - DRAWDOWN_MULT)),
+    "OnlyProfitHyperOptLoss": lambda m: -m["profit_total_abs"],
+}
+
+def epoch_score(epoch, loss_func=None):
+    """没有对应指标 (或未指定评估函数) 时使用文件中记录的 loss"""
+    score = HYPEROPT_LOSS_SCORES.get(loss_func)
+    if score:
+        try:
+            value = score(epoch.get("results_metrics") or {})
+            if isinstance(value, (int, float)) and math.isfinite(value): return value
+        except (KeyError, TypeError): pass
+    loss = epoch.get("loss")
+    return loss if isinstance(loss, (int, float)) and math.isfinite(loss) else None
+
+def top_fthypt_epochs(path, n=FTHYPT_TOP_N, loss_func=None, progress=None):
+    """流式读取, 用大小为 n 的堆保留得分最好的 epoch; 返回 ([(得分, epoch)] 从好到差, 总 epoch 数)"""
+    # 元素 (-得分, -序号, epoch): 堆顶是当前保留中最差的一个; 得分相同时保留较早的 epoch (与 freqtrade 的最优轮一致)
+    heap, count = [], 0
+    for epoch in iter_fthypt(path, progress):
+        count += 1
+        score = epoch_score(epoch, loss_func)
+        if score is None: continue
+        item = (-score, -count, epoch)
+        if len(heap) < n: heapq.heappush(heap, item)
+        elif item > heap[0]: heapq.heapreplace(heap, item)
+    return [(-s, e) for s, _, e in sorted(heap, reverse=True)], count
+
+def best_fthypt_epoch(path):
+    top, _ = top_fthypt_epochs(path, 1)
+    return top[0][1] if top else None
+
+FTHYPT_PATH = re.compile(r"""([^\s'"]+\.fthypt)""")
+
+def find_in_log(path, pattern):
+    """在任务日志中查找最后一个匹配项"""
+    found = None
+    try:
+        for line in iter_log_lines(path):
+            m = pattern.search(line)
+            if m: found = m.group(1)
+    except OSError: pass
+    return found
+
+def write_params_strategy(strategy, params, folder):
+    """
+    把策略源码复制到 folder 并在旁边写入参数文件 (与 freqtrade hyperopt 导出格式一致),
+    返回可用于 --strategy-path 的容器内路径。--strategy-path 优先于 user_data/strategies 搜索。
+    """
+    src = find_strategy_file(strategy)
+    if not src: raise FileNotFoundError(f"找不到策略 {strategy} 的源文件")
+    os.makedirs(folder, exist_ok=True)
+    dst = os.path.join(folder, os.path.basename(src))
+    shutil.copy2(src, dst)
+    with open(os.path.splitext(dst)[0] + ".json", 'w', encoding='utf-8') as f:
+        json.dump({"strategy_name": strategy, "params": params, "ft_stratparam_v": 1,
+                   "export_time": datetime.now(timezone.utc).isoformat()}, f, indent=4)
+    return os.path.relpath(folder, APP_ROOT).replace("\\", "/")
+
+class WalkForwardRun(QObject):
+    """
+    一次滚动窗口优化运行: 各窗口的样本内优化相互独立, 作为普通任务并行排队;
+    优化完成后自动对随后的样本外区间回测最优参数。每次状态变化都写入检查点, 中断后可继续。
+    """
+    changed = Signal(str)
+
+    def __init__(self, scheduler, state):
+        super().__init__(scheduler)
+        self.scheduler = scheduler
+        self.state = state
+        self.dir = os.path.join(WF_DIR, state["id"])
+        scheduler.job_finished.connect(self.on_job_finished)
+
+    @classmethod
+    def create(cls, scheduler, settings, windows):
+        state = dict(settings, id=datetime.now().strftime("%Y%m%d_%H%M%S"), created=time.time(),
+                     windows=[{"is": a, "oos": b, "stage": "pending"} for a, b in windows])
+        return cls(scheduler, state)
+
+    @classmethod
+    def load(cls, scheduler, run_id):
+        with open(os.path.join(WF_DIR, run_id, "state.json"), 'r', encoding='utf-8') as f:
+            return cls(scheduler, json.load(f))
+
+    @staticmethod
+    def list_runs():
+        return sorted(os.listdir(WF_DIR), reverse=True) if os.path.isdir(WF_DIR) else []
+
+    @classmethod
+    def reattach_all(cls, scheduler):
+        """
+        调度器启动时调用: 重新接上所有还有任务在进行的运行 (重启后排队中的优化会继续跑, 需要有人接收结果),
+        并收取关闭期间已经结束的任务。
+        """
+        runs = []
+        for run_id in cls.list_runs():
+            try:
+                run = cls.load(scheduler, run_id)
+            except (OSError, ValueError):
+                continue
+            if any(w["stage"] in ("hyperopt", "backtest") for w in run.state["windows"]):
+                run.sync()
+                runs.append(run)
+            else:
+                scheduler.job_finished.disconnect(run.on_job_finished)
+                run.setParent(None)
+        return runs
+
+    def save(self):
+        os.makedirs(self.dir, exist_ok=True)
+        tmp = os.path.join(self.dir, "state.json.tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=4)
+        os.replace(tmp, os.path.join(self.dir, "state.json"))
+        self.changed.emit(self.state["id"])
+
+    def active(self, job_id):
+        job = self.scheduler.jobs.get(job_id)
+        return job is not None and job.status in ("queued", "running")
+
+    def finished_job(self, job_id):
+        job = self.scheduler.jobs.get(job_id)
+        return job if job is not None and job.status in ("done", "failed", "cancelled") else None
+
+    def sync(self):
+        """收取已经结束但还没处理的任务 (没有人监听时结束的, 结果在调度器历史和任务日志中)"""
+        for w in self.state["windows"]:
+            for stage, key in (("hyperopt", "is_job"), ("backtest", "oos_job")):
+                if w["stage"] == stage and self.finished_job(w.get(key)): self.on_job_finished(w[key])
+
+    def start(self):
+        """启动或继续: 已完成的窗口跳过, 仍在队列中的任务继续等待, 已结束的任务先收取结果而不是重新提交"""
+        self.sync()
+        st = self.state
+        jobs = self.scheduler.governor.slot_cores()
+        for i, w in enumerate(st["windows"]):
+            if w["stage"] == "done": continue
+            if w.get("best"):
+                if not self.active(w.get("oos_job")): self.submit_oos(i)
+            elif not self.active(w.get("is_job")):
+                cmd = build_hyperopt_cmd(st["config"], f"--timerange {w['is']}", st["pairs"], st["strategy"],
+                                         st["loss"], st["spaces"], st["epochs"], jobs) + " --disable-param-export"
+                w["is_job"], w["stage"] = self.scheduler.submit(cmd).id, "hyperopt"
+        self.save()
+
+    def submit_oos(self, i):
+        st, w = self.state, self.state["windows"][i]
+        path = write_params_strategy(st["strategy"], w["best"]["params"], os.path.join(self.dir, f"w{i + 1}"))
+        cmd = build_backtest_cmd(st["config"], f"--timerange {w['oos']}", st["pairs"], st["strategy"], True)
+        w["oos_job"], w["stage"] = self.scheduler.submit(cmd.rstrip() + f" --strategy-path {path}").id, "backtest"
+
+    def on_job_finished(self, job_id):
+        for i, w in enumerate(self.state["windows"]):
+            job = self.scheduler.jobs.get(job_id)
+            if job_id == w.get("is_job") and w["stage"] == "hyperopt":
+                fthypt = find_in_log(job.log_path, FTHYPT_PATH) if job.status == "done" else None
+                best = best_fthypt_epoch(host_path(fthypt)) if fthypt and os.path.exists(host_path(fthypt)) else None
+                if not best:
+                    w["stage"] = "failed"
+                else:
+                    w["fthypt"] = fthypt
+                    w["best"] = {"loss": best["loss"], "params": best.get("params_details", {})}
+                    try:
+                        self.submit_oos(i)
+                    except OSError as e:
+                        w["stage"], w["error"] = "failed", str(e)
+            elif job_id == w.get("oos_job") and w["stage"] == "backtest":
+                w["metrics"] = job.metrics or {}
+                w["stage"] = "done" if job.status == "done" else "failed"
+            else:
+                continue
+            self.save()
+            if all(x["stage"] in ("done", "failed") for x in self.state["windows"]):
+                with open(os.path.join(self.dir, "report.txt"), 'w', encoding='utf-8') as f:
+                    f.write(self.report())
+            return
+
+    def report(self):
+        """合并所有样本外窗口的结果"""
+        done = [w for w in self.state["windows"] if w["stage"] == "done"]
+        lines = [f"📈 滚动窗口优化 {self.state['id']}: {self.state['strategy']} / {self.state['config']}",
+                 f"窗口 {len(done)}/{len(self.state['windows'])} 完成"]
+        equity, trades, worst_dd, wins = 1.0, 0, 0.0, 0
+        for i, w in enumerate(self.state["windows"], 1):
+            m = w.get("metrics") or {}
+            if w["stage"] == "done":
+                equity *= 1 + m.get("profit_pct", 0) / 100
+                trades += int(m.get("trades", 0))
+                worst_dd = max(worst_dd, m.get("drawdown_pct", 0))
+                wins += m.get("profit_pct", 0) > 0
+            lines.append(f"  窗口 {i}: 样本内 {w['is']}  样本外 {w['oos']}  [{w['stage']}]  "
+                         f"收益 {m.get('profit_pct', '-')}%  回撤 {m.get('drawdown_pct', '-')}%  交易 {int(m.get('trades', 0))}")
+            if w.get("error"): lines.append(f"    ❌ {w['error']}")
+        if done:
+            lines.append(f"样本外合计: 复利收益 {(equity - 1) * 100:.2f}%, 交易 {trades} 笔, "
+                         f"最大单窗口回撤 {worst_dd:.2f}%, 盈利窗口 {wins}/{len(done)}")
+        return "\n".join(lines)
+
+WF_STAGE_TEXT = {"pending": "⏳ 等待", "hyperopt": "💊 样本内优化", "backtest": "📝 样本外回测",
+                 "done": "✅ 完成", "failed": "❌ 失败"}
+
+class WalkForwardWindow(QDialog):
+    """滚动窗口优化: 使用实验室当前的策略/配置/币种/时间范围/优化参数"""
+    def __init__(self, lab, parent=None):
+        super().__init__(parent)
+        self.lab = lab
+        self.scheduler = lab.scheduler
+        self.run = None
+        self.setWindowTitle("📈 滚动窗口优化 (Walk-forward)")
+        self.resize(900, 650)
+        self.init_ui()
+        self.refresh_runs()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        hbox_new = QHBoxLayout()
+        hbox_new.addWidget(QLabel("样本内天数:"))
+        self.spin_is = QSpinBox()
+        self.spin_is.setRange(1, 3650)
+        self.spin_is.setValue(60)
+        hbox_new.addWidget(self.spin_is)
+        hbox_new.addWidget(QLabel("样本外天数:"))
+        self.spin_oos = QSpinBox()
+        self.spin_oos.setRange(1, 3650)
+        self.spin_oos.setValue(30)
+        hbox_new.addWidget(self.spin_oos)
+        self.btn_new = QPushButton("▶ 新建运行")
+        self.btn_new.setStyleSheet(STYLE_BTN_PURPLE)
+        self.btn_new.clicked.connect(self.start_new)
+        hbox_new.addWidget(self.btn_new)
+        layout.addLayout(hbox_new)
+
+        hbox_runs = QHBoxLayout()
+        hbox_runs.addWidget(QLabel("历史运行:"))
+        self.combo_runs = QComboBox()
+        self.combo_runs.currentIndexChanged.connect(self.show_selected_run)
+        hbox_runs.addWidget(self.combo_runs, stretch=1)
+        self.btn_resume = QPushButton("⏯ 继续未完成的窗口")
+        self.btn_resume.clicked.connect(self.resume)
+        hbox_runs.addWidget(self.btn_resume)
+        layout.addLayout(hbox_runs)
+
+        self.tbl_windows = QTableWidget(0, 7)
+        self.tbl_windows.setHorizontalHeaderLabels(["#", "样本内", "样本外", "阶段", "最优 Loss", "样本外收益 %", "回撤 %"])
+        self.tbl_windows.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tbl_windows.verticalHeader().setVisible(False)
+        self.tbl_windows.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.txt_report = QPlainTextEdit()
+        self.txt_report.setReadOnly(True)
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.tbl_windows)
+        splitter.addWidget(self.txt_report)
+        layout.addWidget(splitter)
+        self.setLayout(layout)
+
+    def refresh_runs(self, select=None):
+        self.combo_runs.blockSignals(True)
+        self.combo_runs.clear()
+        self.combo_runs.addItems(WalkForwardRun.list_runs())
+        if select: self.combo_runs.setCurrentText(select)
+        self.combo_runs.blockSignals(False)
+        self.show_selected_run()
+
+    def attach(self, run):
+        if self.run: self.run.changed.disconnect(self.render)
+        self.run = run
+        run.changed.connect(self.render)
+        self.render()
+
+    def start_new(self):
+        lab = self.lab
+        windows = walk_forward_windows(lab.get_time_flags(is_backtest=True).split()[-1],
+                                       self.spin_is.value(), self.spin_oos.value())
+        if not windows:
+            QMessageBox.warning(self, "提示", "时间范围不足一个 样本内+样本外 窗口, 请加长时间范围。")
+            return
+        loss_func, spaces, epochs = lab.hyperopt_settings()
+        if not lab.check_spaces(spaces): return
+        settings = {"strategy": lab.combo_strat.currentText(), "config": lab.combo_conf.currentText(),
+                    "pairs": lab.line_pairs.currentText().split(), "loss": loss_func, "spaces": spaces,
+                    "epochs": epochs}
+        run = WalkForwardRun.create(self.scheduler, settings, windows)
+        run.start()
+        self.refresh_runs(run.state["id"])
+
+    def show_selected_run(self):
+        run_id = self.combo_runs.currentText()
+        if not run_id: return
+        if self.run and self.run.state["id"] == run_id: return self.render()
+        live = [r for r in self.scheduler.findChildren(WalkForwardRun) if r.state["id"] == run_id]
+        try:
+            self.attach(live[0] if live else WalkForwardRun.load(self.scheduler, run_id))
+        except (OSError, ValueError) as e:
+            self.txt_report.setPlainText(f"❌ 无法读取运行 {run_id}: {e}")
+
+    def resume(self):
+        if not self.run: return
+        try:
+            self.run.start()
+        except FileNotFoundError as e:
+            QMessageBox.critical(self, "错误", str(e))
+
+    def render(self, *_):
+        windows = self.run.state["windows"]
+        self.tbl_windows.setRowCount(len(windows))
+        for row, w in enumerate(windows):
+            m = w.get("metrics") or {}
+            values = [str(row + 1), w["is"], w["oos"], WF_STAGE_TEXT.get(w["stage"], w["stage"]),
+                      f"{w['best']['loss']:.5f}" if w.get("best") else "-",
+                      f"{m['profit_pct']:.2f}" if "profit_pct" in m else "-",
+                      f"{m['drawdown_pct']:.2f}" if "drawdown_pct" in m else "-"]
+            for col, text in enumerate(values):
+                self.tbl_windows.setItem(row, col, QTableWidgetItem(text))
+        self.txt_report.setPlainText(self.run.report())
+
+# ==========================================
+# 1.8 优化进度遥测 (速度、剩余时间、最优 Loss 曲线、早停)
+# ==========================================
+# 结果表格中的轮数单元格 "12/500"
+EPOCH_CELL = re.compile(r"^(\d+)/(\d+)$")
+EPOCH_PROGRESS = re.compile(r"(\d+)/(\d+)")
+FLOAT_CELL = re.compile(r"^-?\d+(?:\.\d+)?(?:e-?\d+)?$")
+
+def sparkline(values, width=24):
+    """把数值序列压缩成一行 unicode 字符曲线"""
+    if not values: return ""
+    if len(values) > width:
+        values = [values[int(i * len(values) / width)] for i in range(width - 1)] + [values[-1]]
+    lo, hi = min(values), max(values)
+    span = (hi - lo) or 1
+    return "".join(SPARK_CHARS[int((v - lo) / span * (len(SPARK_CHARS) - 1))] for v in values)
+
+class HyperoptProgress:
+    """
+    行回调: 从优化输出的结果表格中解析轮数与 Objective (Loss), 计算速度、剩余时间与最优 Loss 变化。
+    默认 freqtrade 只打印出现新最优的轮次, 逐轮进度需要 --print-all (开启早停时会自动加上)。
+    """
+    def __init__(self, total=0, patience=None):
+        self.total = total
+        self.patience = patience
+        self.done = 0
+        self.best = None
+        self.best_epoch = 0
+        self.trajectory = []  # [(轮数, 当时的最优 Loss)]
+        self.first = None     # 第一次看到进度的 (时间, 轮数), 速度从这里算起 (不含容器启动与数据加载)
+        self.last = None
+        self.stop_reason = None
+        self.stop_sent = False
+
+    def __call__(self, lines):
+        for line in lines:
+            if "/" not in line: continue
+            if "│" in line or "|" in line or "┃" in line:
+                cells = [c.strip().lstrip("* ") for c in re.split(r"[│|┃]", line) if c.strip()]
+                epoch = next((m for m in map(EPOCH_CELL.match, cells) if m), None)
+                if not epoch: continue
+                losses = [float(c) for c in cells if FLOAT_CELL.match(c)]
+                self.advance(int(epoch.group(1)), int(epoch.group(2)), losses[-1] if losses else None)
+            elif "Epochs" in line:  # rich 进度条
+                m = EPOCH_PROGRESS.search(line)
+                if m: self.advance(int(m.group(1)), int(m.group(2)), None)
+
+    def advance(self, epoch, total, loss):
+        now = time.monotonic()
+        if self.first is None: self.first = (now, epoch)
+        self.last = now
+        self.total = total or self.total
+        self.done = max(self.done, epoch)
+        if loss is not None and (self.best is None or loss < self.best):
+            self.best, self.best_epoch = loss, epoch
+            self.trajectory.append((epoch, loss))
+            del self.trajectory[:-HYPEROPT_TRAJECTORY_MAX]
+        if self.patience and self.best is not None and not self.stop_reason \
+                and self.done - self.best_epoch >= self.patience:
+            self.stop_reason = f"最优 Loss 已连续 {self.done - self.best_epoch} 轮没有改进 (最优在第 {self.best_epoch} 轮)"
+
+    def rate(self):
+        if not self.first or self.last == self.first[0]: return None
+        return (self.done - self.first[1]) / (self.last - self.first[0])
+
+    def snapshot(self):
+        rate = self.rate()
+        eta = (self.total - self.done) / rate if rate and self.total > self.done else None
+        return {"done": self.done, "total": self.total, "rate": rate, "eta": eta, "best": self.best,
+                "best_epoch": self.best_epoch, "trajectory": list(self.trajectory), "stopped": self.stop_reason}
+
+def format_hyperopt_progress(p):
+    if not p: return ""
+    if not p["done"]: return "💊 等待第一轮结果..."
+    parts = [f"💊 {p['done']}/{p['total'] or '?'}" + (f" ({p['done'] / p['total']:.0%})" if p["total"] else "")]
+    if p["rate"]: parts.append(f"{p['rate']:.2f} 轮/秒")
+    if p["eta"] is not None: parts.append(f"剩余约 {time.strftime('%H:%M:%S', time.gmtime(p['eta']))}")
+    if p["best"] is not None:
+        parts.append(f"最优 Loss {p['best']:.5f} (第 {p['best_epoch']} 轮, 之后 {p['done'] - p['best_epoch']} 轮无改进)")
+        parts.append(f"曲线 {sparkline([loss for _, loss in p['trajectory']])}")
+    if p.get("stopped"): parts.append("⏹ 已早停")
+    return " | ".join(parts)
+
+# ==========================================
+# 1.9 结果索引 (SQLite: 运行摘要 / 分币种统计 / 交易明细)
+# ==========================================
+RESULTS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, sha256 TEXT, ingested REAL);
+CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, file TEXT, kind TEXT, strategy TEXT, timeframe TEXT,
+    start TEXT, end TEXT, run_time REAL, trades INTEGER, profit_pct REAL, profit_abs REAL, drawdown_pct REAL,
+    sharpe REAL, sortino REAL, calmar REAL, winrate REAL, best_loss REAL, epochs INTEGER);
+CREATE TABLE IF NOT EXISTS pair_stats (run_id INTEGER, pair TEXT, trades INTEGER, profit_pct REAL, profit_abs REAL,
+    winrate REAL, duration_avg TEXT);
+CREATE TABLE IF NOT EXISTS trades (run_id INTEGER, pair TEXT, open_date TEXT, close_date TEXT, profit_pct REAL,
+    profit_abs REAL, duration_min INTEGER, exit_reason TEXT, is_short INTEGER);
+CREATE INDEX IF NOT EXISTS runs_file ON runs(file);
+CREATE INDEX IF NOT EXISTS runs_strategy ON runs(strategy, run_time);
+CREATE INDEX IF NOT EXISTS pair_stats_run ON pair_stats(run_id);
+CREATE INDEX IF NOT EXISTS pair_stats_pair ON pair_stats(pair);
+CREATE INDEX IF NOT EXISTS trades_run ON trades(run_id);
+CREATE INDEX IF NOT EXISTS trades_pair ON trades(pair);
+"""
+
+def open_results_db(path=RESULTS_DB):
+    """每个线程单独打开连接; WAL 模式下导入时浏览器仍可查询"""
+    import sqlite3
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(RESULTS_SCHEMA)
+    return conn
+
+def result_files():
+    """结果索引的候选文件: 回测导出 (zip / 旧版 json) 与优化结果 (.fthypt)"""
+    files = glob.glob(os.path.join(BACKTEST_RESULTS_DIR, "backtest-result-*.zip"))
+    files += [f for f in glob.glob(os.path.join(BACKTEST_RESULTS_DIR, "backtest-result-*.json"))
+              if not f.endswith((".meta.json", "_config.json"))]
+    files += glob.glob(os.path.join(HYPEROPT_RESULTS_DIR, "*.fthypt"))
+    return files
+
+def load_backtest_export(path):
+    """读取回测导出的结果 JSON (zip 内与压缩包同名的 .json)"""
+    if not path.endswith(".zip"):
+        with open(path, 'r', encoding='utf-8') as f: return json.load(f)
+    import zipfile
+    with zipfile.ZipFile(path) as zf:
+        names = [n for n in zf.namelist() if n.endswith(".json") and not n.endswith("_config.json")]
+        stem = os.path.splitext(os.path.basename(path))[0] + ".json"
+        name = stem if stem in names else max(names, key=lambda n: zf.getinfo(n).file_size)
+        with zf.open(name) as f: return json.load(f)
+
+def ratio_pct(value):
+    """freqtrade 导出的比例 (0.12) 转为百分数"""
+    return value * 100 if isinstance(value, (int, float)) else None
+
+class ResultIndex:
+    """把回测导出与优化结果导入 SQLite; 同一文件未变化 (修改时间/大小/哈希) 时跳过"""
+    def __init__(self, path=RESULTS_DB):
+        self.path = path
+
+    def ingest(self, files=None):
+        """增量导入, 返回 (新导入, 跳过, 删除, 失败) 文件数; 在后台线程调用"""
+        conn = open_results_db(self.path)
+        files = result_files() if files is None else files
+        known = {row[0]: row[1:] for row in conn.execute("SELECT path, mtime_ns, size, sha256 FROM files")}
+        added = skipped = failed = 0
+        for f in files:
+            rel = os.path.relpath(f, USER_DATA_DIR).replace("\\", "/")
+            try:
+                st = os.stat(f)
+                old = known.get(rel)
+                if old and old[:2] == (st.st_mtime_ns, st.st_size):
+                    skipped += 1
+                    continue
+                digest = file_digest(f)
+                if old and old[2] == digest:  # 只是修改时间变了
+                    conn.execute("UPDATE files SET mtime_ns=?, size=? WHERE path=?", (st.st_mtime_ns, st.st_size, rel))
+                    skipped += 1
+                    continue
+                with conn:
+                    self.forget(conn, rel)
+                    if f.endswith(".fthypt"): self.ingest_hyperopt(conn, f, rel)
+                    else: self.ingest_backtest(conn, f, rel)
+                    conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                                 (rel, st.st_mtime_ns, st.st_size, digest, time.time()))
+                added += 1
+            except Exception:
+                failed += 1
+        present = {os.path.relpath(f, USER_DATA_DIR).replace("\\", "/") for f in files}
+        removed = [p for p in known if p not in present]
+        with conn:
+            for rel in removed:
+                self.forget(conn, rel)
+                conn.execute("DELETE FROM files WHERE path=?", (rel,))
+        conn.commit()
+        conn.close()
+        return added, skipped, len(removed), failed
+
+    @staticmethod
+    def forget(conn, rel):
+        ids = [r[0] for r in conn.execute("SELECT id FROM runs WHERE file=?", (rel,))]
+        for table in ("pair_stats", "trades"):
+            conn.executemany(f"DELETE FROM {table} WHERE run_id=?", [(i,) for i in ids])
+        conn.execute("DELETE FROM runs WHERE file=?", (rel,))
+
+    def ingest_backtest(self, conn, path, rel):
+        data = load_backtest_export(path)
+        for name, st in (data.get("strategy") or {}).items():
+            wins = st.get("wins")
+            cur = conn.execute(
+                "INSERT INTO runs (file, kind, strategy, timeframe, start, end, run_time, trades, profit_pct, profit_abs,"
+                " drawdown_pct, sharpe, sortino, calmar, winrate) VALUES (?, 'backtest', ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (rel, name, st.get("timeframe"), st.get("backtest_start"), st.get("backtest_end"),
+                 st.get("backtest_run_end_ts") or os.path.getmtime(path), st.get("total_trades"),
+                 ratio_pct(st.get("profit_total")), st.get("profit_total_abs"),
+                 ratio_pct(st.get("max_drawdown_account", st.get("max_relative_drawdown"))),
+                 st.get("sharpe"), st.get("sortino"), st.get("calmar"),
+                 ratio_pct(st.get("winrate")) if st.get("winrate") is not None
+                 else (ratio_pct(wins / st["total_trades"]) if wins is not None and st.get("total_trades") else None)))
+            run_id = cur.lastrowid
+            conn.executemany("INSERT INTO pair_stats VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                (run_id, p.get("key"), p.get("trades"), ratio_pct(p.get("profit_total")), p.get("profit_total_abs"),
+                 ratio_pct(p.get("winrate")) if p.get("winrate") is not None
+                 else (ratio_pct(p["wins"] / p["trades"]) if p.get("trades") else None), str(p.get("duration_avg", "")))
+                for p in st.get("results_per_pair", []) if p.get("key") != "TOTAL"])
+            conn.executemany("INSERT INTO trades VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+                (run_id, t.get("pair"), t.get("open_date"), t.get("close_date"), ratio_pct(t.get("profit_ratio")),
+                 t.get("profit_abs"), t.get("trade_duration"), t.get("exit_reason", t.get("sell_reason")),
+                 int(bool(t.get("is_short"))))
+                for t in st.get("trades", [])])
+
+    def ingest_hyperopt(self, conn, path, rel):
+        top, epochs = top_fthypt_epochs(path, 1)
+        best = top[0][1] if top else None
+        m = re.match(r"strategy_(.+?)_\d{4}-\d\d-\d\d", os.path.basename(path))
+        metrics = (best or {}).get("results_metrics", {})
+        conn.execute(
+            "INSERT INTO runs (file, kind, strategy, run_time, trades, profit_pct, profit_abs, drawdown_pct,"
+            " best_loss, epochs) VALUES (?, 'hyperopt', ?, ?, ?, ?, ?, ?, ?, ?)",
+            (rel, m.group(1) if m else os.path.splitext(os.path.basename(path))[0], os.path.getmtime(path),
+             metrics.get("total_trades"), ratio_pct(metrics.get("profit_total")), metrics.get("profit_total_abs"),
+             ratio_pct(metrics.get("max_drawdown_account")), best.get("loss") if best else None, epochs))
+
+class IndexWorker(QThread):
+    """后台增量导入结果索引"""
+    done = Signal(str)
+
+    def __init__(self, index):
+        super().__init__()
+        self.index = index
+
+    def run(self):
+        started = time.perf_counter()
+        try:
+            added, skipped, removed, failed = self.index.ingest()
+            text = (f"🗂 结果索引已更新: 导入 {added}, 未变化 {skipped}, 移除 {removed}"
+                    + (f", 失败 {failed}" if failed else "") + f" ({time.perf_counter() - started:.1f}s)")
+        except Exception as e:
+            text = f"❌ 结果索引更新失败: {e}"
+        self.done.emit(text)
+
+RESULT_COLUMNS = [("ID", "id"), ("类型", "kind"), ("策略", "strategy"), ("周期", "timeframe"), ("开始", "start"),
+                  ("结束", "end"), ("交易数", "trades"), ("收益 %", "profit_pct"), ("回撤 %", "drawdown_pct"),
+                  ("夏普", "sharpe"), ("胜率 %", "winrate"), ("最优 Loss", "best_loss"), ("文件", "file")]
+
+class ResultBrowser(QDialog):
+    """结果浏览器: 在结果索引中筛选/排序运行, 多选对比各币种收益"""
+    def __init__(self, scheduler, parent=None):
+        super().__init__(parent)
+        self.scheduler = scheduler
+        self.setWindowTitle("🗂 结果库 (回测 / 优化)")
+        self.resize(1100, 700)
+        self.sort = ("run_time", "DESC")
+        self.conn = None
+        self.init_ui()
+        scheduler.index_updated.connect(self.on_index_updated)
+        self.query()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        hbox = QHBoxLayout()
+        hbox.addWidget(QLabel("策略:"))
+        self.combo_strategy = QComboBox()
+        self.combo_strategy.currentIndexChanged.connect(self.query)
+        hbox.addWidget(self.combo_strategy)
+        hbox.addWidget(QLabel("类型:"))
+        self.combo_kind = QComboBox()
+        for text, value in (("全部", ""), ("回测", "backtest"), ("优化", "hyperopt")):
+            self.combo_kind.addItem(text, value)
+        self.combo_kind.currentIndexChanged.connect(self.query)
+        hbox.addWidget(self.combo_kind)
+        hbox.addWidget(QLabel("包含币种:"))
+        self.line_pair = QLineEdit()
+        self.line_pair.setPlaceholderText("如 BTC/USDT")
+        self.line_pair.returnPressed.connect(self.query)
+        hbox.addWidget(self.line_pair)
+        hbox.addStretch()
+        self.btn_reindex = QPushButton("🔄 更新索引")
+        self.btn_reindex.clicked.connect(self.scheduler.refresh_index)
+        hbox.addWidget(self.btn_reindex)
+        layout.addLayout(hbox)
+
+        self.tbl_runs = QTableWidget(0, len(RESULT_COLUMNS))
+        self.tbl_runs.setHorizontalHeaderLabels([c for c, _ in RESULT_COLUMNS])
+        self.tbl_runs.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tbl_runs.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tbl_runs.verticalHeader().setVisible(False)
+        self.tbl_runs.horizontalHeader().setStretchLastSection(True)
+        self.tbl_runs.horizontalHeader().sectionClicked.connect(self.sort_by)
+        self.tbl_runs.itemSelectionChanged.connect(self.compare)
+        self.tbl_detail = QTableWidget(0, 0)
+        self.tbl_detail.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tbl_detail.verticalHeader().setVisible(False)
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.tbl_runs)
+        splitter.addWidget(self.tbl_detail)
+        layout.addWidget(splitter)
+        self.lbl_status = QLabel("")
+        layout.addWidget(self.lbl_status)
+        self.setLayout(layout)
+
+    def db(self):
+        if self.conn is None: self.conn = open_results_db()
+        return self.conn
+
+    def on_index_updated(self, text):
+        self.lbl_status.setText(text)
+        self.query()
+
+    def sort_by(self, col):
+        key = RESULT_COLUMNS[col][1]
+        self.sort = (key, "ASC" if self.sort == (key, "DESC") else "DESC")
+        self.query()
+
+    def query(self):
+        started = time.perf_counter()
+        conn = self.db()
+        strategy = self.combo_strategy.currentText()
+        strategies = [r[0] for r in conn.execute("SELECT DISTINCT strategy FROM runs ORDER BY strategy")]
+        if strategies != [self.combo_strategy.itemText(i) for i in range(1, self.combo_strategy.count())]:
+            self.combo_strategy.blockSignals(True)
+            self.combo_strategy.clear()
+            self.combo_strategy.addItems(["全部", *strategies])
+            self.combo_strategy.setCurrentText(strategy if strategy in strategies else "全部")
+            self.combo_strategy.blockSignals(False)
+        where, args = [], []
+        if self.combo_strategy.currentIndex() > 0:
+            where.append("strategy = ?")
+            args.append(self.combo_strategy.currentText())
+        if self.combo_kind.currentData():
+            where.append("kind = ?")
+            args.append(self.combo_kind.currentData())
+        if self.line_pair.text().strip():
+            where.append("id IN (SELECT run_id FROM pair_stats WHERE pair = ?)")
+            args.append(self.line_pair.text().strip().upper())
+        sql = (f"SELECT {', '.join(k for _, k in RESULT_COLUMNS)} FROM runs"
+               + (f" WHERE {' AND '.join(where)}" if where else "")
+               + f" ORDER BY {self.sort[0]} IS NULL, {self.sort[0]} {self.sort[1]} LIMIT {RESULT_BROWSER_LIMIT}")
+        rows = conn.execute(sql, args).fetchall()
+        total = conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        elapsed = (time.perf_counter() - started) * 1000
+        self.tbl_runs.blockSignals(True)
+        self.tbl_runs.setRowCount(len(rows))
+        for r, row in enumerate(rows):
+            for c, value in enumerate(row):
+                text = f"{value:.2f}" if isinstance(value, float) else ("" if value is None else str(value))
+                self.tbl_runs.setItem(r, c, QTableWidgetItem(text))
+        self.tbl_runs.blockSignals(False)
+        self.lbl_status.setText(f"⚡ 查询 {elapsed:.1f} ms, 显示 {len(rows)} / 共 {total} 条运行"
+                                f" (多选可对比各币种收益)")
+        self.compare()
+
+    def compare(self):
+        """选中一条时显示各币种统计; 多条时按币种对比收益 %"""
+        ids = sorted({int(self.tbl_runs.item(i.row(), 0).text()) for i in self.tbl_runs.selectionModel().selectedRows()})
+        conn = self.db()
+        if len(ids) == 1:
+            headers = ["币种", "交易数", "收益 %", "收益", "胜率 %", "平均持仓"]
+            rows = conn.execute("SELECT pair, trades, profit_pct, profit_abs, winrate, duration_avg FROM pair_stats"
+                                " WHERE run_id=? ORDER BY profit_pct DESC", ids).fetchall()
+        else:
+            marks = ",".join("?" * len(ids))
+            data = {}
+            for run_id, pair, profit in conn.execute(
+                    f"SELECT run_id, pair, profit_pct FROM pair_stats WHERE run_id IN ({marks})", ids):
+                data.setdefault(pair, {})[run_id] = profit
+            headers = ["币种", *[f"#{i} 收益 %" for i in ids]]
+            rows = [[pair, *[values.get(i) for i in ids]] for pair, values in sorted(data.items())]
+        self.tbl_detail.clear()
+        self.tbl_detail.setColumnCount(len(headers))
+        self.tbl_detail.setHorizontalHeaderLabels(headers)
+        self.tbl_detail.setRowCount(len(rows))
+        for r, row in enumerate(rows):
+            for c, value in enumerate(row):
+                text = f"{value:.2f}" if isinstance(value, float) else ("" if value is None else str(value))
+                self.tbl_detail.setItem(r, c, QTableWidgetItem(text))
+
+    def closeEvent(self, event):
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+        super().closeEvent(event)
+
+# ==========================================
+# 1.10 优化结果浏览 (流式读取 .fthypt, 只保留前 N 个 epoch)
+# ==========================================
+class FthyptReader(QThread):
+    """后台流式读取, 进度与结果通过信号返回"""
+    progress = Signal(int, int)
+    done = Signal(list, int, float)
+
+    def __init__(self, path, n, loss_func):
+        super().__init__()
+        self.path, self.n, self.loss_func = path, n, loss_func
+        self.stopped = False
+
+    def run(self):
+        started = time.perf_counter()
+        def report(pos, total):
+            self.progress.emit(pos, total)
+            return not self.stopped
+        try:
+            top, count = top_fthypt_epochs(self.path, self.n, self.loss_func, report)
+        except OSError:
+            top, count = [], 0
+        self.done.emit(top, count, time.perf_counter() - started)
+
+FTHYPT_COLUMNS = ["排名", "Epoch", "得分", "收益 %", "交易数", "回撤 %", "夏普", "胜率 %"]
+
+class HyperoptResultsWindow(QDialog):
+    """浏览优化结果文件的前 N 个 epoch, 一键把选中参数用于回测"""
+    def __init__(self, lab, parent=None):
+        super().__init__(parent)
+        self.lab = lab
+        self.reader = None
+        self.top = []
+        self.setWindowTitle("🏅 优化结果 (前 N 个 Epoch)")
+        self.resize(1000, 650)
+        self.init_ui()
+        self.scan_files()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        hbox = QHBoxLayout()
+        hbox.addWidget(QLabel("结果文件:"))
+        self.combo_file = QComboBox()
+        hbox.addWidget(self.combo_file, stretch=1)
+        hbox.addWidget(QLabel("前"))
+        self.spin_n = QSpinBox()
+        self.spin_n.setRange(1, 1000)
+        self.spin_n.setValue(FTHYPT_TOP_N)
+        hbox.addWidget(self.spin_n)
+        hbox.addWidget(QLabel("个, 排序:"))
+        self.combo_loss = QComboBox()
+        self.combo_loss.addItem("文件中记录的 Loss", "")
+        for i in range(self.lab.combo_loss.count()):
+            self.combo_loss.addItem(self.lab.combo_loss.itemText(i), self.lab.combo_loss.itemData(i))
+        self.combo_loss.setCurrentIndex(self.lab.combo_loss.currentIndex() + 1)
+        hbox.addWidget(self.combo_loss)
+        self.btn_read = QPushButton("📖 读取")
+        self.btn_read.clicked.connect(self.read)
+        hbox.addWidget(self.btn_read)
+        layout.addLayout(hbox)
+
+        self.tbl_top = QTableWidget(0, len(FTHYPT_COLUMNS))
+        self.tbl_top.setHorizontalHeaderLabels(FTHYPT_COLUMNS)
+        self.tbl_top.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tbl_top.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.tbl_top.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tbl_top.verticalHeader().setVisible(False)
+        self.tbl_top.itemSelectionChanged.connect(self.show_params)
+        self.txt_params = QPlainTextEdit()
+        self.txt_params.setReadOnly(True)
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.tbl_top)
+        splitter.addWidget(self.txt_params)
+        layout.addWidget(splitter)
+
+        hbox_bottom = QHBoxLayout()
+        self.lbl_status = QLabel("")
+        hbox_bottom.addWidget(self.lbl_status, stretch=1)
+        self.btn_use = QPushButton("📋 用这组参数生成回测指令")
+        self.btn_use.setStyleSheet(STYLE_BTN_GREEN)
+        self.btn_use.setToolTip("参数写入单独的策略目录 (--strategy-path), 不改动 user_data/strategies 中的文件")
+        self.btn_use.clicked.connect(self.use_params)
+        hbox_bottom.addWidget(self.btn_use)
+        layout.addLayout(hbox_bottom)
+        self.setLayout(layout)
+
+    def scan_files(self):
+        files = sorted(glob.glob(os.path.join(HYPEROPT_RESULTS_DIR, "*.fthypt")), key=os.path.getmtime, reverse=True)
+        self.combo_file.clear()
+        for f in files:
+            self.combo_file.addItem(f"{os.path.basename(f)} ({os.path.getsize(f) / 2**20:.1f} MB)", f)
+
+    def read(self):
+        path = self.combo_file.currentData()
+        if not path or self.reader: return
+        self.btn_read.setEnabled(False)
+        self.reader = FthyptReader(path, self.spin_n.value(), self.combo_loss.currentData())
+        self.reader.progress.connect(lambda pos, total: self.lbl_status.setText(f"📖 读取中 {pos / max(total, 1):.0%}"))
+        self.reader.done.connect(self.on_read_done)
+        self.reader.start()
+
+    def on_read_done(self, top, count, seconds):
+        self.reader.wait()
+        self.reader.deleteLater()
+        self.reader = None
+        self.btn_read.setEnabled(True)
+        self.top = top
+        self.tbl_top.setRowCount(len(top))
+        for row, (score, epoch) in enumerate(top):
+            m = epoch.get("results_metrics") or {}
+            values = [row + 1, epoch.get("current_epoch", "-"), score, ratio_pct(m.get("profit_total")),
+                      m.get("total_trades"), ratio_pct(m.get("max_drawdown_account")), m.get("sharpe"),
+                      ratio_pct(m.get("winrate"))]
+            for col, value in enumerate(values):
+                text = f"{value:.4f}" if isinstance(value, float) else ("-" if value is None else str(value))
+                self.tbl_top.setItem(row, col, QTableWidgetItem(text))
+        self.lbl_status.setText(f"✅ 共 {count} 个 epoch, 保留前 {len(top)} 个, 用时 {seconds:.1f}s")
+        if top: self.tbl_top.selectRow(0)
+
+    def selected_epoch(self):
+        rows = self.tbl_top.selectionModel().selectedRows()
+        return self.top[rows[0].row()][1] if rows else None
+
+    def show_params(self):
+        epoch = self.selected_epoch()
+        self.txt_params.setPlainText(json.dumps(epoch.get("params_details", {}), ensure_ascii=False, indent=2) if epoch else "")
+
+    def use_params(self):
+        epoch = self.selected_epoch()
+        if not epoch: return
+        path = self.combo_file.currentData()
+        m = re.match(r"strategy_(.+?)_\d{4}-\d\d-\d\d", os.path.basename(path))
+        strategy = m.group(1) if m else self.lab.combo_strat.currentText()
+        folder = os.path.join(PARAMS_DIR, f"{os.path.splitext(os.path.basename(path))[0]}_e{epoch.get('current_epoch', 0)}")
+        try:
+            strategy_path = write_params_strategy(strategy, epoch.get("params_details", {}), folder)
+        except OSError as e:
+            QMessageBox.critical(self, "错误", str(e))
+            return
+        lab = self.lab
+        cmd = build_backtest_cmd(lab.combo_conf.currentText(), lab.get_time_flags(is_backtest=True),
+                                 lab.line_pairs.currentText().split(), strategy, lab.chk_export.isChecked())
+        lab.txt_preview.setText(cmd.rstrip() + f" --strategy-path {strategy_path}")
+        lab.raise_()
+
+    def reject(self):
+        if self.reader:
+            self.reader.stopped = True
+            self.reader.wait()
+        super().reject()
+
+# ==========================================
+# 1.11 交易分析 (NumPy 向量化: 资金曲线 / 回撤 / 滚动指标 / 分币种与星期统计)
+# ==========================================
+# 收益按初始资金归一化为日收益 (无交易的日子为 0), 年化按 365 天, 与 freqtrade 的评估函数口径一致;
+# 未安装 NumPy 时使用同口径的纯 Python 实现 (也是基准测试的参照)。
+WEEKDAYS = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+DAY_MS = 86400 * 1000
+STD_EPS = 1e-12  # 日收益标准差低于此值视为 0 (收益近乎恒定时只剩浮点噪声, 否则会算出天文数字的夏普)
+
+def load_trade_columns(data, strategy=None):
+    """从已读取的回测导出 (load_backtest_export) 中取出交易, 返回 (列式数据 {pair, close_ts, profit_abs, profit_ratio}, 初始资金, 策略名)"""
+    strategies = data.get("strategy") or {}
+    if not strategies: raise ValueError("导出文件中没有策略结果")
+    strategy = strategy if strategy in strategies else next(iter(strategies))
+    st = strategies[strategy]
+    cols = {"pair": [], "close_ts": [], "profit_abs": [], "profit_ratio": []}
+    for t in st.get("trades", []):
+        ts = t.get("close_timestamp")
+        if ts is None: ts = int(datetime.fromisoformat(t["close_date"]).timestamp() * 1000)
+        cols["pair"].append(t["pair"])
+        cols["close_ts"].append(int(ts))
+        cols["profit_abs"].append(float(t.get("profit_abs") or 0))
+        cols["profit_ratio"].append(float(t.get("profit_ratio") or 0))
+    return cols, float(st.get("starting_balance") or st.get("dry_run_wallet") or 1000), strategy
+
+def analyze_trades(cols, starting_balance, window=ROLLING_DAYS):
+    """向量化计算全部分析指标; 未安装 NumPy 时退回纯 Python 实现"""
+    try:
+        import numpy as np
+    except ImportError:
+        return analyze_trades_py(cols, starting_balance, window)
+    if not cols["close_ts"]: return None
+    ts = np.asarray(cols["close_ts"], dtype=np.int64)
+    order = np.argsort(ts, kind="stable")
+    ts = ts[order]
+    profit = np.asarray(cols["profit_abs"], dtype=np.float64)[order]
+    ratio = np.asarray(cols["profit_ratio"], dtype=np.float64)[order]
+    # 币种编码用字典 (哈希) 而不是 np.unique (对象数组排序很慢)
+    codes = {}
+    pair_idx = np.fromiter((codes.setdefault(p, len(codes)) for p in cols["pair"]), np.int64, len(ts))[order]
+    pair_names = np.array(list(codes), dtype=object)
+
+    equity = starting_balance + np.cumsum(profit)
+    peak = np.maximum.accumulate(np.concatenate(([starting_balance], equity)))[1:]
+    dd = (peak - equity) / peak
+    worst = int(np.argmax(dd))
+
+    day = ts // DAY_MS
+    day0 = int(day[0])
+    ndays = int(day[-1]) - day0 + 1
+    daily = np.bincount(day - day0, weights=profit, minlength=ndays)
+    r = daily / starting_balance
+    total, years = profit.sum() / starting_balance, ndays / 365
+
+    def sharpe_sortino(mean, var, down):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sd = np.sqrt(np.maximum(var, 0))
+            return (np.where(sd > STD_EPS, mean / sd * math.sqrt(365), np.nan),
+                    np.where(down > 0, mean / np.sqrt(down) * math.sqrt(365), np.nan))
+    sharpe, sortino = sharpe_sortino(r.mean(), r.var(), np.mean(np.minimum(r, 0) ** 2))
+    rolling = {"sharpe": np.empty(0), "sortino": np.empty(0), "calmar": np.empty(0)}
+    if ndays >= window:
+        # 方差按窗口两遍计算 (先减均值), 不用 E[x²]−mean²: 后者在收益近乎恒定时相消, 误差大甚至为负
+        r_wins = np.lib.stride_tricks.sliding_window_view(r, window)
+        rolling["sharpe"], rolling["sortino"] = sharpe_sortino(
+            r_wins.mean(axis=1), r_wins.var(axis=1), (np.minimum(r_wins, 0) ** 2).mean(axis=1))
+        # 窗口内的资金曲线包含窗口前一天的收盘值
+        eq_days = starting_balance + np.concatenate(([0.0], np.cumsum(daily)))
+        wins = np.lib.stride_tricks.sliding_window_view(eq_days, window + 1)
+        wdd = ((np.maximum.accumulate(wins, axis=1) - wins) / np.maximum.accumulate(wins, axis=1)).max(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rolling["calmar"] = np.where(wdd > 0, (wins[:, -1] / wins[:, 0] - 1) * 365 / window / wdd, np.nan)
+
+    n_pairs = len(pair_names)
+    counts = np.bincount(pair_idx, minlength=n_pairs)
+    pairs = list(zip(pair_names.tolist(), counts.tolist(),
+                     np.bincount(pair_idx, weights=profit, minlength=n_pairs).tolist(),
+                     (np.bincount(pair_idx, weights=profit > 0, minlength=n_pairs) / counts * 100).tolist(),
+                     (np.bincount(pair_idx, weights=ratio, minlength=n_pairs) / counts * 100).tolist()))
+    weekday = (day + 3) % 7  # 1970-01-01 是星期四
+    wd_counts = np.bincount(weekday, minlength=7)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        wd_win = np.bincount(weekday, weights=profit > 0, minlength=7) / wd_counts * 100
+    weekdays = list(zip(WEEKDAYS, wd_counts.tolist(), np.bincount(weekday, weights=profit, minlength=7).tolist(),
+                        wd_win.tolist()))
+    max_dd = float(dd[worst])
+    return {"trades": int(len(ts)), "profit_abs": float(profit.sum()), "profit_pct": float(total * 100),
+            "max_dd_pct": max_dd * 100, "max_dd_abs": float(peak[worst] - equity[worst]), "days": ndays,
+            "sharpe": float(sharpe), "sortino": float(sortino),
+            "calmar": total / years / max_dd if max_dd > 0 else float("nan"),
+            "equity": equity.tolist(), "rolling": {k: v.tolist() for k, v in rolling.items()},
+            "pairs": sorted(pairs, key=lambda p: (-p[2], p[0])), "weekdays": weekdays}
+
+def analyze_trades_py(cols, starting_balance, window=ROLLING_DAYS):
+    """纯 Python 参照实现 (与 analyze_trades 结果一致)"""
+    if not cols["close_ts"]: return None
+    rows = sorted(zip(cols["close_ts"], range(len(cols["close_ts"]))))
+    order = [i for _, i in rows]
+    ts = [cols["close_ts"][i] for i in order]
+    profit = [cols["profit_abs"][i] for i in order]
+    equity, peak, eq, pk, max_dd, max_dd_abs = [], [], starting_balance, starting_balance, 0.0, 0.0
+    for p in profit:
+        eq += p
+        pk = max(pk, eq)
+        equity.append(eq)
+        if (pk - eq) / pk > max_dd: max_dd, max_dd_abs = (pk - eq) / pk, pk - eq
+    day0 = ts[0] // DAY_MS
+    ndays = ts[-1] // DAY_MS - day0 + 1
+    daily = [0.0] * ndays
+    for t, p in zip(ts, profit): daily[t // DAY_MS - day0] += p
+    r = [d / starting_balance for d in daily]
+
+    def sharpe_sortino(xs):
+        mean = sum(xs) / len(xs)
+        sd = math.sqrt(sum((x - mean) ** 2 for x in xs) / len(xs))
+        down = sum(min(x, 0) ** 2 for x in xs) / len(xs)
+        return (mean / sd * math.sqrt(365) if sd > STD_EPS else float("nan"),
+                mean / math.sqrt(down) * math.sqrt(365) if down > 0 else float("nan"))
+    sharpe, sortino = sharpe_sortino(r)
+    rolling = {"sharpe": [], "sortino": [], "calmar": []}
+    eq_days = [starting_balance]
+    for d in daily: eq_days.append(eq_days[-1] + d)
+    for i in range(window - 1, ndays):
+        sh, so = sharpe_sortino(r[i - window + 1:i + 1])
+        rolling["sharpe"].append(sh)
+        rolling["sortino"].append(so)
+        win = eq_days[i - window + 1:i + 2]
+        pk, wdd = win[0], 0.0
+        for e in win:
+            pk = max(pk, e)
+            wdd = max(wdd, (pk - e) / pk)
+        rolling["calmar"].append((win[-1] / win[0] - 1) * 365 / window / wdd if wdd > 0 else float("nan"))
+
+    stats = {}
+    for i in order:
+        s = stats.setdefault(cols["pair"][i], [0, 0.0, 0, 0.0])
+        s[0] += 1
+        s[1] += cols["profit_abs"][i]
+        s[2] += cols["profit_abs"][i] > 0
+        s[3] += cols["profit_ratio"][i]
+    pairs = [(k, n, pr, w / n * 100, ra / n * 100) for k, (n, pr, w, ra) in sorted(stats.items())]
+    wd = [[0, 0.0, 0] for _ in range(7)]
+    for t, p in zip(ts, profit):
+        s = wd[(t // DAY_MS + 3) % 7]
+        s[0] += 1
+        s[1] += p
+        s[2] += p > 0
+    weekdays = [(WEEKDAYS[i], n, pr, w / n * 100 if n else float("nan")) for i, (n, pr, w) in enumerate(wd)]
+    total = sum(profit) / starting_balance
+    return {"trades": len(ts), "profit_abs": sum(profit), "profit_pct": total * 100, "max_dd_pct": max_dd * 100,
+            "max_dd_abs": max_dd_abs, "days": ndays, "sharpe": sharpe, "sortino": sortino,
+            "calmar": total / (ndays / 365) / max_dd if max_dd > 0 else float("nan"),
+            "equity": equity, "rolling": rolling, "pairs": sorted(pairs, key=lambda p: (-p[2], p[0])), "weekdays": weekdays}
+
+def same_result(a, b, rel=1e-6):
+    """比较两份分析结果 (浮点按相对误差, NaN 视为相等)"""
+    if isinstance(a, dict): return a.keys() == b.keys() and all(same_result(a[k], b[k], rel) for k in a)
+    if isinstance(a, (list, tuple)): return len(a) == len(b) and all(same_result(x, y, rel) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        if math.isnan(a) and math.isnan(b): return True
+        return math.isclose(a, b, rel_tol=rel, abs_tol=1e-9)
+    return a == b
+
+def benchmark_analytics(n=ANALYTICS_BENCH_TRADES, seed=1):
+    """用模拟交易比较 NumPy 与纯 Python 实现: 返回 (NumPy 秒数, 纯 Python 秒数, 结果是否一致)"""
+    import random
+    rnd = random.Random(seed)
+    pairs = [f"P{i}/USDT" for i in range(40)]
+    start = 1_700_000_000_000
+    cols = {"pair": [], "close_ts": [], "profit_abs": [], "profit_ratio": []}
+    for _ in range(n):
+        ratio = rnd.gauss(0.001, 0.02)
+        cols["pair"].append(rnd.choice(pairs))
+        cols["close_ts"].append(start + rnd.randrange(730 * DAY_MS))
+        cols["profit_ratio"].append(ratio)
+        cols["profit_abs"].append(ratio * 100)
+    analyze_trades({k: v[:10] for k, v in cols.items()}, 10_000)  # 预热 (首次调用时导入 NumPy)
+    t = time.perf_counter()
+    fast = analyze_trades(cols, 10_000)
+    t_fast = time.perf_counter() - t
+    t = time.perf_counter()
+    ref = analyze_trades_py(cols, 10_000)
+    t_ref = time.perf_counter() - t
+    return t_fast, t_ref, same_result(fast, ref)
+
+class TradeAnalyticsWindow(QDialog):
+    """回测交易分析: 直接读取导出文件在本地计算, 不启动容器"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("📉 交易分析 (资金曲线 / 回撤 / 滚动指标)")
+        self.resize(950, 750)
+        self.init_ui()
+        self.scan_files()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        hbox = QHBoxLayout()
+        hbox.addWidget(QLabel("回测结果:"))
+        self.combo_file = QComboBox()
+        self.combo_file.currentIndexChanged.connect(lambda: self.combo_strategy.clear())
+        hbox.addWidget(self.combo_file, stretch=1)
+        hbox.addWidget(QLabel("策略:"))
+        self.combo_strategy = QComboBox()
+        hbox.addWidget(self.combo_strategy)
+        hbox.addWidget(QLabel("滚动窗口:"))
+        self.spin_window = QSpinBox()
+        self.spin_window.setRange(2, 365)
+        self.spin_window.setValue(ROLLING_DAYS)
+        self.spin_window.setSuffix(" 天")
+        hbox.addWidget(self.spin_window)
+        self.btn_analyze = QPushButton("📊 分析")
+        self.btn_analyze.setStyleSheet(STYLE_BTN_GREEN)
+        self.btn_analyze.clicked.connect(self.analyze)
+        hbox.addWidget(self.btn_analyze)
+        self.btn_bench = QPushButton("⏱ 基准测试")
+        self.btn_bench.setToolTip(f"用 {ANALYTICS_BENCH_TRADES} 笔模拟交易比较 NumPy 与纯 Python 实现的耗时和结果")
+        self.btn_bench.clicked.connect(self.run_benchmark)
+        hbox.addWidget(self.btn_bench)
+        layout.addLayout(hbox)
+
+        self.txt_summary = QPlainTextEdit()
+        self.txt_summary.setReadOnly(True)
+        self.txt_summary.setStyleSheet("font-family: Consolas;")
+        self.tbl_pairs = QTableWidget(0, 5)
+        self.tbl_pairs.setHorizontalHeaderLabels(["币种", "交易数", "收益", "胜率 %", "平均收益 %"])
+        self.tbl_weekdays = QTableWidget(0, 4)
+        self.tbl_weekdays.setHorizontalHeaderLabels(["星期", "交易数", "收益", "胜率 %"])
+        for tbl in (self.tbl_pairs, self.tbl_weekdays):
+            tbl.setEditTriggers(QAbstractItemView.NoEditTriggers)
+            tbl.verticalHeader().setVisible(False)
+        tables = QSplitter(Qt.Horizontal)
+        tables.addWidget(self.tbl_pairs)
+        tables.addWidget(self.tbl_weekdays)
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(self.txt_summary)
+        splitter.addWidget(tables)
+        layout.addWidget(splitter)
+        self.setLayout(layout)
+
+    def scan_files(self):
+        files = [f for f in result_files() if not f.endswith(".fthypt")]
+        self.combo_file.clear()
+        for f in sorted(files, key=os.path.getmtime, reverse=True):
+            self.combo_file.addItem(os.path.basename(f), f)
+
+    def analyze(self):
+        path = self.combo_file.currentData()
+        if not path: return
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            started = time.perf_counter()
+            data = load_backtest_export(path)  # 只解析一次, 策略列表也从这里取
+            cols, balance, strategy = load_trade_columns(data, self.combo_strategy.currentText() or None)
+            loaded = time.perf_counter()
+            result = analyze_trades(cols, balance, self.spin_window.value())
+            computed = time.perf_counter()
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"无法分析 {os.path.basename(path)}: {e}")
+            return
+        finally:
+            QApplication.restoreOverrideCursor()
+        if not self.combo_strategy.count():
+            self.combo_strategy.addItems(list((data.get("strategy") or {}).keys()))
+            self.combo_strategy.setCurrentText(strategy)
+        if not result:
+            self.txt_summary.setPlainText("该回测没有交易。")
+            return
+        self.show_result(result, balance, strategy, loaded - started, computed - loaded)
+
+    def show_result(self, res, balance, strategy, t_load, t_compute):
+        f = lambda v, d=2: "-" if v is None or (isinstance(v, float) and math.isnan(v)) else f"{v:.{d}f}"
+        roll = res["rolling"]
+        last = lambda k: roll[k][-1] if roll[k] else None
+        lines = [f"策略 {strategy}: {res['trades']} 笔交易, {res['days']} 天, 初始资金 {balance:g}",
+                 f"总收益 {f(res['profit_abs'])} ({f(res['profit_pct'])}%) | 最大回撤 {f(res['max_dd_pct'])}% ({f(res['max_dd_abs'])})",
+                 f"夏普 {f(res['sharpe'])} | 索提诺 {f(res['sortino'])} | 卡尔玛 {f(res['calmar'])}",
+                 f"资金曲线  {sparkline(res['equity'], 60)}"]
+        for key, name in (("sharpe", "夏普"), ("sortino", "索提诺"), ("calmar", "卡尔玛")):
+            values = [v for v in roll[key] if not math.isnan(v)]
+            lines.append(f"滚动{name} ({self.spin_window.value()}天) 最新 {f(last(key))}  {sparkline(values, 60)}")
+        lines.append(f"⏱ 读取 {t_load * 1000:.0f} ms, 计算 {t_compute * 1000:.0f} ms")
+        self.txt_summary.setPlainText("\n".join(lines))
+        for tbl, rows in ((self.tbl_pairs, res["pairs"]), (self.tbl_weekdays, res["weekdays"])):
+            tbl.setRowCount(len(rows))
+            for r, row in enumerate(rows):
+                for c, value in enumerate(row):
+                    tbl.setItem(r, c, QTableWidgetItem(f(value) if isinstance(value, float) else str(value)))
+
+    def run_benchmark(self):
+        QApplication.setOverrideCursor(Qt.WaitCursor)
+        try:
+            t_fast, t_ref, same = benchmark_analytics()
+        finally:
+            QApplication.restoreOverrideCursor()
+        self.txt_summary.appendPlainText(
+            f"\n⏱ 基准测试 ({ANALYTICS_BENCH_TRADES} 笔交易): 向量化 {t_fast * 1000:.0f} ms, 纯 Python {t_ref * 1000:.0f} ms, "
+            f"加速 {t_ref / max(t_fast, 1e-9):.1f} 倍, 结果{'一致 ✅' if same else '不一致 ❌'}")
+
+# ==========================================
+# 1.12 任务日志归档 (分段轮转 + gzip 压缩 + 行偏移索引 + mmap 搜索)
+# ==========================================
+def log_segments(path):
+    """任务日志的分段文件 (按顺序); 旧版单文件日志视为只有一段"""
+    if os.path.isfile(path): return [path]
+    try:
+        names = sorted(n for n in os.listdir(path) if n.startswith("seg_"))
+    except OSError:
+        return []
+    # 压缩进行中可能短暂同时存在 .log 与 .log.gz, 以完整的 .gz 为准
+    return [os.path.join(path, n) for n in names if not (n.endswith(".log") and n + ".gz" in names)]
+
+def load_log_index(path):
+    try:
+        with open(os.path.join(path, "index.json"), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"segments": {}}
+
+def open_segment(seg):
+    return gzip.open(seg, 'rb') if seg.endswith(".gz") else open(seg, 'rb')
+
+class JobLog:
+    """
+    单个任务的磁盘日志: seg_00000.log 写满 LOG_SEGMENT_BYTES 后轮转, 旧段在后台压缩为 .log.gz。
+    index.json 记录每段的起始行号、行数以及每 LOG_INDEX_STRIDE 行的字节偏移, 用于定位行号和读取上下文。
+    写入由 LogBuffer 在其锁内调用。
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.index = load_log_index(path)
+        self.seg_no = len(log_segments(path))  # 任务重新排队运行时接着写
+        self.lines = sum(meta["lines"] for meta in self.index["segments"].values())
+        self._compressors = []
+        self._saved = time.monotonic()
+        self._open_segment()
+
+    def _open_segment(self):
+        self.name = f"seg_{self.seg_no:05d}.log"
+        self.file = open(os.path.join(self.path, self.name), 'ab', buffering=LOG_READ_CHUNK)
+        self.seg = {"first_line": self.lines, "lines": 0, "bytes": 0, "offsets": [[0, 0]],
+                    "started": time.time()}
+        self.index["segments"][self.name] = self.seg
+
+    def write_lines(self, lines):
+        data = ("\n".join(lines) + "\n").encode('utf-8', errors='replace')
+        seg = self.seg
+        next_mark = (seg["lines"] // LOG_INDEX_STRIDE + 1) * LOG_INDEX_STRIDE
+        if seg["lines"] + len(lines) >= next_mark:  # 本批跨过索引点: 只在跨点处计算字节偏移
+            pos, line_no = seg["bytes"], seg["lines"]
+            for line in lines:
+                pos += len(line.encode('utf-8', errors='replace')) + 1
+                line_no += 1
+                if line_no == next_mark:
+                    seg["offsets"].append([line_no, pos])
+                    next_mark += LOG_INDEX_STRIDE
+        self.file.write(data)
+        seg["lines"] += len(lines)
+        seg["bytes"] += len(data)
+        self.lines += len(lines)
+        if seg["bytes"] >= LOG_SEGMENT_BYTES: self.rotate()
+        elif time.monotonic() - self._saved >= LOG_INDEX_SAVE_SEC: self.save_index()
+
+    def rotate(self):
+        self.file.close()
+        self.seg["ended"] = time.time()
+        done = os.path.join(self.path, self.name)
+        self.seg_no += 1
+        self._open_segment()
+        self.save_index()
+        t = threading.Thread(target=self._compress, args=(done,), daemon=True)
+        t.start()
+        self._compressors.append(t)
+
+    @staticmethod
+    def _compress(seg):
+        try:
+            with open(seg, 'rb') as src, gzip.open(seg + ".gz.tmp", 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, LOG_READ_CHUNK)
+            os.replace(seg + ".gz.tmp", seg + ".gz")
+            os.remove(seg)
+        except OSError: pass
+
+    def save_index(self):
+        self._saved = time.monotonic()
+        tmp = os.path.join(self.path, "index.json.tmp")
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f: json.dump(self.index, f)
+            os.replace(tmp, os.path.join(self.path, "index.json"))
+        except OSError: pass
+
+    def close(self):
+        self.file.close()
+        self.seg["ended"] = time.time()
+        self.save_index()
+        for t in self._compressors: t.join()
+
+def iter_log_lines(path):
+    """按顺序逐行读取任务日志 (自动解压 .gz 分段)"""
+    for seg in log_segments(path):
+        with open_segment(seg) as f:
+            for raw in f:
+                yield raw.decode('utf-8', errors='replace').rstrip("\n")
+
+def export_log(path, dest):
+    """把分段日志合并成单个文本文件 (结果缓存中保存的 output.log)"""
+    with open(dest, 'wb') as out:
+        for seg in log_segments(path):
+            with open_segment(seg) as f: shutil.copyfileobj(f, out, LOG_READ_CHUNK)
+
+def _iter_log_from(path, start):
+    """
+    从第 start 行开始逐行产出 (行号, 原始字节): 用偏移索引跳过之前的段并跳到最近的索引点, 不从头扫描。
+    读完时生成器的返回值是日志总行数。
+    """
+    index = load_log_index(path) if os.path.isdir(path) else {"segments": {}}
+    first = 0
+    for seg in log_segments(path):
+        meta = index["segments"].get(os.path.basename(seg).replace(".gz", ""))
+        if meta:
+            first = meta["first_line"]
+            # 已结束的段行数可信, 整段在目标之前就跳过; 写入中的段索引可能落后, 只用其中的偏移
+            if "ended" in meta and first + meta["lines"] <= start:
+                first += meta["lines"]
+                continue
+        with open_segment(seg) as f:
+            n = first
+            if meta:
+                mark = max((o for o in meta["offsets"] if first + o[0] <= start), key=lambda o: o[0], default=[0, 0])
+                f.seek(mark[1])  # gzip 段的 seek 会顺序解压, 但只解压到目标位置
+                n = first + mark[0]
+            for raw in f:
+                if n >= start: yield n, raw
+                n += 1
+        first = n
+    return first
+
+def read_log_context(path, line_no, before=LOG_CONTEXT_LINES, after=LOG_CONTEXT_LINES):
+    """读取第 line_no 行附近的内容"""
+    out = []
+    for n, raw in _iter_log_from(path, max(0, line_no - before)):
+        out.append((n, raw.decode('utf-8', errors='replace').rstrip("\n")))
+        if n >= line_no + after: break
+    return out
+
+def read_log_from(path, offset):
+    """
+    第 offset 行之后的全部完整行 (增量轮询用, 只读新增部分); 返回 (行列表, 日志总行数)。
+    写入中的日志末尾可能是写了一半的行, 不返回, 下次轮询时再读。
+    """
+    lines, it = [], _iter_log_from(path, offset)
+    while True:
+        try:
+            n, raw = next(it)
+        except StopIteration as stop:
+            return lines, stop.value
+        if not raw.endswith(b"\n"): return lines, n
+        lines.append(raw.decode('utf-8', errors='replace').rstrip("\n"))
+
+def _count_newlines(buf, start, end):
+    """统计 buf[start:end] 中的换行数; mmap 没有 count(), 按 LOG_READ_CHUNK 分块切片, 每次最多复制一块"""
+    if isinstance(buf, bytes): return buf.count(b"\n", start, end)
+    count = 0
+    for pos in range(start, end, LOG_READ_CHUNK):
+        count += buf[pos:min(pos + LOG_READ_CHUNK, end)].count(b"\n")
+    return count
+
+def _scan_buffer(buf, pattern, base_line, hits, limit, line_at=0):
+    """在一块以换行结尾的字节中搜索, 每行最多记一次命中; 返回本块的行数"""
+    pos = 0
+    while len(hits) < limit:
+        m = pattern.search(buf, pos)
+        if not m: break
+        start = buf.rfind(b"\n", 0, m.start()) + 1
+        end = buf.find(b"\n", m.end())
+        if end < 0: end = len(buf)
+        line_at += _count_newlines(buf, pos, start)
+        hits.append((base_line + line_at, bytes(buf[start:end]).decode('utf-8', errors='replace')))
+        pos = end + 1
+        line_at += 1
+    return line_at + _count_newlines(buf, pos, len(buf))
+
+def search_log(path, pattern, limit=LOG_SEARCH_MAX_HITS):
+    """
+    搜索单个任务日志, 返回 ([(行号, 文本)], 扫描字节数)。
+    未压缩段用 mmap 直接在页缓存上匹配 (不读入内存), 压缩段分块解压后匹配。
+    """
+    hits, scanned, base = [], 0, 0
+    for seg in log_segments(path):
+        if len(hits) >= limit: break
+        if seg.endswith(".gz"):
+            with gzip.open(seg, 'rb') as f:
+                carry = b""
+                while len(hits) < limit:
+                    chunk = f.read(LOG_READ_CHUNK * 16)
+                    if not chunk:
+                        if carry: base += _scan_buffer(carry + b"\n", pattern, base, hits, limit)
+                        break
+                    chunk = carry + chunk
+                    cut = chunk.rfind(b"\n") + 1
+                    carry = chunk[cut:]
+                    scanned += cut
+                    base += _scan_buffer(chunk[:cut], pattern, base, hits, limit)
+            continue
+        try:
+            with open(seg, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if not size: continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    scanned += size
+                    base += _scan_buffer(mm, pattern, base, hits, limit)
+        except (OSError, ValueError): continue
+    return hits, scanned
+
+def list_job_logs(root=JOB_LOG_DIR, legacy_dir=LOG_DIR):
+    """所有任务日志 (新的在前): [(路径, 修改时间, 字节数)], 包括旧版 lab_*.log 单文件"""
+    entries = []
+    for path in glob.glob(os.path.join(root, "*")) + glob.glob(os.path.join(legacy_dir, "lab_*.log")):
+        try:
+            files = [path] if os.path.isfile(path) else [os.path.join(path, n) for n in os.listdir(path)]
+            stats = [os.stat(f) for f in files]
+        except OSError:
+            continue
+        if stats: entries.append((path, max(st.st_mtime for st in stats), sum(st.st_size for st in stats)))
+    entries.sort(key=lambda e: e[1], reverse=True)
+    return entries
+
+def prune_job_logs(keep=(), days=LOG_RETENTION_DAYS, max_mb=LOG_RETENTION_MB, root=JOB_LOG_DIR, legacy_dir=LOG_DIR):
+    """
+    保留策略: 删除超过 days 天的日志; 总量预算从最新的日志开始分配, 第一个放不下的日志及比它更旧的全部删除
+    (即总量超过 max_mb 时从最旧的开始删)。keep 中的日志 (运行中) 不删, 但占用预算。
+    """
+    cutoff, budget, removed, full = time.time() - days * 86400, max_mb * 1024 * 1024, 0, False
+    for path, mtime, size in list_job_logs(root, legacy_dir):  # 新的在前
+        if path in keep:
+            budget -= size
+            continue
+        full = full or size > budget
+        if mtime < cutoff or full:
+            if os.path.isdir(path): shutil.rmtree(path, ignore_errors=True)
+            else:
+                try: os.remove(path)
+                except OSError: continue
+            removed += 1
+        else:
+            budget -= size
+    return removed
+
+class LogSearchWorker(QThread):
+    """后台搜索所有任务日志, 按任务分批返回命中"""
+    hits_signal = Signal(str, list)
+    done = Signal(str)
+
+    def __init__(self, pattern, limit=LOG_SEARCH_MAX_HITS):
+        super().__init__()
+        self.pattern = pattern
+        self.limit = limit
+        self.stopped = False
+
+    def run(self):
+        started, total, scanned, jobs = time.perf_counter(), 0, 0, 0
+        for path, _, _ in list_job_logs():
+            if self.stopped or total >= self.limit: break
+            hits, n = search_log(path, self.pattern, self.limit - total)
+            scanned += n
+            jobs += 1
+            if hits:
+                total += len(hits)
+                self.hits_signal.emit(path, hits)
+        self.done.emit(f"命中 {total} 行{' (已达上限)' if total >= self.limit else ''}, 搜索 {jobs} 个任务日志 "
+                       f"{scanned / 1024 / 1024:.1f} MB, 用时 {(time.perf_counter() - started) * 1000:.0f} ms")
+
+class LogSearchWindow(QDialog):
+    """跨任务日志搜索: 正则匹配, 双击命中查看上下文"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("🔎 搜索任务日志")
+        self.resize(1000, 700)
+        self.worker = None
+        layout = QVBoxLayout()
+        hbox = QHBoxLayout()
+        hbox.addWidget(QLabel("正则:"))
+        self.line_pattern = QLineEdit()
+        self.line_pattern.setPlaceholderText("如 Traceback|ERROR|BTC/USDT (不区分大小写)")
+        self.line_pattern.returnPressed.connect(self.search)
+        hbox.addWidget(self.line_pattern, stretch=1)
+        btn = QPushButton("搜索")
+        btn.clicked.connect(self.search)
+        hbox.addWidget(btn)
+        btn_prune = QPushButton("🧹 按保留策略清理")
+        btn_prune.setToolTip(f"删除 {LOG_RETENTION_DAYS} 天前的日志, 总量超过 {LOG_RETENTION_MB} MB 时从最旧的开始删")
+        btn_prune.clicked.connect(self.prune)
+        hbox.addWidget(btn_prune)
+        layout.addLayout(hbox)
+        splitter = QSplitter(Qt.Vertical)
+        self.tbl_hits = QTableWidget(0, 3)
+        self.tbl_hits.setHorizontalHeaderLabels(["任务日志", "行号", "内容"])
+        self.tbl_hits.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.tbl_hits.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tbl_hits.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tbl_hits.itemSelectionChanged.connect(self.show_context)
+        splitter.addWidget(self.tbl_hits)
+        self.txt_context = QPlainTextEdit()
+        self.txt_context.setReadOnly(True)
+        self.txt_context.setStyleSheet("background-color: #1e1e1e; color: #dcdcdc; font-family: Consolas; font-size: 10pt;")
+        splitter.addWidget(self.txt_context)
+        layout.addWidget(splitter)
+        self.lbl_status = QLabel("")
+        layout.addWidget(self.lbl_status)
+        self.setLayout(layout)
+        self.paths = []
+
+    def search(self):
+        text = self.line_pattern.text().strip()
+        if not text or (self.worker and self.worker.isRunning()): return
+        try:
+            pattern = re.compile(text.encode('utf-8'), re.I)
+        except re.error as e:
+            self.lbl_status.setText(f"❌ 正则错误: {e}")
+            return
+        self.tbl_hits.setRowCount(0)
+        self.paths = []
+        self.lbl_status.setText("⏳ 搜索中...")
+        self.worker = LogSearchWorker(pattern)
+        self.worker.hits_signal.connect(self.add_hits)
+        self.worker.done.connect(self.lbl_status.setText)
+        self.worker.start()
+
+    @Slot(str, list)
+    def add_hits(self, path, hits):
+        row = self.tbl_hits.rowCount()
+        self.tbl_hits.setRowCount(row + len(hits))
+        for line_no, text in hits:
+            self.paths.append(path)
+            for col, value in enumerate((os.path.basename(path), str(line_no + 1), text)):
+                self.tbl_hits.setItem(row, col, QTableWidgetItem(value))
+            row += 1
+
+    def show_context(self):
+        rows = self.tbl_hits.selectionModel().selectedRows()
+        if not rows: return
+        row = rows[0].row()
+        path, line_no = self.paths[row], int(self.tbl_hits.item(row, 1).text()) - 1
+        lines = read_log_context(path, line_no)
+        self.txt_context.setPlainText("\n".join(f"{'▶' if n == line_no else ' '} {n + 1:>7} | {t}" for n, t in lines))
+        cursor = self.txt_context.textCursor()
+        cursor.movePosition(QTextCursor.Start)
+        cursor.movePosition(QTextCursor.Down, n=sum(1 for n, _ in lines if n < line_no))
+        self.txt_context.setTextCursor(cursor)
+        self.txt_context.centerCursor()
+
+    def prune(self):
+        scheduler = getattr(self.parent(), "scheduler", None)
+        keep = {j.log_path for j in scheduler.jobs.values() if j.status in ("queued", "running")} if scheduler else set()
+        self.lbl_status.setText(f"🧹 已删除 {prune_job_logs(keep)} 个任务日志")
+
+    def reject(self):
+        if self.worker:
+            self.worker.stopped = True
+            self.worker.wait()
+        super().reject()
 
 # ==========================================
-# 0. 基础配置与路径
+# 1.13 策略索引 (AST 解析类名/周期/ROI/止损/参数空间, 按文件缓存, 文件监视自动刷新)
 # ==========================================
-def get_app_path():
-    """获取程序运行时的绝对路径 (兼容 EXE 和 Python 脚本)"""
-    if getattr(sys, 'frozen', False):
-        return os.path.dirname(sys.executable)
-    else:
-        return os.path.dirname(os.path.abspath(__file__))
+PARAM_TYPES = ("IntParameter", "DecimalParameter", "RealParameter", "CategoricalParameter", "BooleanParameter")
+BUILTIN_SPACES = ("roi", "stoploss", "trailing")  # freqtrade 内置的空间, 任何策略都能优化
 
-APP_ROOT = get_app_path()
-USER_DATA_DIR = os.path.join(APP_ROOT, "user_data")
-STRATEGY_DIR = os.path.join(USER_DATA_DIR, "strategies")
-CONFIG_PATH = os.path.join(USER_DATA_DIR, "config.json")
-# [新增] 历史记录文件路径
-HISTORY_PATH = os.path.join(USER_DATA_DIR, "pairs_history.json")
+def _node_name(node):
+    import ast
+    if isinstance(node, ast.Name): return node.id
+    if isinstance(node, ast.Attribute): return node.attr
+    return ""
 
-# --- 样式表 ---
-STYLE_LIGHT_ON = "background-color: #2ecc71; border-radius: 10px; border: 2px solid #27ae60;" 
-STYLE_LIGHT_OFF = "background-color: #e74c3c; border-radius: 10px; border: 2px solid #c0392b;" 
-STYLE_BTN_GREEN = "background-color: #dff0d8; color: #3c763d; font-weight: bold;"
-STYLE_BTN_BLUE = "background-color: #d9edf7; color: #31708f; font-weight: bold;"
-STYLE_BTN_PURPLE = "background-color: #e8daef; color: #8e44ad; font-weight: bold;"
-STYLE_BTN_ORANGE = "background-color: #f39c12; color: white; font-weight: bold;"
-STYLE_BTN_RED = "background-color: #ffcccc; color: #cc0000; font-weight: bold; font-size: 11pt;"
+def _literal(node):
+    import ast
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+def parse_strategy_source(source):
+    """
+    解析策略源码 (不执行), 返回 [{class, bases, timeframe, minimal_roi, stoploss, params: {名称: 空间}}]。
+    只收录继承 IStrategy 或其他策略类的类; 参数空间未写 space= 时按 buy_/sell_ 前缀推断 (与 freqtrade 一致)。
+    """
+    import ast
+    tree = ast.parse(source)
+    found = []
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef): continue
+        bases = [_node_name(b) for b in node.bases]
+        info = {"class": node.name, "bases": bases, "timeframe": None, "minimal_roi": None,
+                "stoploss": None, "params": {}}
+        for stmt in node.body:
+            if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1:
+                target, value = stmt.targets[0], stmt.value
+            elif isinstance(stmt, ast.AnnAssign) and stmt.value is not None:
+                target, value = stmt.target, stmt.value
+            else:
+                continue
+            if not isinstance(target, ast.Name): continue
+            name = target.id
+            if name in ("timeframe", "minimal_roi", "stoploss"):
+                info[name] = _literal(value)
+            elif isinstance(value, ast.Call) and _node_name(value.func) in PARAM_TYPES:
+                space = next((_literal(k.value) for k in value.keywords if k.arg == "space"), None)
+                if space is None:
+                    space = name.split("_", 1)[0] if name.startswith(("buy_", "sell_")) else None
+                if space: info["params"][name] = space
+        found.append(info)
+    strategies = {c["class"] for c in found if any("IStrategy" in b for b in c["bases"])}
+    while True:  # 同一文件中继承其他策略类的子类
+        more = {c["class"] for c in found if c["class"] not in strategies and strategies & set(c["bases"])}
+        if not more: break
+        strategies |= more
+    # 继承自其他文件中策略的类 (基类名以 Strategy 结尾) 也收录, 基类信息在索引层面合并
+    return [c for c in found if c["class"] in strategies or any(b.endswith("Strategy") for b in c["bases"])]
+
+class StrategyIndex:
+    """
+    user_data/strategies 的策略元数据索引, 缓存于 STRATEGY_INDEX_PATH。
+    refresh() 只解析 修改时间/大小 变化且内容哈希也变化的文件, 平时只做 stat。
+    """
+    def __init__(self, folder=STRATEGY_DIR, path=STRATEGY_INDEX_PATH):
+        self.folder = folder
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            with open(path, 'r', encoding='utf-8') as f: self.files = json.load(f)
+        except (OSError, ValueError):
+            self.files = {}  # 文件名 -> {mtime, size, sha256, classes, error}
+        self.parsed = 0  # 本进程中实际解析的文件数
+
+    def refresh(self):
+        """同步磁盘变化, 返回是否有变化"""
+        with self.lock:
+            changed = False
+            try:
+                names = {n for n in os.listdir(self.folder) if n.endswith(".py") and n != "__init__.py"}
+            except OSError:
+                names = set()
+            for name in set(self.files) - names:
+                del self.files[name]
+                changed = True
+            for name in sorted(names):
+                full = os.path.join(self.folder, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                entry = self.files.get(name)
+                if entry and entry["mtime"] == st.st_mtime_ns and entry["size"] == st.st_size: continue
+                try:
+                    digest = file_digest(full)
+                except OSError:
+                    continue
+                if entry and entry["sha256"] == digest:  # 只是被 touch 过
+                    entry["mtime"], entry["size"] = st.st_mtime_ns, st.st_size
+                    changed = True
+                    continue
+                entry = {"mtime": st.st_mtime_ns, "size": st.st_size, "sha256": digest, "classes": [], "error": None}
+                try:
+                    with open(full, 'r', encoding='utf-8', errors='replace') as f:
+                        entry["classes"] = parse_strategy_source(f.read())
+                except (SyntaxError, ValueError) as e:
+                    entry["error"] = f"{type(e).__name__}: {e}"
+                self.parsed += 1
+                self.files[name] = entry
+                changed = True
+            if changed: self.save()
+            return changed
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp, 'w', encoding='utf-8') as f: json.dump(self.files, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError: pass
+
+    def strategies(self):
+        """{类名: 元数据}, 未在子类中设置的 周期/ROI/止损/参数 从基类继承"""
+        with self.lock:
+            classes = {}
+            for name, entry in sorted(self.files.items()):
+                for c in entry["classes"]:
+                    classes.setdefault(c["class"], dict(c, file=name))
+
+        def resolve(cls, seen=()):
+            info = classes[cls]
+            merged = {"timeframe": None, "minimal_roi": None, "stoploss": None, "params": {}}
+            for base in info["bases"]:
+                if base in classes and base not in seen:
+                    parent = resolve(base, seen + (cls,))
+                    merged["params"].update(parent["params"])
+                    for key in ("timeframe", "minimal_roi", "stoploss"):
+                        if merged[key] is None: merged[key] = parent[key]
+            for key in ("timeframe", "minimal_roi", "stoploss"):
+                if info[key] is not None: merged[key] = info[key]
+            merged["params"].update(info["params"])
+            return dict(info, **merged, spaces=sorted(set(merged["params"].values())))
+
+        return {cls: resolve(cls) for cls in classes}
+
+    def errors(self):
+        with self.lock:
+            return {name: e["error"] for name, e in self.files.items() if e.get("error")}
+
+    def find(self, cls):
+        """定义了策略类 cls 的源文件路径"""
+        self.refresh()
+        with self.lock:
+            for name, entry in self.files.items():
+                if any(c["class"] == cls for c in entry["classes"]): return os.path.join(self.folder, name)
+        return None
+
+_strategy_index = None
+
+def strategy_index():
+    """进程内共享的策略索引 (首次使用时从缓存文件加载)"""
+    global _strategy_index
+    if _strategy_index is None: _strategy_index = StrategyIndex()
+    return _strategy_index
+
+class StrategyWatcher(QObject):
+    """监视策略目录与其中的文件, 变化后防抖刷新索引并发出 changed 信号"""
+    changed = Signal()
+
+    def __init__(self, index, parent=None):
+        super().__init__(parent)
+        self.index = index
+        self.watcher = QFileSystemWatcher(self)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(STRATEGY_WATCH_DEBOUNCE_MS)
+        self.timer.timeout.connect(self.refresh)
+        self.watcher.directoryChanged.connect(lambda _: self.timer.start())
+        self.watcher.fileChanged.connect(lambda _: self.timer.start())
+        self.rewatch()
+
+    def rewatch(self):
+        # 编辑器保存时常常是 "写临时文件再替换", 被替换的文件会从监视列表中消失, 每次刷新后重新加入
+        if os.path.isdir(self.index.folder) and self.index.folder not in self.watcher.directories():
+            self.watcher.addPath(self.index.folder)
+        watched = set(self.watcher.files())
+        files = [os.path.join(self.index.folder, n) for n in self.index.files if os.path.join(self.index.folder, n) not in watched]
+        if files: self.watcher.addPaths(files)
+
+    def refresh(self):
+        if self.index.refresh(): self.changed.emit()
+        self.rewatch()
+
+def describe_strategy(meta):
+    """策略元数据的简短说明 (界面提示用)"""
+    parts = [f"📄 {meta['file']}"]
+    if meta["timeframe"]: parts.append(f"⏱ {meta['timeframe']}")
+    if meta["minimal_roi"] is not None: parts.append(f"ROI {json.dumps(meta['minimal_roi'])}")
+    if meta["stoploss"] is not None: parts.append(f"止损 {meta['stoploss']}")
+    counts = {}
+    for space in meta["params"].values(): counts[space] = counts.get(space, 0) + 1
+    parts.append("参数: " + (", ".join(f"{k} {v}" for k, v in sorted(counts.items())) or "无"))
+    return " | ".join(parts)
 
 # ==========================================
-# 1. 后台任务线程 (执行回测/下载/优化)
+# 1.14 配置存储 (内存缓存 + 防抖原子写入 + 外部修改检测)
 # ==========================================
-class DockerWorker(QThread):
-    log_signal = Signal(str)
-    finish_signal = Signal()
+def write_json_atomic(path, data):
+    """先写临时文件并落盘, 再原子替换; 写到一半崩溃也不会损坏原文件"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except OSError:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
 
-    def __init__(self, cmd):
-        super().__init__()
-        self.cmd = cmd
+class ConfigStore(QObject):
+    """
+    JSON 配置的进程内缓存。get() 返回副本 (文件 修改时间/大小 变化时才重新解析);
+    update() 把修改排队, 防抖后读取磁盘最新内容、依次应用修改并原子写入。
+    QFileSystemWatcher 发现外部修改 (手工编辑、机器人写入) 时发出 changed 信号。
+    """
+    changed = Signal(str)
+    error = Signal(str)
 
-    def run(self):
-        try:
-            self.log_signal.emit(f"🚀 执行命令:\n{self.cmd}\n{'='*40}\n")
-            process = subprocess.Popen(
-                self.cmd, 
-                shell=True, 
-                cwd=APP_ROOT, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.STDOUT, 
-                text=True, 
-                creationflags=subprocess.CREATE_NO_WINDOW,
-                encoding='utf-8', 
-                errors='replace'
-            )
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.lock = threading.RLock()
+        self.cache = {}    # 路径 -> (修改时间, 大小, 数据)
+        self.pending = {}  # 路径 -> [修改函数]
+        self.dir_cache = {}  # 目录 -> (修改时间, [json 文件名])
+        self.loads = 0     # 实际解析次数
+        self.writes = 0
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.on_file_changed)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(CONFIG_WRITE_DEBOUNCE_MS)
+        self.timer.timeout.connect(self.flush)
 
-            while True:
-                line = process.stdout.readline()
-                if not line and process.poll() is not None:
-                    break
-                if line:
-                    self.log_signal.emit(line.strip())
-            
-            self.log_signal.emit(f"\n{'='*40}\n✅ 任务结束")
-        except Exception as e:
-            self.log_signal.emit(f"❌ 发生错误: {str(e)}")
-        finally:
-            self.finish_signal.emit()
+    @staticmethod
+    def _key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def _load(self, key):
+        st = os.stat(key)
+        cached = self.cache.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size: return cached[2]
+        with open(key, 'r', encoding='utf-8') as f: data = json.load(f)
+        self.loads += 1
+        self.cache[key] = (st.st_mtime_ns, st.st_size, data)
+        self._watch(key)
+        return data
+
+    def _watch(self, key):
+        # 监视器属于界面线程; 其他线程读取时只靠 修改时间/大小 判断是否过期
+        if QThread.currentThread() is self.thread() and key not in self.watcher.files():
+            self.watcher.addPath(key)
+
+    def get(self, path):
+        """配置内容的副本 (含尚未写入磁盘的修改); 文件不存在或格式错误时抛出 OSError/ValueError"""
+        key = self._key(path)
+        with self.lock:
+            data = copy.deepcopy(self._load(key))
+            for fn in self.pending.get(key, ()): fn(data)
+            return data
+
+    def update(self, path, fn):
+        """排队一次修改 fn(data); 连续修改在防抖后合并为一次写入"""
+        key = self._key(path)
+        with self.lock:
+            self._load(key)  # 文件不存在/损坏时立即报错, 不排队
+            self.pending.setdefault(key, []).append(fn)
+        app = QApplication.instance()
+        if app is None or QThread.currentThread() is not self.thread():
+            self.flush()  # 没有事件循环 (命令行) 或非界面线程: 直接写入
+        else:
+            self.timer.start()
+
+    def set(self, path, key, value):
+        self.update(path, lambda d: d.__setitem__(key, value))
+
+    def flush(self):
+        """立即写入所有排队的修改 (退出、重启容器前调用)"""
+        if QThread.currentThread() is self.thread(): self.timer.stop()
+        with self.lock:
+            for key, fns in list(self.pending.items()):
+                try:
+                    data = copy.deepcopy(self._load(key))
+                    for fn in fns: fn(data)
+                    write_json_atomic(key, data)
+                except (OSError, ValueError) as e:
+                    self.error.emit(f"{os.path.basename(key)}: {e}")
+                    continue
+                del self.pending[key]
+                self.writes += 1
+                st = os.stat(key)
+                self.cache[key] = (st.st_mtime_ns, st.st_size, data)
+                self._watch(key)  # 原子替换后原来的文件不再被监视, 重新加入
+
+    def on_file_changed(self, path):
+        key = self._key(path)
+        with self.lock:
+            cached = self.cache.get(key)
+            try:
+                st = os.stat(key)
+            except OSError:  # 编辑器保存时可能短暂不存在, 下次 get() 时再读
+                self.cache.pop(key, None)
+                return
+            self._watch(key)
+            if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size: return  # 自己写入的
+            self.cache.pop(key, None)
+        self.changed.emit(key)
+
+    def list_configs(self, folder=USER_DATA_DIR):
+        """目录中的 JSON 配置文件名 (目录修改时间不变时直接用缓存, 不含程序自身的状态文件)"""
+        with self.lock:
+            try:
+                mtime = os.stat(folder).st_mtime_ns
+            except OSError:
+                return []
+            cached = self.dir_cache.get(folder)
+            if not cached or cached[0] != mtime:
+                state_files = {os.path.basename(f) for f in APP_STATE_FILES}
+                names = sorted(f for f in os.listdir(folder) if f.endswith(".json") and f not in state_files)
+                cached = self.dir_cache[folder] = (mtime, names)
+            return list(cached[1])
+
+_config_store = None
+
+def config_store():
+    """进程内共享的配置存储"""
+    global _config_store
+    if _config_store is None: _config_store = ConfigStore()
+    return _config_store
 
 # ==========================================
 # 2. 实验室弹窗 (回测、下载与优化) - V6.4 更新
 # ==========================================
 class BacktestWindow(QDialog):
-    def __init__(self, parent=None):
+    def __init__(self, scheduler=None, parent=None):
         super().__init__(parent)
         self.setWindowTitle("📊 实验室: 回测 / 下载 / 优化 (Hyperopt)")
-        self.resize(800, 850)
+        self.resize(800, 950)
+        # [新增] 任务调度器由主窗口持有, 关闭实验室后任务继续运行
+        self.scheduler = scheduler or JobScheduler(self)
+        self.current_job = None
+        self.plan_job = None   # [新增] 增量下载规划等待的 list-data 任务: (任务ID, 本地覆盖范围)
+        self.plan_args = None  # (配置文件, 币种, 是否合约, 时间范围)
+        # [新增] 策略下拉框来自策略索引 (类名 + 元数据), 目录变化时自动刷新
+        self.strategy_index = strategy_index()
+        self.strategy_meta = {}
+        self.spaces_shown = (None, None)  # (策略名, 声明的空间): 上次据此设置了优化空间勾选框
         self.init_ui()
+        self.strategy_watcher = StrategyWatcher(self.strategy_index, self)
+        self.strategy_watcher.changed.connect(self.fill_strategies)
         self.scan_files()
         self.load_history() # [新增] 加载历史记录
 
@@ -101,11 +3512,15 @@ class BacktestWindow(QDialog):
         hbox_files = QHBoxLayout()
         hbox_files.addWidget(QLabel("策略:"))
         self.combo_strat = QComboBox()
+        self.combo_strat.currentIndexChanged.connect(self.update_strategy_info)
         hbox_files.addWidget(self.combo_strat)
         hbox_files.addWidget(QLabel(" 配置:"))
         self.combo_conf = QComboBox()
         hbox_files.addWidget(self.combo_conf)
         lay_basic.addLayout(hbox_files)
+        self.lbl_strat_info = QLabel("")
+        self.lbl_strat_info.setStyleSheet("color: #7f8c8d;")
+        lay_basic.addWidget(self.lbl_strat_info)
 
         # 时间选择
         hbox_time = QHBoxLayout()
@@ -169,6 +3584,15 @@ class BacktestWindow(QDialog):
         hbox_opts.addWidget(self.chk_export)
         
         lay_adv.addLayout(hbox_opts)
+
+        # [新增] 分片并行下载
+        hbox_shard = QHBoxLayout()
+        self.chk_shard = QCheckBox("⚡ 分片并行下载")
+        self.chk_shard.setToolTip(f"按 周期 × 每 {DL_SHARD_PAIRS} 个币种 拆成多个下载任务并行执行 (最多同时 {DL_MAX_PARALLEL} 个),\n"
+                                  "各分片平分交易所的请求速率预算, 避免触发限频。")
+        hbox_shard.addWidget(self.chk_shard)
+        hbox_shard.addStretch()
+        lay_adv.addLayout(hbox_shard)
         grp_adv.setLayout(lay_adv)
         layout.addWidget(grp_adv)
 
@@ -217,6 +3641,22 @@ class BacktestWindow(QDialog):
         hbox_hyp_2.addWidget(self.chk_space_trail)
         
         lay_hyper.addLayout(hbox_hyp_2)
+
+        # [新增] 逐轮输出与早停
+        hbox_hyp_3 = QHBoxLayout()
+        self.chk_print_all = QCheckBox("逐轮输出 (--print-all)")
+        self.chk_print_all.setToolTip("每轮都打印结果, 进度/速度/剩余时间才能逐轮更新。\n不勾选时只在出现新的最优结果时更新。")
+        hbox_hyp_3.addWidget(self.chk_print_all)
+        self.chk_early_stop = QCheckBox("早停: 最优 Loss 连续")
+        self.chk_early_stop.setToolTip("最优 Loss 连续 N 轮没有改进时结束优化 (已完成的结果会保存)。\n开启后自动加上 --print-all。")
+        hbox_hyp_3.addWidget(self.chk_early_stop)
+        self.spin_patience = QSpinBox()
+        self.spin_patience.setRange(10, 100000)
+        self.spin_patience.setValue(HYPEROPT_PATIENCE)
+        hbox_hyp_3.addWidget(self.spin_patience)
+        hbox_hyp_3.addWidget(QLabel("轮没有改进时结束"))
+        hbox_hyp_3.addStretch()
+        lay_hyper.addLayout(hbox_hyp_3)
         grp_hyper.setLayout(lay_hyper)
         layout.addWidget(grp_hyper)
 
@@ -233,13 +3673,29 @@ class BacktestWindow(QDialog):
         self.btn_gen_bt.setStyleSheet(STYLE_BTN_GREEN)
         self.btn_gen_bt.clicked.connect(self.gen_backtest_cmd)
 
+        self.btn_gen_plan = QPushButton("🧩 增量下载规划")
+        self.btn_gen_plan.setStyleSheet(STYLE_BTN_BLUE)
+        self.btn_gen_plan.setToolTip("读取 user_data/data 中已有的K线, 只为缺失的区间生成下载指令。")
+        self.btn_gen_plan.clicked.connect(self.gen_download_plan)
+
         self.btn_gen_hyp = QPushButton("💊 生成【优化】指令")
         self.btn_gen_hyp.setStyleSheet(STYLE_BTN_PURPLE)
         self.btn_gen_hyp.clicked.connect(self.gen_hyperopt_cmd)
         
         hbox_gen.addWidget(self.btn_gen_dl)
+        hbox_gen.addWidget(self.btn_gen_plan)
         hbox_gen.addWidget(self.btn_gen_bt)
         hbox_gen.addWidget(self.btn_gen_hyp)
+
+        self.btn_sweep = QPushButton("🧮 参数网格")
+        self.btn_sweep.setToolTip("策略 × 配置 × 周期 × 时间窗口 批量回测, 实时排行榜")
+        self.btn_sweep.clicked.connect(self.open_sweep_window)
+        hbox_gen.addWidget(self.btn_sweep)
+
+        self.btn_wf = QPushButton("📈 滚动优化")
+        self.btn_wf.setToolTip("Walk-forward: 滚动窗口 样本内优化 -> 样本外回测, 合并样本外结果")
+        self.btn_wf.clicked.connect(self.open_wf_window)
+        hbox_gen.addWidget(self.btn_wf)
         lay_cmd.addLayout(hbox_gen)
         
         self.txt_preview = QTextEdit()
@@ -247,200 +3703,1466 @@ class BacktestWindow(QDialog):
         self.txt_preview.setMaximumHeight(80)
         self.txt_preview.setStyleSheet("color: #00ffff; background-color: #333; font-family: Consolas; font-weight: bold;")
         lay_cmd.addWidget(self.txt_preview)
+        # [新增] 资源调度的决定 (-j 与容器上限)
+        self.lbl_governor = QLabel("")
+        self.lbl_governor.setStyleSheet("color: #555;")
+        self.lbl_governor.setWordWrap(True)
+        lay_cmd.addWidget(self.lbl_governor)
         
-        self.btn_run = QPushButton("🚀 执行预览中的指令 (Execute)")
+        hbox_run = QHBoxLayout()
+        self.btn_run = QPushButton("🚀 执行预览中的指令 (加入队列)")
         self.btn_run.setStyleSheet(STYLE_BTN_RED)
         self.btn_run.setFixedHeight(40)
+        self.btn_run.setToolTip("每行一条指令, 每条指令作为一个任务加入队列。\n并发上限内的任务会同时运行。")
         self.btn_run.clicked.connect(self.execute_preview_cmd)
-        lay_cmd.addWidget(self.btn_run)
+        hbox_run.addWidget(self.btn_run, stretch=1)
+        self.chk_warm = QCheckBox("♨️ 热容器")
+        self.chk_warm.setToolTip("使用常驻 freqtrade 容器 (docker exec) 执行指令,\n省去每次创建/销毁容器的时间。\n"
+                                 "注意: 每个任务仍会启动一个新的 freqtrade 进程,\n"
+                                 "Python 导入与策略加载的时间不会省掉。")
+        self.chk_warm.setChecked(self.scheduler.warm_enabled)
+        self.chk_warm.toggled.connect(self.toggle_warm)
+        hbox_run.addWidget(self.chk_warm)
+        self.chk_force = QCheckBox("🔁 强制重新运行")
+        self.chk_force.setToolTip("回测默认使用结果缓存: 策略/配置/时间/币种/数据都未变化时直接返回上次结果。\n勾选后忽略缓存重新运行。")
+        hbox_run.addWidget(self.chk_force)
+        hbox_run.addWidget(QLabel("优先级:"))
+        self.combo_priority = QComboBox()
+        for text, value in JOB_PRIORITIES:
+            self.combo_priority.addItem(text, value)
+        hbox_run.addWidget(self.combo_priority)
+        hbox_run.addWidget(QLabel("时限:"))
+        self.spin_timeout = QSpinBox()
+        self.spin_timeout.setRange(0, 100000)
+        self.spin_timeout.setSuffix(" 分钟")
+        self.spin_timeout.setSpecialValueText("不限")
+        self.spin_timeout.setToolTip("任务运行超过时限后自动取消 (停止容器), 0 为不限。")
+        hbox_run.addWidget(self.spin_timeout)
+        lay_cmd.addLayout(hbox_run)
         
         grp_cmd.setLayout(lay_cmd)
         layout.addWidget(grp_cmd)
 
-        self.txt_log = QTextEdit()
+        # --- 5. [新增] 任务队列 ---
+        grp_jobs = QGroupBox(f"5. 任务队列 (最多同时运行 {self.scheduler.max_running} 个)")
+        lay_jobs = QVBoxLayout()
+        self.tbl_jobs = QTableWidget(0, 6)
+        self.tbl_jobs.setHorizontalHeaderLabels(["ID", "类型", "状态", "优先级", "用时", "命令"])
+        self.tbl_jobs.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.tbl_jobs.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.tbl_jobs.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tbl_jobs.verticalHeader().setVisible(False)
+        self.tbl_jobs.horizontalHeader().setStretchLastSection(True)
+        self.tbl_jobs.setMaximumHeight(140)
+        self.tbl_jobs.itemSelectionChanged.connect(self.on_job_selected)
+        lay_jobs.addWidget(self.tbl_jobs)
+        self.lbl_hyperopt = QLabel("")
+        self.lbl_hyperopt.setStyleSheet("color: #8e44ad; font-weight: bold;")
+        self.lbl_hyperopt.setVisible(False)
+        lay_jobs.addWidget(self.lbl_hyperopt)
+        hbox_jobs = QHBoxLayout()
+        self.lbl_latency = QLabel()
+        self.lbl_latency.setToolTip("从提交到 freqtrade 输出第一行日志的时间。\n"
+                                    "热启动只省去容器创建, freqtrade 进程每个任务仍重新启动。")
+        hbox_jobs.addWidget(self.lbl_latency)
+        hbox_jobs.addStretch()
+        self.btn_results = QPushButton("🗂 结果库")
+        self.btn_results.setToolTip("在本地 SQLite 索引中浏览/对比所有回测与优化结果")
+        self.btn_results.clicked.connect(self.open_result_browser)
+        hbox_jobs.addWidget(self.btn_results)
+        self.btn_top_epochs = QPushButton("🏅 优化结果")
+        self.btn_top_epochs.setToolTip("流式读取 .fthypt 优化结果, 按所选评估标准列出前 N 个 epoch")
+        self.btn_top_epochs.clicked.connect(self.open_hyperopt_results)
+        hbox_jobs.addWidget(self.btn_top_epochs)
+        self.btn_analytics = QPushButton("📉 交易分析")
+        self.btn_analytics.setToolTip("读取回测导出的交易, 本地计算资金曲线/回撤/滚动指标与分币种、分星期统计")
+        self.btn_analytics.clicked.connect(self.open_trade_analytics)
+        hbox_jobs.addWidget(self.btn_analytics)
+        self.btn_log_search = QPushButton("🔎 搜索日志")
+        self.btn_log_search.setToolTip("在所有任务的归档日志 (含已压缩分段) 中按正则搜索, 查看命中行上下文")
+        self.btn_log_search.clicked.connect(self.open_log_search)
+        hbox_jobs.addWidget(self.btn_log_search)
+        self.btn_cancel_job = QPushButton("⏹ 取消任务")
+        self.btn_cancel_job.setToolTip("停止选中任务的容器并结束进程, 报告运行时长与 CPU 用量")
+        self.btn_cancel_job.clicked.connect(self.cancel_current_job)
+        hbox_jobs.addWidget(self.btn_cancel_job)
+        self.btn_clear_jobs = QPushButton("🧹 清除已结束任务")
+        self.btn_clear_jobs.clicked.connect(self.clear_finished_jobs)
+        hbox_jobs.addWidget(self.btn_clear_jobs)
+        lay_jobs.addLayout(hbox_jobs)
+        grp_jobs.setLayout(lay_jobs)
+        layout.addWidget(grp_jobs)
+
+        # [修改] QPlainTextEdit + 最大行数限制 = 有界环形缓冲, 长时间运行内存不再增长
+        self.txt_log = QPlainTextEdit()
+        self.txt_log.setReadOnly(True)
+        self.txt_log.setMaximumBlockCount(LOG_VIEW_MAX_LINES)
+        self.txt_log.setStyleSheet("background-color: #1e1e1e; color: #00ff00; font-family: Consolas; font-size: 10pt;")
+        layout.addWidget(self.txt_log)
+
+        self.setLayout(layout)
+
+        self.scheduler.job_changed.connect(self.refresh_jobs)
+        self.scheduler.job_output.connect(self.on_job_output)
+        self.scheduler.job_finished.connect(self.refresh_latency)
+        self.scheduler.job_finished.connect(self.on_plan_job_finished)
+        self.scheduler.group_finished.connect(self.on_group_finished)
+        self.refresh_latency()
+        # 运行中任务的用时每秒刷新
+        self.clock = QTimer(self)
+        self.clock.setInterval(1000)
+        self.clock.timeout.connect(self.refresh_jobs)
+        self.clock.start()
+        self.refresh_jobs()
+
+    # --- [新增逻辑] 历史记录管理 ---
+    def load_history(self):
+        """从文件加载币种历史记录"""
+        if os.path.exists(HISTORY_PATH):
+            try:
+                with open(HISTORY_PATH, 'r', encoding='utf-8') as f:
+                    history = json.load(f)
+                    if isinstance(history, list):
+                        self.line_pairs.addItems(history)
+            except: pass
+
+    def save_history(self):
+        """保存当前输入的币种到历史记录 (如果不存在的话)"""
+        current_pair = self.line_pairs.currentText().strip()
+        if not current_pair: return
+
+        # 获取当前所有项
+        items = [self.line_pairs.itemText(i) for i in range(self.line_pairs.count())]
+        
+        # 如果是新的，添加进列表
+        if current_pair not in items:
+            self.line_pairs.addItem(current_pair)
+            items.append(current_pair)
+            
+            # 保存到文件
+            try:
+                if not os.path.exists(USER_DATA_DIR):
+                    os.makedirs(USER_DATA_DIR)
+                with open(HISTORY_PATH, 'w', encoding='utf-8') as f:
+                    json.dump(items, f, ensure_ascii=False, indent=4)
+            except: pass
+
+    def scan_files(self):
+        # [修改] 策略从索引读取 (只解析有变化的文件), 下拉框显示类名 (--strategy 需要类名而不是文件名)
+        self.strategy_index.refresh()
+        self.fill_strategies()
+        
+        self.combo_conf.clear()
+        self.combo_conf.addItems(config_store().list_configs())
+        index = self.combo_conf.findText("back.json")
+        if index >= 0: self.combo_conf.setCurrentIndex(index)
+
+    def fill_strategies(self):
+        current = self.combo_strat.currentText()
+        self.strategy_meta = self.strategy_index.strategies()
+        self.combo_strat.blockSignals(True)
+        self.combo_strat.clear()
+        for cls in sorted(self.strategy_meta, key=str.lower):
+            self.combo_strat.addItem(cls)
+            self.combo_strat.setItemData(self.combo_strat.count() - 1, describe_strategy(self.strategy_meta[cls]), Qt.ToolTipRole)
+        if not self.strategy_meta: self.combo_strat.addItem("未找到策略")
+        if current in self.strategy_meta: self.combo_strat.setCurrentText(current)
+        self.combo_strat.blockSignals(False)
+        self.update_strategy_info()
+
+    def update_strategy_info(self):
+        """显示所选策略的元数据; 优化空间勾选框跟随策略声明的参数空间"""
+        meta = self.strategy_meta.get(self.combo_strat.currentText())
+        errors = self.strategy_index.errors()
+        text = describe_strategy(meta) if meta else ""
+        if errors: text += f"  ⚠️ {len(errors)} 个策略文件解析失败"
+        self.lbl_strat_info.setToolTip("\n".join(f"{n}: {e}" for n, e in errors.items()))
+        self.lbl_strat_info.setText(text)
+        # 只在换了策略 (或策略声明的空间有变化) 时改勾选状态, 文件刷新不覆盖用户刚做的选择
+        name = self.combo_strat.currentText()
+        previous, self.spaces_shown = self.spaces_shown, (name, meta["spaces"] if meta else None)
+        for chk, space in ((self.chk_space_buy, "buy"), (self.chk_space_sell, "sell")):
+            declared = meta is None or space in meta["spaces"]
+            was_declared = previous[1] is None or space in previous[1]
+            chk.setEnabled(declared)
+            if previous[0] != name or declared != was_declared: chk.setChecked(declared)
+            chk.setToolTip("" if declared else f"策略没有声明 {space} 空间的参数")
+
+    def get_time_flags(self, is_backtest=False):
+        # [修改] 换算逻辑在 time_flags 中, 与无界面模式共用
+        days_txt = self.line_days.text().strip()
+        d_start = self.date_start.date().toString("yyyyMMdd")
+        d_end = self.date_end.date().toString("yyyyMMdd")
+        return time_flags(int(days_txt) if days_txt.isdigit() else None, f"{d_start}-{d_end}", is_backtest)
+
+    def gen_download_cmd(self):
+        # [修改] 指令由 build_download_cmds 生成, 与无界面模式一致
+        if self.line_pairs.currentText().strip(): self.save_history()
+        units = [(self.line_tf.text().split(), self.get_time_flags(is_backtest=False), self.line_pairs.currentText().split())]
+        full_cmd = "\n".join(self.download_cmd_lines(self.combo_conf.currentText(), units,
+                                                     trading_mode_flag(self.chk_futures.isChecked())))
+        self.txt_preview.setText(full_cmd)
+        self.lbl_governor.setText(self.scheduler.governor.describe(self.scheduler.governor.plan("download"), "download"))
+
+    def download_cmd_lines(self, config_file, units, mode_flag):
+        """units: [(周期列表, 时间参数, 币种列表)] -> 下载指令; 勾选分片时按 周期 × 币种块 拆分并叠加限速配置"""
+        return build_download_cmds(config_file, units, mode_flag, self.chk_shard.isChecked())
+
+    # --- [新增] 增量下载规划 ---
+    def gen_download_plan(self):
+        config_file = self.combo_conf.currentText()
+        config = load_merged_config([f"user_data/{config_file}"])
+        exchange = config.get("exchange", {})
+        raw_pairs = self.line_pairs.currentText().strip()
+        pairs = raw_pairs.split() if raw_pairs else exchange.get("pair_whitelist", [])
+        if not pairs or any(ch in p for p in pairs for ch in "*[]()|^$"):
+            QMessageBox.warning(self, "提示", "无法确定币种列表 (白名单为空或包含正则)，请在【强制币种】中填写具体币种。")
+            return
+        if raw_pairs: self.save_history()
+        futures = self.chk_futures.isChecked()
+        datadir = host_path(config["datadir"]) if config.get("datadir") else os.path.join(DATA_DIR, exchange.get("name", ""))
+        self.plan_args = (config_file, pairs, futures, self.get_time_flags(is_backtest=True).split()[-1])
+        coverage, unknown = scan_local_coverage(datadir, futures)
+        self.plan_job = None  # 新的规划取代仍在等待的旧规划
+        if not unknown:
+            self.finish_download_plan(coverage)
+            return
+        # 本地无法解析的数据格式 (如未安装 pyarrow 的 feather): 借助 freqtrade list-data 读取覆盖范围
+        mode_flag = "--trading-mode futures" if futures else "--trading-mode spot"
+        job = self.scheduler.submit(f"docker compose run --rm freqtrade list-data --config user_data/{config_file} "
+                                    f"--show-timerange {mode_flag}", priority=0)
+        self.plan_job = (job.id, coverage)
+        self.txt_preview.setText(f"# 正在通过 list-data 读取 {len(unknown)} 个数据文件的时间范围, 完成后自动生成规划...")
+
+    def on_plan_job_finished(self, job_id):
+        # 只处理最近一次规划提交的 list-data 任务; 重复点击时旧任务的结果被忽略
+        if not self.plan_job or job_id != self.plan_job[0]: return
+        coverage = self.plan_job[1]
+        job = self.scheduler.jobs.get(job_id)
+        self.plan_job = None
+        if job: coverage.update(parse_list_data(job.tail, self.plan_args[2]))
+        self.finish_download_plan(coverage)
+
+    def finish_download_plan(self, coverage):
+        config_file, pairs, futures, timerange = self.plan_args
+        timeframes = self.line_tf.text().split()
+        start_ms, end_ms = parse_timerange(timerange)
+        jobs, stats = plan_downloads(pairs, timeframes, start_ms, end_ms, coverage)
+        mode_flag = "--trading-mode futures" if futures else "--trading-mode spot"
+        lines = [f"# 增量规划: {stats['pairs']} 组 币种×周期, {stats['up_to_date']} 组已是最新, 生成 {len(jobs)} 条下载指令",
+                 f"# 跳过 {stats['candles_skipped']}/{stats['candles_total']} 根K线, "
+                 f"约 {stats['requests_skipped']}/{stats['requests_total']} 次交易所请求"]
+        units = [([tf], f"--timerange {tr}" + (" --prepend" if mode == "prepend" else ""), ps)
+                 for tf, mode, tr, ps in jobs]
+        lines += self.download_cmd_lines(config_file, units, mode_flag) if units else []
+        self.txt_preview.setText("\n".join(lines))
+
+    def gen_backtest_cmd(self):
+        if self.line_pairs.currentText().strip(): self.save_history()
+        full_cmd = build_backtest_cmd(self.combo_conf.currentText(), self.get_time_flags(is_backtest=True),
+                                      self.line_pairs.currentText().split(), self.combo_strat.currentText(),
+                                      self.chk_export.isChecked())
+        self.txt_preview.setText(full_cmd)
+        self.lbl_governor.setText(self.scheduler.governor.describe(self.scheduler.governor.plan("backtest"), "backtest"))
+
+    def gen_hyperopt_cmd(self):
+        if self.line_pairs.currentText().strip(): self.save_history()
+        loss_func, spaces, epochs = self.hyperopt_settings()
+        if not self.check_spaces(spaces): return
+        # [修改] -j 由资源调度决定, 不再用 -j -1 占满所有核心
+        plan = self.scheduler.governor.plan("hyperopt")
+        full_cmd = build_hyperopt_cmd(self.combo_conf.currentText(), self.get_time_flags(is_backtest=True),
+                                      self.line_pairs.currentText().split(), self.combo_strat.currentText(),
+                                      loss_func, spaces, epochs, plan["jobs"],
+                                      self.chk_print_all.isChecked() or self.chk_early_stop.isChecked())
+        self.txt_preview.setText(full_cmd)
+        self.lbl_governor.setText(self.scheduler.governor.describe(plan, "hyperopt"))
+
+    def hyperopt_settings(self):
+        """返回 (评估函数, 优化空间列表, 轮数)"""
+        epochs = self.line_epochs.text().strip()
+        if not epochs: epochs = "100"
+        
+        loss_func = self.combo_loss.currentData()
+        if not loss_func: loss_func = "SharpeHyperOptLoss"
+        
+        spaces = []
+        if self.chk_space_buy.isChecked(): spaces.append("buy")
+        if self.chk_space_sell.isChecked(): spaces.append("sell")
+        if self.chk_space_roi.isChecked(): spaces.append("roi")
+        if self.chk_space_stop.isChecked(): spaces.append("stoploss")
+        if self.chk_space_trail.isChecked(): spaces.append("trailing")
+        if not spaces:  # 都没勾选时优化策略声明过的 buy/sell 空间 (都没声明时为空, 由调用方提示)
+            meta = self.strategy_meta.get(self.combo_strat.currentText())
+            spaces = [sp for sp in ("buy", "sell") if meta is None or sp in meta["spaces"]]
+        return loss_func, spaces, epochs
+
+    def check_spaces(self, spaces):
+        if spaces: return True
+        QMessageBox.warning(self, "提示", "所选策略没有声明 buy/sell 空间的参数, 请至少勾选一个优化空间 (ROI / 止损 / 追踪止损)。")
+        return False
+
+    def execute_preview_cmd(self):
+        cmds = [c.strip() for c in self.txt_preview.toPlainText().splitlines()]
+        cmds = [c for c in cmds if c and not c.startswith("#")]
+        if not cmds:
+            QMessageBox.warning(self, "提示", "预览框为空，请先生成指令！")
+            return
+        # 一次提交的多条下载指令视为一批分片, 全部结束后输出合并报告
+        group = uuid.uuid4().hex[:8] if sum(job_kind(c) == "download" for c in cmds) > 1 else None
+        for cmd in cmds:
+            job = self.start_worker(cmd, group if job_kind(cmd) == "download" else None)
+        self.select_job(job.id)
+
+    def start_worker(self, cmd, group=None):
+        patience = self.spin_patience.value() if self.chk_early_stop.isChecked() and job_kind(cmd) == "hyperopt" else None
+        timeout = self.spin_timeout.value() * 60 or None
+        return self.scheduler.submit(cmd, self.combo_priority.currentData(), self.chk_force.isChecked(), group,
+                                     patience, timeout)
+
+    # --- [新增] 任务队列显示 ---
+    def refresh_jobs(self):
+        jobs = sorted(self.scheduler.jobs.values(), key=lambda j: j.created, reverse=True)
+        priority_text = {v: t for t, v in JOB_PRIORITIES}
+        self.tbl_jobs.blockSignals(True)
+        self.tbl_jobs.setRowCount(len(jobs))
+        for row, job in enumerate(jobs):
+            cells = [job.id, job.kind, JOB_STATUS_TEXT.get(job.status, job.status),
+                     priority_text.get(job.priority, str(job.priority)),
+                     time.strftime("%H:%M:%S", time.gmtime(job.elapsed())) if job.started else "-", job.cmd]
+            for col, text in enumerate(cells):
+                item = self.tbl_jobs.item(row, col)
+                if item is None:
+                    item = QTableWidgetItem()
+                    self.tbl_jobs.setItem(row, col, item)
+                item.setText(text)
+            if job.id == self.current_job:
+                self.tbl_jobs.selectRow(row)
+        self.tbl_jobs.blockSignals(False)
+        self.refresh_hyperopt()
+
+    def select_job(self, job_id):
+        self.current_job = job_id
+        job = self.scheduler.jobs.get(job_id)
+        text = ""
+        if job:
+            text = "\n".join(job.tail) if job.tail else f"📄 完整日志: {job.log_path}"
+        self.txt_log.setPlainText(text)
+        self.txt_log.moveCursor(QTextCursor.End)
+        self.refresh_jobs()
+
+    def on_job_selected(self):
+        rows = self.tbl_jobs.selectionModel().selectedRows()
+        if rows:
+            self.select_job(self.tbl_jobs.item(rows[0].row(), 0).text())
+
+    def on_job_output(self, job_id, text):
+        if job_id == self.current_job:
+            self.append_log(text)
+            self.refresh_hyperopt()
+
+    def refresh_hyperopt(self):
+        progress = self.scheduler.hyperopt_progress(self.current_job) if self.current_job else None
+        self.lbl_hyperopt.setVisible(bool(progress))
+        self.lbl_hyperopt.setText(format_hyperopt_progress(progress))
+
+    def cancel_current_job(self):
+        if self.current_job: self.scheduler.cancel_job(self.current_job)
+
+    def reject(self):
+        """关闭窗口 (QDialog 的关闭按钮与 Esc 都会走这里)"""
+        running = self.scheduler.running_jobs()
+        if self.scheduler.parent() is self:  # 独立运行时调度器随窗口关闭
+            self.scheduler.shutdown()
+        elif running:
+            reply = QMessageBox.question(self, "任务仍在运行",
+                                         f"还有 {len(running)} 个任务在运行。\n是: 全部取消 (停止容器)\n否: 关闭窗口, 任务在后台继续",
+                                         QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply == QMessageBox.Yes:
+                for job in running: self.scheduler.cancel_job(job.id, "关闭实验室时取消")
+        super().reject()
+
+    def clear_finished_jobs(self):
+        self.scheduler.clear_finished()
+        if self.current_job not in self.scheduler.jobs:
+            self.current_job = None
+            self.txt_log.clear()
+        self.refresh_jobs()
+
+    def append_log(self, text):
+        self.txt_log.appendPlainText(text)
+
+    def open_sweep_window(self):
+        if not getattr(self, "sweep_window", None):
+            self.sweep_window = SweepWindow(self, self)
+        self.sweep_window.show()
+        self.sweep_window.raise_()
+
+    def open_trade_analytics(self):
+        if not getattr(self, "trade_analytics", None):
+            self.trade_analytics = TradeAnalyticsWindow(self)
+        self.trade_analytics.scan_files()
+        self.trade_analytics.show()
+        self.trade_analytics.raise_()
+
+    def open_log_search(self):
+        if not getattr(self, "log_search", None):
+            self.log_search = LogSearchWindow(self)
+        self.log_search.show()
+        self.log_search.raise_()
+
+    def open_hyperopt_results(self):
+        if not getattr(self, "hyperopt_results", None):
+            self.hyperopt_results = HyperoptResultsWindow(self, self)
+        self.hyperopt_results.scan_files()
+        self.hyperopt_results.show()
+        self.hyperopt_results.raise_()
+
+    def open_result_browser(self):
+        if not getattr(self, "result_browser", None):
+            self.result_browser = ResultBrowser(self.scheduler, self)
+            self.scheduler.refresh_index()
+        self.result_browser.show()
+        self.result_browser.raise_()
+
+    def open_wf_window(self):
+        if not getattr(self, "wf_window", None):
+            self.wf_window = WalkForwardWindow(self, self)
+        self.wf_window.show()
+        self.wf_window.raise_()
+
+    def on_group_finished(self, group, report):
+        self.append_log(report)
+
+    def toggle_warm(self, on):
+        self.scheduler.warm_enabled = on
+
+    def refresh_latency(self, *_):
+        self.lbl_latency.setText(self.scheduler.warm_pool.report())
+
+# ==========================================
+# 3. 主程序 (FreqtradeManager) - 保持不变
+# ==========================================
+def process_age():
+    """进程已运行的秒数 (含解释器初始化和单文件版解压), 取不到时返回 None"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            creation, exit_, kernel, user, now = (ctypes.c_ulonglong() for _ in range(5))
+            k32 = ctypes.windll.kernel32
+            k32.GetProcessTimes(k32.GetCurrentProcess(), ctypes.byref(creation), ctypes.byref(exit_),
+                                ctypes.byref(kernel), ctypes.byref(user))
+            k32.GetSystemTimeAsFileTime(ctypes.byref(now))
+            return (now.value - creation.value) / 1e7
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            return float(f.read().split()[0]) - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+class StartupProfiler:
+    """分阶段记录启动耗时, 报告写入 STARTUP_PROFILE_PATH (启动参数 --profile-startup 时同时弹窗显示)"""
+    def __init__(self, t0=STARTUP_T0):
+        self.t0 = self.last = t0
+        age = process_age()
+        # 脚本开始执行之前花的时间: 解释器启动, 单文件版还包括解压到临时目录
+        self.pre = max(0.0, age - (time.perf_counter() - t0)) if age is not None else None
+        self.phases = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def summary(self):
+        """各阶段毫秒数 (基准测试用)"""
+        data = {"进程启动": round(self.pre * 1000, 1)} if self.pre is not None else {}
+        data.update((name, round(sec * 1000, 1)) for name, sec in self.phases)
+        data["合计"] = round((self.last - self.t0 + (self.pre or 0)) * 1000, 1)
+        return data
+
+    def report(self):
+        lines = ["⏱ 启动耗时"]
+        if self.pre is not None: lines.append(f"  进程启动 (解释器/解压): {self.pre * 1000:.0f} ms")
+        lines += [f"  {name}: {sec * 1000:.0f} ms" for name, sec in self.phases]
+        lines.append(f"  合计: {(self.last - self.t0 + (self.pre or 0)) * 1000:.0f} ms")
+        return "\n".join(lines)
+
+    def save(self, path=None):
+        path = path or STARTUP_PROFILE_PATH
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(f"{datetime.now():%Y-%m-%d %H:%M:%S}\n{self.report()}\n")
+        except OSError: pass
+
+def parse_compose_ps(text):
+    """解析 docker compose ps --format json 的输出 (兼容 JSON 数组和逐行 JSON 两种格式)"""
+    text = text.strip()
+    if not text: return {}
+    rows = json.loads(text) if text.startswith("[") else [json.loads(l) for l in text.splitlines() if l.strip()]
+    states = {}
+    for row in rows:
+        service = row.get("Service") or row.get("Name")
+        state = (row.get("State") or "unknown").lower()
+        health = (row.get("Health") or "").lower()
+        if state == "running" and health in ("healthy", "unhealthy", "starting"):
+            state = health
+        states[service] = state
+    return states
+
+def compose_snapshot():
+    """一次性查询所有服务的当前状态"""
+    result = subprocess.run(
+        ["docker", "compose", "ps", "--all", "--format", "json"],
+        cwd=APP_ROOT, capture_output=True, text=True, encoding='utf-8', errors='replace',
+        creationflags=NO_WINDOW
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "docker compose ps 失败")
+    return parse_compose_ps(result.stdout)
+
+# docker 事件动作 -> 服务状态
+EVENT_STATES = {
+    "start": "running", "restart": "running", "unpause": "running",
+    "die": "exited", "stop": "exited", "pause": "paused", "destroy": "removed",
+}
+
+class ComposeEventSource:
+    """docker compose events --json 事件流, close() 可从其他线程随时中断"""
+    def __init__(self):
+        self.process = None
+
+    def __iter__(self):
+        self.process = subprocess.Popen(
+            ["docker", "compose", "events", "--json"],
+            cwd=APP_ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding='utf-8', errors='replace', creationflags=NO_WINDOW
+        )
+        for line in self.process.stdout:
+            line = line.strip()
+            if not line.startswith("{"): continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                pass
+        self.process.wait()
+
+    def close(self):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+
+class DockerStatusEngine:
+    """
+    事件驱动的服务状态引擎 (不依赖 Qt, 可用假事件源测试)。
+    event_source_factory() 返回可迭代的事件字典 (可选 close()), snapshot() 返回 {服务: 状态}。
+    """
+    def __init__(self, on_change, on_mode=None, event_source_factory=ComposeEventSource,
+                 snapshot=compose_snapshot, poll_sec=STATUS_POLL_SEC, backoff_max=STATUS_BACKOFF_MAX):
+        self.on_change = on_change
+        self.on_mode = on_mode
+        self.event_source_factory = event_source_factory
+        self.snapshot = snapshot
+        self.poll_sec = poll_sec
+        self.backoff_max = backoff_max
+        self.states = {}
+        self.mode = None
+        self._source = None
+        self._stop = threading.Event()
+
+    def _set(self, service, state):
+        if service and self.states.get(service) != state:
+            self.states[service] = state
+            self.on_change(service, state)
+
+    def _set_mode(self, mode):
+        if mode != self.mode:
+            self.mode = mode
+            if self.on_mode: self.on_mode(mode)
+
+    def sync(self):
+        """全量同步 (启动、重连时以及降级轮询时调用)"""
+        try:
+            states = self.snapshot()
+        except Exception:
+            states = {svc: "unknown" for svc in self.states}
+        for svc in list(self.states):
+            if svc not in states: self._set(svc, "removed")
+        for svc, state in states.items():
+            self._set(svc, state)
+
+    def apply_event(self, event):
+        if event.get("type", "container") != "container": return
+        attrs = event.get("attributes") or {}
+        service = event.get("service") or attrs.get("com.docker.compose.service")
+        action = event.get("action") or event.get("status") or ""
+        if action.startswith("health_status"):
+            self._set(service, action.split(":", 1)[-1].strip() or "running")
+        elif action in EVENT_STATES:
+            self._set(service, EVENT_STATES[action])
+
+    def run(self):
+        backoff = 1
+        while not self._stop.is_set():
+            self.sync()
+            self._set_mode("events")
+            started = time.monotonic()
+            self._source = self.event_source_factory()
+            try:
+                for event in self._source:
+                    if self._stop.is_set(): break
+                    self.apply_event(event)
+            except Exception:
+                pass
+            if self._stop.is_set(): break
+            if time.monotonic() - started >= STATUS_STREAM_HEALTHY:
+                backoff = 1
+
+            # 事件流中断: 退避等待期间降级为轮询, 保证状态不失真
+            self._set_mode("polling")
+            deadline = time.monotonic() + backoff
+            while not self._stop.is_set() and time.monotonic() < deadline:
+                self.sync()
+                self._stop.wait(max(0, min(self.poll_sec, deadline - time.monotonic())))
+            backoff = min(backoff * 2, self.backoff_max)
+
+    def stop(self):
+        self._stop.set()
+        source = self._source
+        if source is not None and hasattr(source, "close"):
+            source.close()
+
+class DockerMonitor(QThread):
+    status_signal = Signal(bool)
+    service_signal = Signal(str, str)
+    mode_signal = Signal(str)
+
+    def __init__(self, **engine_kwargs):
+        super().__init__()
+        self.engine = DockerStatusEngine(self.on_change, self.mode_signal.emit, **engine_kwargs)
+
+    def on_change(self, service, state):
+        self.service_signal.emit(service, state)
+        self.status_signal.emit(any(s in SERVICE_RUNNING_STATES for s in self.engine.states.values()))
+
+    def run(self):
+        self.engine.run()
+
+    def stop(self):
+        self.engine.stop()
+        self.wait(3000)
+
+# ==========================================
+# 3.1 [新增] 实时日志 (一条 docker compose logs -f 连接跟随所有服务)
+# ==========================================
+# "freqtrade-1  | 2026-01-01T00:00:00.123456789Z 消息" (--timestamps), 服务名去掉副本序号
+COMPOSE_LOG_LINE = re.compile(r"^(?P<svc>[\w.-]+?)(?:-\d+)?\s+\| (?:(?P<ts>\d{4}-\d\d-\d\dT\S+) )?(?P<msg>.*)$")
+FT_LOG_LEVEL = re.compile(r" - (DEBUG|INFO|WARNING|ERROR|CRITICAL) - ")
+LOG_LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+class LogIndex:
+    """
+    有界日志缓冲 (环形数组, 按序号 O(1) 取行) + 按服务/级别的倒排索引 (序号递增的队列)。
+    新行只需与当前过滤条件比较一次; 过滤条件变化时从索引取候选行, 不扫描整个缓冲。
+    """
+    def __init__(self, max_lines=LOG_TAIL_MAX_LINES):
+        self.max_lines = max_lines
+        self.ring = [None] * max_lines  # 序号 % max_lines -> (序号, 服务, 级别, 文本)
+        self.seq = 0                    # 下一行的序号
+        self.by_service = {}
+        self.by_level = {}
+        self.last_level = {}  # 服务 -> 上一行的级别, 多行异常的续行沿用
+        self.last_ts = None   # 最后一行的 docker 时间戳, 重连时用 --since 接上
+
+    def add(self, raw):
+        m = COMPOSE_LOG_LINE.match(raw)
+        if m:
+            service, msg = m.group("svc"), m.group("msg")
+            if m.group("ts"): self.last_ts = m.group("ts")
+        else:
+            service, msg = "kq4", raw  # 连接状态等本程序自己的提示
+        lv = FT_LOG_LEVEL.search(msg)
+        level = LOG_LEVELS[lv.group(1)] if lv else self.last_level.get(service, 20)
+        self.last_level[service] = level
+        seq = self.seq
+        old = self.ring[seq % self.max_lines]
+        if old:  # 被覆盖的一定是全局最旧的行, 也就在它所属索引队列的最左端
+            self.by_service[old[1]].popleft()
+            self.by_level[old[2]].popleft()
+        entry = (seq, service, level, f"{service} | {msg}")
+        self.ring[seq % self.max_lines] = entry
+        self.by_service.setdefault(service, deque()).append(seq)
+        self.by_level.setdefault(level, deque()).append(seq)
+        self.seq += 1
+        return entry
+
+    def __len__(self):
+        return min(self.seq, self.max_lines)
+
+    def services(self):
+        return sorted(s for s, q in self.by_service.items() if q)
+
+    @staticmethod
+    def matches(entry, services, min_level, pattern):
+        return ((services is None or entry[1] in services) and entry[2] >= min_level
+                and (pattern is None or pattern.search(entry[3]) is not None))
+
+    def query(self, services=None, min_level=0, pattern=None, limit=LOG_VIEW_MAX_LINES):
+        """返回最近 limit 条符合条件的行 (旧 -> 新)"""
+        sources = []
+        if services is not None:
+            sources.append([self.by_service.get(s, ()) for s in services])
+        if min_level:
+            sources.append([q for lv, q in self.by_level.items() if lv >= min_level])
+        if sources:  # 取候选最少的索引, 其余条件逐行判断
+            queues = min(sources, key=lambda qs: sum(len(q) for q in qs))
+            candidates = heapq.merge(*(reversed(q) for q in queues), reverse=True)
+        else:
+            candidates = range(self.seq - 1, self.seq - len(self) - 1, -1)
+        out = []
+        for seq in candidates:
+            entry = self.ring[seq % self.max_lines]
+            if self.matches(entry, services, min_level, pattern):
+                out.append(entry[3])
+                if len(out) >= limit: break
+        out.reverse()
+        return out
+
+class LogTailWindow(QDialog):
+    """实时日志: 断线后按指数退避重连 (--since 接上断点), 内存占用固定"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("📜 实时运行日志 (所有服务)")
+        self.resize(1000, 700)
+        self.index = LogIndex()
+        self.worker = None
+        self.connected_at = None
+        self.backoff = 1
+        self.service_boxes = {}
+        self.filter = (None, 0, None)
+        self.drain_timer = QTimer(self)
+        self.drain_timer.setInterval(LOG_FLUSH_MS)
+        self.drain_timer.timeout.connect(self.drain)
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(LOG_FILTER_DEBOUNCE_MS)
+        self.filter_timer.timeout.connect(self.apply_filter)
+        self.reconnect_timer = QTimer(self)
+        self.reconnect_timer.setSingleShot(True)
+        self.reconnect_timer.timeout.connect(self.connect_stream)
+        self.init_ui()
+
+    def init_ui(self):
+        layout = QVBoxLayout()
+        hbox = QHBoxLayout()
+        hbox.addWidget(QLabel("级别:"))
+        self.combo_level = QComboBox()
+        for text, value in (("全部", 0), ("INFO 及以上", 20), ("WARNING 及以上", 30), ("ERROR 及以上", 40)):
+            self.combo_level.addItem(text, value)
+        self.combo_level.currentIndexChanged.connect(lambda: self.filter_timer.start())
+        hbox.addWidget(self.combo_level)
+        hbox.addWidget(QLabel("正则:"))
+        self.line_regex = QLineEdit()
+        self.line_regex.setPlaceholderText("如 BTC/USDT|Exception (不区分大小写)")
+        self.line_regex.textChanged.connect(lambda: self.filter_timer.start())
+        hbox.addWidget(self.line_regex, stretch=1)
+        self.chk_pause = QCheckBox("⏸ 暂停")
+        self.chk_pause.setToolTip("暂停刷新显示 (后台仍在接收), 方便阅读")
+        self.chk_pause.toggled.connect(lambda paused: None if paused else self.apply_filter())
+        hbox.addWidget(self.chk_pause)
+        layout.addLayout(hbox)
+        self.lay_services = QHBoxLayout()
+        self.lay_services.addWidget(QLabel("服务:"))
+        self.lay_services.addStretch()
+        layout.addLayout(self.lay_services)
+        self.txt_log = QPlainTextEdit()
         self.txt_log.setReadOnly(True)
-        self.txt_log.setStyleSheet("background-color: #1e1e1e; color: #00ff00; font-family: Consolas; font-size: 10pt;")
+        self.txt_log.setMaximumBlockCount(LOG_VIEW_MAX_LINES)
+        self.txt_log.setStyleSheet("background-color: #1e1e1e; color: #dcdcdc; font-family: Consolas; font-size: 10pt;")
         layout.addWidget(self.txt_log)
-
+        self.lbl_status = QLabel("")
+        layout.addWidget(self.lbl_status)
         self.setLayout(layout)
 
-    # --- [新增逻辑] 历史记录管理 ---
-    def load_history(self):
-        """从文件加载币种历史记录"""
-        if os.path.exists(HISTORY_PATH):
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self.worker and not self.reconnect_timer.isActive():
+            self.connect_stream()
+
+    def connect_stream(self):
+        since = f"--since {self.index.last_ts}" if self.index.last_ts else f"--tail {LOG_TAIL_INITIAL}"
+        self.worker = DockerWorker(f"docker compose logs -f --no-color --timestamps {since}",
+                                   spill=False, max_pending=LOG_TAIL_MAX_LINES)
+        self.worker.finished.connect(self.on_stream_finished)
+        self.worker.start()
+        self.connected_at = time.monotonic()
+        self.drain_timer.start()
+        self.lbl_status.setText("🟢 已连接")
+
+    def on_stream_finished(self):
+        self.drain()
+        self.worker.deleteLater()
+        self.worker = None
+        if not self.isVisible(): return
+        if time.monotonic() - self.connected_at >= STATUS_STREAM_HEALTHY: self.backoff = 1
+        self.lbl_status.setText(f"🔌 日志连接已断开, {self.backoff} 秒后重连...")
+        self.reconnect_timer.start(self.backoff * 1000)
+        self.backoff = min(self.backoff * 2, STATUS_BACKOFF_MAX)
+
+    def drain(self):
+        if not self.worker: return
+        lines = self.worker.log.drain()
+        if not lines: return
+        services, min_level, pattern = self.filter
+        shown = []
+        for line in lines:
+            entry = self.index.add(line)
+            if entry[1] not in self.service_boxes: self.add_service(entry[1])
+            if self.index.matches(entry, services, min_level, pattern): shown.append(entry[3])
+        if shown and not self.chk_pause.isChecked():
+            self.txt_log.appendPlainText("\n".join(shown))
+        self.refresh_status()
+
+    def add_service(self, service):
+        box = QCheckBox(service)
+        box.setChecked(True)
+        box.toggled.connect(lambda: self.filter_timer.start())
+        self.service_boxes[service] = box
+        self.lay_services.insertWidget(self.lay_services.count() - 1, box)
+
+    def apply_filter(self):
+        text = self.line_regex.text().strip()
+        try:
+            pattern = re.compile(text, re.I) if text else None
+            self.line_regex.setStyleSheet("")
+        except re.error:
+            self.line_regex.setStyleSheet("background-color: #ffcccc;")
+            return
+        checked = {s for s, box in self.service_boxes.items() if box.isChecked()}
+        services = None if len(checked) == len(self.service_boxes) else checked
+        self.filter = (services, self.combo_level.currentData(), pattern)
+        started = time.perf_counter()
+        lines = self.index.query(*self.filter)
+        self.txt_log.setPlainText("\n".join(lines))
+        self.txt_log.moveCursor(QTextCursor.End)
+        self.refresh_status(f", 过滤用时 {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def refresh_status(self, extra=""):
+        state = "🟢 已连接" if self.worker else self.lbl_status.text().split(" |")[0]
+        self.lbl_status.setText(f"{state} | 缓冲 {len(self.index)}/{self.index.max_lines} 行{extra}")
+
+    def reject(self):
+        """关闭窗口时断开日志连接 (缓冲保留, 再次打开时从断点继续)"""
+        self.reconnect_timer.stop()
+        self.drain_timer.stop()
+        if self.worker:
+            self.worker.kill_tree()
+            self.worker.wait(3000)
+        super().reject()
+
+# ==========================================
+# 3.2 [新增] 机器人 REST 接口 (持仓 / 收益 / 余额)
+# ==========================================
+def api_settings(config_path=CONFIG_PATH):
+    """从 config.json 的 api_server 读取接口端口与账号, 未启用时返回 None"""
+    try:
+        api = config_store().get(config_path).get("api_server") or {}
+    except (OSError, ValueError):
+        return None
+    if not api.get("enabled"): return None
+    return "127.0.0.1", int(api.get("listen_port", 8080)), api.get("username", ""), api.get("password", "")
+
+class ApiError(Exception):
+    pass
+
+class FreqtradeApiClient:
+    """
+    freqtrade REST 客户端: workers 个线程并发请求各接口, 每个线程一条长连接 (http.client 的连接一次只能跑一个请求,
+    不能跨线程共用), 一个接口慢不会拖住其他接口。Basic 认证。
+    响应按接口缓存 API_TTL 秒; 出错的接口按指数退避, 退避期间不再请求, 直接报错。
+    """
+    def __init__(self, host, port, username="", password="", timeout=API_TIMEOUT, ttl=API_TTL, workers=API_WORKERS):
+        import base64
+        from concurrent.futures import ThreadPoolExecutor
+        self.host, self.port, self.timeout, self.ttl = host, port, timeout, ttl
+        token = base64.b64encode(f"{username}:{password}".encode()).decode()
+        self.headers = {"Authorization": f"Basic {token}", "Connection": "keep-alive"}
+        self._local = threading.local()  # 工作线程 -> 它自己的长连接
+        self._conns = []
+        self._lock = threading.Lock()    # 保护缓存/退避表/计数/连接列表
+        self._cache = {}     # 接口 -> (取得时间, 数据)
+        self._failures = {}  # 接口 -> (连续失败次数, 下次允许请求的时间)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kq4_api")
+        self.requests = 0    # 实际发出的请求数 (缓存命中不计)
+
+    def _conn(self):
+        import http.client
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            with self._lock: self._conns.append(conn)
+        return conn
+
+    def _request(self, path):
+        import http.client
+        conn = self._conn()
+        for attempt in (0, 1):  # 服务端关闭了空闲长连接时重连一次 (close 后 http.client 会自动重新连接)
             try:
-                with open(HISTORY_PATH, 'r', encoding='utf-8') as f:
-                    history = json.load(f)
-                    if isinstance(history, list):
-                        self.line_pairs.addItems(history)
-            except: pass
+                conn.request("GET", path, headers=self.headers)
+                resp = conn.getresponse()
+                body = resp.read()
+                break
+            except (http.client.HTTPException, OSError) as e:
+                conn.close()
+                if attempt or isinstance(e, TimeoutError): raise ApiError(f"连接失败: {e}")
+        with self._lock: self.requests += 1
+        if resp.status == 401: raise ApiError("认证失败 (检查 api_server 账号密码)")
+        if resp.status != 200: raise ApiError(f"HTTP {resp.status}")
+        try:
+            return json.loads(body)
+        except ValueError:
+            raise ApiError("响应不是 JSON")
 
-    def save_history(self):
-        """保存当前输入的币种到历史记录 (如果不存在的话)"""
-        current_pair = self.line_pairs.currentText().strip()
-        if not current_pair: return
+    def get(self, endpoint, query=""):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(endpoint)
+            if cached and now - cached[0] < self.ttl.get(endpoint, 0): return cached[1]
+            fails, retry_at = self._failures.get(endpoint, (0, 0))
+        if now < retry_at: raise ApiError(f"退避中, {retry_at - now:.0f} 秒后重试")
+        try:
+            data = self._request(f"/api/v1/{endpoint}{query}")
+        except ApiError:
+            with self._lock:
+                self._failures[endpoint] = (fails + 1, time.monotonic() + min(2 ** fails, API_BACKOFF_MAX))
+            raise
+        with self._lock:
+            self._failures.pop(endpoint, None)
+            self._cache[endpoint] = (time.monotonic(), data)
+        return data
 
-        # 获取当前所有项
-        items = [self.line_pairs.itemText(i) for i in range(self.line_pairs.count())]
-        
-        # 如果是新的，添加进列表
-        if current_pair not in items:
-            self.line_pairs.addItem(current_pair)
-            items.append(current_pair)
-            
-            # 保存到文件
+    def fetch_all(self, endpoints=None):
+        """并发请求多个接口, 返回 ({接口: 数据}, {接口: 错误})"""
+        endpoints = endpoints or list(self.ttl)
+        futures = {ep: self._pool.submit(self.get, ep, "?timescale=7" if ep == "daily" else "") for ep in endpoints}
+        data, errors = {}, {}
+        for ep, fut in futures.items():
             try:
-                if not os.path.exists(USER_DATA_DIR):
-                    os.makedirs(USER_DATA_DIR)
-                with open(HISTORY_PATH, 'w', encoding='utf-8') as f:
-                    json.dump(items, f, ensure_ascii=False, indent=4)
-            except: pass
+                data[ep] = fut.result()
+            except ApiError as e:
+                errors[ep] = str(e)
+        return data, errors
 
-    def scan_files(self):
-        self.combo_strat.clear()
-        if os.path.exists(STRATEGY_DIR):
-            strategies = [f[:-3] for f in os.listdir(STRATEGY_DIR) if f.endswith(".py") and f != "__init__.py"]
-            if strategies: self.combo_strat.addItems(strategies)
-            else: self.combo_strat.addItem("未找到策略")
-        
-        self.combo_conf.clear()
-        if os.path.exists(USER_DATA_DIR):
-            configs = [f for f in os.listdir(USER_DATA_DIR) if f.endswith(".json")]
-            self.combo_conf.addItems(configs)
-            index = self.combo_conf.findText("back.json")
-            if index >= 0: self.combo_conf.setCurrentIndex(index)
+    def close(self):
+        self._pool.shutdown(wait=True)
+        with self._lock:
+            for conn in self._conns: conn.close()
+            self._conns.clear()
 
-    def get_time_flags(self, is_backtest=False):
-        days_txt = self.line_days.text().strip()
-        if days_txt.isdigit() and int(days_txt) > 0:
-            if is_backtest:
-                days = int(days_txt)
-                today = QDate.currentDate()
-                start_date = today.addDays(-days)
-                t_str = f"{start_date.toString('yyyyMMdd')}-{today.toString('yyyyMMdd')}"
-                return f"--timerange {t_str}"
-            else:
-                return f"--days {days_txt}"
-        else:
-            d_start = self.date_start.date().toString("yyyyMMdd")
-            d_end = self.date_end.date().toString("yyyyMMdd")
-            return f"--timerange {d_start}-{d_end}"
+class ApiPoller(QThread):
+    """Docker 运行时定期拉取接口数据; 停止时不发请求"""
+    data_signal = Signal(dict, dict)
 
-    def get_base_cmd(self, is_backtest=False):
-        config_file = self.combo_conf.currentText()
-        time_flag = self.get_time_flags(is_backtest=is_backtest)
-        
-        cmd = f"--config user_data/{config_file} {time_flag}"
-        
-        # [修改] 使用 currentText() 获取 ComboBox 的输入内容
-        raw_pairs = self.line_pairs.currentText().strip()
-        if raw_pairs:
-            pairs = " ".join(raw_pairs.split())
-            cmd += f" --pairs {pairs}"
-            # [新增] 只要生成基础命令，就尝试保存历史记录
-            self.save_history()
-            
-        return cmd
+    def __init__(self, client_factory=None, interval=API_POLL_SEC):
+        super().__init__()
+        self.client_factory = client_factory or (lambda: (lambda cfg: cfg and FreqtradeApiClient(*cfg))(api_settings()))
+        self.interval = interval
+        self.client = None
+        self._active = threading.Event()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
 
-    def gen_download_cmd(self):
-        base_cmd = self.get_base_cmd(is_backtest=False)
-        tfs = self.line_tf.text().strip()
-        mode_flag = "--trading-mode futures" if self.chk_futures.isChecked() else "--trading-mode spot"
-        full_cmd = f"docker compose run --rm freqtrade download-data {base_cmd} {mode_flag} -t {tfs}"
-        self.txt_preview.setText(full_cmd)
+    def set_active(self, on):
+        if on == self._active.is_set(): return
+        if on: self._active.set()
+        else: self._active.clear()
+        self._wake.set()
 
-    def gen_backtest_cmd(self):
-        base_cmd = self.get_base_cmd(is_backtest=True)
-        strategy = self.combo_strat.currentText()
-        export_flag = "--export trades" if self.chk_export.isChecked() else ""
-        full_cmd = f"docker compose run --rm freqtrade backtesting {base_cmd} --strategy {strategy} {export_flag}"
-        self.txt_preview.setText(full_cmd)
+    def run(self):
+        while not self._stop.is_set():
+            if not self._active.is_set():
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            if self.client is None: self.client = self.client_factory()
+            if self.client is None:
+                self.data_signal.emit({}, {"api": "config.json 未启用 api_server"})
+                self._active.clear()
+                continue
+            self.data_signal.emit(*self.client.fetch_all())
+            self._wake.wait(self.interval)
+            self._wake.clear()
 
-    def gen_hyperopt_cmd(self):
-        base_cmd = self.get_base_cmd(is_backtest=True)
-        strategy = self.combo_strat.currentText()
-        epochs = self.line_epochs.text().strip()
-        if not epochs: epochs = "100"
-        
-        loss_func = self.combo_loss.currentData()
-        if not loss_func: loss_func = "SharpeHyperOptLoss"
-        
-        spaces = []
-        if self.chk_space_buy.isChecked(): spaces.append("buy")
-        if self.chk_space_sell.isChecked(): spaces.append("sell")
-        if self.chk_space_roi.isChecked(): spaces.append("roi")
-        if self.chk_space_stop.isChecked(): spaces.append("stoploss")
-        if self.chk_space_trail.isChecked(): spaces.append("trailing")
-        
-        spaces_str = " ".join(spaces)
-        spaces_flag = f"--spaces {spaces_str}" if spaces else "--spaces buy sell"
-        
-        full_cmd = (f"docker compose run --rm freqtrade hyperopt {base_cmd} "
-                    f"--strategy {strategy} --hyperopt-loss {loss_func} "
-                    f"{spaces_flag} --epochs {epochs} -j -1")
-        
-        self.txt_preview.setText(full_cmd)
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self.wait(API_TIMEOUT * 2000)
+        if self.client: self.client.close()
 
-    def execute_preview_cmd(self):
-        cmd = self.txt_preview.toPlainText().strip()
-        if not cmd:
-            QMessageBox.warning(self, "提示", "预览框为空，请先生成指令！")
-            return
-        self.txt_log.clear()
-        self.start_worker(cmd)
-
-    def start_worker(self, cmd):
-        self.btn_run.setEnabled(False)
-        self.btn_gen_dl.setEnabled(False)
-        self.btn_gen_bt.setEnabled(False)
-        self.btn_gen_hyp.setEnabled(False)
-        
-        self.worker = DockerWorker(cmd)
-        self.worker.log_signal.connect(self.append_log)
-        self.worker.finish_signal.connect(self.on_finished)
-        self.worker.start()
+def format_api_summary(data):
+    """接口数据 -> 面板文字 (出错的接口保留上一次的显示)"""
+    lines = {}
+    if "profit" in data:
+        p = data["profit"]
+        lines["profit"] = (f"💰 总收益: {p.get('profit_all_coin', 0):.2f} ({p.get('profit_all_percent', 0):.2f}%)"
+                           f"  胜/负 {p.get('winning_trades', 0)}/{p.get('losing_trades', 0)}")
+    if "daily" in data:
+        days = data["daily"].get("data") or []
+        if days:
+            today = days[0]
+            lines["daily"] = (f"📅 今日: {today.get('abs_profit', 0):.2f} {data['daily'].get('stake_currency', '')}"
+                              f" ({today.get('trade_count', 0)} 笔), 近 {len(days)} 天 "
+                              f"{sum(d.get('abs_profit', 0) for d in days):.2f}")
+    if "balance" in data:
+        b = data["balance"]
+        lines["balance"] = f"🏦 余额: {b.get('total', 0):.2f} {b.get('symbol', b.get('stake', ''))}"
+    return lines
 
-    def append_log(self, text):
-        self.txt_log.append(text)
-        self.txt_log.moveCursor(QTextCursor.End)
+class ApiPanel(QGroupBox):
+    """主窗口中的实时状态面板"""
+    def __init__(self, parent=None):
+        super().__init__("📈 机器人实时状态 (REST API)", parent)
+        layout = QVBoxLayout()
+        self.labels = {}
+        for key in ("profit", "daily", "balance"):
+            self.labels[key] = QLabel("—")
+            layout.addWidget(self.labels[key])
+        self.tbl_trades = QTableWidget(0, 3)
+        self.tbl_trades.setHorizontalHeaderLabels(["持仓", "收益%", "开仓时间"])
+        self.tbl_trades.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.tbl_trades.verticalHeader().setVisible(False)
+        self.tbl_trades.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tbl_trades.setMaximumHeight(120)
+        layout.addWidget(self.tbl_trades)
+        self.lbl_state = QLabel("机器人未运行")
+        self.lbl_state.setStyleSheet("color: #7f8c8d;")
+        layout.addWidget(self.lbl_state)
+        self.setLayout(layout)
+
+    @Slot(dict, dict)
+    def update_data(self, data, errors):
+        for key, text in format_api_summary(data).items():
+            self.labels[key].setText(text)
+        if "status" in data:
+            trades = data["status"]
+            self.tbl_trades.setRowCount(len(trades))
+            for row, t in enumerate(trades):
+                ratio = t.get("profit_ratio")
+                for col, text in enumerate((t.get("pair", ""), f"{ratio * 100:.2f}" if ratio is not None else "",
+                                            str(t.get("open_date", ""))[:16])):
+                    self.tbl_trades.setItem(row, col, QTableWidgetItem(text))
+        if errors:
+            self.lbl_state.setText("⚠️ " + "; ".join(f"{k}: {v}" for k, v in errors.items()))
+        else:
+            self.lbl_state.setText(f"🟢 已更新 {datetime.now().strftime('%H:%M:%S')}, 持仓 {len(data.get('status', []))} 笔")
 
-    def on_finished(self):
-        self.btn_run.setEnabled(True)
-        self.btn_gen_dl.setEnabled(True)
-        self.btn_gen_bt.setEnabled(True)
-        self.btn_gen_hyp.setEnabled(True)
+    def set_running(self, on):
+        if not on: self.lbl_state.setText("机器人未运行")
 
 # ==========================================
-# 3. 主程序 (FreqtradeManager) - 保持不变
+# 3.3 [新增] 容器资源遥测 (机器人 + 实验室任务容器共用一条 docker stats 数据流)
 # ==========================================
-class DockerMonitor(QThread):
-    status_signal = Signal(bool)
+# docker stats 每帧开头输出清屏控制符, 按行解析前去掉
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+SIZE_TEXT = re.compile(r"([\d.]+)\s*([kKMGTP]?i?B)")
+SIZE_UNITS = {"B": 1, "kB": 1e3, "KB": 1e3, "MB": 1e6, "GB": 1e9, "TB": 1e12, "PB": 1e15,
+              "KiB": 2**10, "MiB": 2**20, "GiB": 2**30, "TiB": 2**40, "PiB": 2**50}
+
+def parse_size(text):
+    """"1.5GiB" / "12.3kB" -> 字节数"""
+    m = SIZE_TEXT.match(text.strip())
+    return float(m.group(1)) * SIZE_UNITS.get(m.group(2), 1) if m else 0.0
+
+def format_size(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB": return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+
+def parse_percent(text):
+    try:
+        return float(text.strip().rstrip("%"))
+    except ValueError:  # 容器刚启动/已停止时为 "--"
+        return 0.0
+
+def parse_stats_line(line):
+    """docker stats --format '{{json .}}' 的一行 -> 采样字典; 不是数据行时返回 None"""
+    line = ANSI_ESCAPE.sub("", line).strip()
+    if not line.startswith("{"): return None
+    try:
+        row = json.loads(line)
+    except ValueError:
+        return None
+    used, _, limit = (row.get("MemUsage") or "").partition("/")
+    blk_in, _, blk_out = (row.get("BlockIO") or "").partition("/")
+    net_in, _, net_out = (row.get("NetIO") or "").partition("/")
+    pids = str(row.get("PIDs") or "")
+    return {"name": row.get("Name") or row.get("Container") or row.get("ID"),
+            "cpu": parse_percent(row.get("CPUPerc") or ""), "mem_pct": parse_percent(row.get("MemPerc") or ""),
+            "mem": parse_size(used), "mem_limit": parse_size(limit),
+            "io": parse_size(blk_in) + parse_size(blk_out), "net": parse_size(net_in) + parse_size(net_out),
+            "pids": int(pids) if pids.isdigit() else 0}
+
+class RingSeries:
+    """定长环形时间序列: 预分配 float32 数组, 内存不随运行时间增长"""
+    __slots__ = ("data", "pos", "count")
+
+    def __init__(self, size=TELEMETRY_HISTORY):
+        self.data = array("f", bytes(4 * size))
+        self.pos = 0
+        self.count = 0
+
+    def push(self, value):
+        self.data[self.pos] = value
+        self.pos = (self.pos + 1) % len(self.data)
+        self.count = min(self.count + 1, len(self.data))
+
+    def values(self):
+        """按时间顺序 (旧 -> 新) 返回列表"""
+        if self.count < len(self.data): return self.data[:self.count].tolist()
+        return (self.data[self.pos:] + self.data[:self.pos]).tolist()
+
+class ContainerStats:
+    """单个容器的遥测: CPU%、内存%、磁盘 I/O 速率 (字节/秒) 三条环形序列, 最新读数与告警状态"""
+    def __init__(self, name, size=TELEMETRY_HISTORY):
+        self.name = name
+        self.cpu, self.mem, self.io = RingSeries(size), RingSeries(size), RingSeries(size)
+        self.latest = {}
+        self.io_total = None  # (采样时间, 累计读写字节), 用于换算速率
+        self.seen = 0
+        self.alert = False
+
+def format_mem_alert(name, sample):
+    limit = f" / {format_size(sample['mem_limit'])}" if sample.get("mem_limit") else ""
+    return f"{name} 内存 {sample['mem_pct']:.0f}% ({format_size(sample['mem'])}{limit})"
+
+class DockerStatsSource:
+    """docker stats 数据流 (所有运行中的容器, 约每秒一帧), close() 可从其他线程随时中断"""
+    def __init__(self):
+        self.process = None
+
+    def __iter__(self):
+        self.process = subprocess.Popen(
+            ["docker", "stats", "--format", "{{json .}}"],
+            cwd=APP_ROOT, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, encoding='utf-8', errors='replace', creationflags=NO_WINDOW
+        )
+        yield from self.process.stdout
+        self.process.wait()
+
+    def close(self):
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+
+class TelemetryEngine:
+    """
+    资源遥测引擎 (不依赖 Qt, 可用假数据源测试)。
+    source_factory() 返回可迭代的文本行 (可选 close()); on_sample(name) 在每个采样后调用,
+    on_alert(name, on, text) 在内存占用达到 alert_pct 时触发, 回落到 clear_pct 以下才解除 (避免在阈值附近反复告警)。
+    """
+    def __init__(self, on_sample=None, on_alert=None, source_factory=DockerStatsSource, history=TELEMETRY_HISTORY,
+                 alert_pct=TELEMETRY_MEM_ALERT, clear_pct=TELEMETRY_MEM_CLEAR, stale_sec=TELEMETRY_STALE_SEC,
+                 backoff_max=STATUS_BACKOFF_MAX, clock=time.monotonic):
+        self.on_sample = on_sample
+        self.on_alert = on_alert
+        self.source_factory = source_factory
+        self.history = history
+        self.alert_pct = alert_pct
+        self.clear_pct = clear_pct
+        self.stale_sec = stale_sec
+        self.backoff_max = backoff_max
+        self.clock = clock
+        self.containers = {}
+        self._lock = threading.Lock()
+        self._source = None
+        self._stop = threading.Event()
+        self._active = threading.Event()
+        self._active.set()
+        self._wake = threading.Event()
+
+    def feed(self, line, now=None):
+        """处理数据流中的一行, 返回采样字典 (不是数据行时为 None)"""
+        sample = parse_stats_line(line)
+        if not sample or not sample["name"]: return None
+        now = self.clock() if now is None else now
+        name, alerts = sample["name"], []
+        with self._lock:
+            c = self.containers.get(name)
+            if c is None: c = self.containers[name] = ContainerStats(name, self.history)
+            rate = 0.0
+            if c.io_total and now > c.io_total[0]:
+                rate = max(0.0, sample["io"] - c.io_total[1]) / (now - c.io_total[0])
+            c.io_total = (now, sample["io"])
+            c.cpu.push(sample["cpu"])
+            c.mem.push(sample["mem_pct"])
+            c.io.push(rate)
+            c.latest = dict(sample, io_rate=rate)
+            c.seen = now
+            if not c.alert and sample["mem_pct"] >= self.alert_pct:
+                c.alert = True
+                alerts.append((name, True, format_mem_alert(name, sample)))
+            elif c.alert and sample["mem_pct"] < self.clear_pct:
+                c.alert = False
+                alerts.append((name, False, format_mem_alert(name, sample)))
+        if self.on_sample: self.on_sample(name)
+        if self.on_alert:
+            for alert in alerts: self.on_alert(*alert)
+        self.sweep(now)
+        return sample
+
+    def sweep(self, now=None):
+        """
+        移除超过 stale_sec 没有采样的容器 (已停止) 并解除其告警, 返回移除的容器名。
+        最后一个容器停止后 docker stats 不再输出任何行, 所以 run 期间还有定时线程调用, 不只在收到采样时。
+        """
+        now = self.clock() if now is None else now
+        with self._lock:
+            gone = [n for n, c in self.containers.items() if now - c.seen > self.stale_sec]
+            alerts = [(n, False, f"{n} 已停止") for n in gone if self.containers.pop(n).alert]
+        if self.on_sample:
+            for name in gone: self.on_sample(name)
+        if self.on_alert:
+            for alert in alerts: self.on_alert(*alert)
+        return gone
+
+    def _sweep_loop(self):
+        while not self._stop.wait(max(0.1, self.stale_sec / 2)):
+            if self._active.is_set(): self.sweep()
+
+    def snapshot(self):
+        """{容器名: {"cpu"/"mem"/"io": [历史值], "latest": 最新读数, "alert": 是否告警}}"""
+        with self._lock:
+            return {n: {"cpu": c.cpu.values(), "mem": c.mem.values(), "io": c.io.values(),
+                        "latest": dict(c.latest), "alert": c.alert} for n, c in self.containers.items()}
+
     def run(self):
-        while True:
+        threading.Thread(target=self._sweep_loop, daemon=True).start()
+        backoff = 1
+        while not self._stop.is_set():
+            if not self._active.is_set():
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            started = time.monotonic()
+            self._source = self.source_factory()
             try:
-                result = subprocess.run(
-                    "docker compose ps --services --filter \"status=running\"", 
-                    shell=True, cwd=APP_ROOT, capture_output=True, text=True,
-                    creationflags=subprocess.CREATE_NO_WINDOW
-                )
-                self.status_signal.emit(bool(result.stdout.strip()))
-            except: self.status_signal.emit(False)
-            time.sleep(3) 
+                for line in self._source:
+                    if self._stop.is_set() or not self._active.is_set(): break
+                    self.feed(line)
+            except Exception:
+                pass
+            if self._stop.is_set(): break
+            if not self._active.is_set() or time.monotonic() - started >= STATUS_STREAM_HEALTHY:
+                backoff = 1
+                continue
+            # 数据流中断 (Docker 未启动等): 指数退避后重连
+            self._wake.wait(backoff)
+            self._wake.clear()
+            backoff = min(backoff * 2, self.backoff_max)
+
+    def _close_source(self):
+        source = self._source
+        if source is not None and hasattr(source, "close"): source.close()
+
+    def set_active(self, on):
+        """关闭时结束数据流 (不再占用 docker stats), 打开时立即重连"""
+        if on == self._active.is_set(): return
+        if on: self._active.set()
+        else:
+            self._active.clear()
+            self._close_source()
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        self._close_source()
+
+class TelemetryMonitor(QThread):
+    sample_signal = Signal(str)
+    alert_signal = Signal(str, bool, str)
+
+    def __init__(self, **engine_kwargs):
+        super().__init__()
+        self.engine = TelemetryEngine(self.sample_signal.emit, self.alert_signal.emit, **engine_kwargs)
+
+    def run(self):
+        self.engine.run()
+
+    def set_active(self, on):
+        self.engine.set_active(on)
+
+    def stop(self):
+        self.engine.stop()
+        self.wait(3000)
+
+class Sparkline(QWidget):
+    """QPainter 绘制的迷你走势图: 最新的点在最右侧, 右上角显示最新值"""
+    def __init__(self, color, fmt, ceiling=None, capacity=TELEMETRY_HISTORY, parent=None):
+        super().__init__(parent)
+        self.color = QColor(color)
+        self.fmt = fmt            # 最新值 -> 文字
+        self.ceiling = ceiling    # 固定纵轴上限 (百分比为 100), None 时按历史最大值缩放
+        self.capacity = capacity
+        self.values = []
+        self.setMinimumSize(80, 24)
+
+    def set_values(self, values):
+        self.values = values
+        self.update()
+
+    def paintEvent(self, event):
+        p = QPainter(self)
+        p.setRenderHint(QPainter.Antialiasing)
+        w, h = self.width(), self.height()
+        p.fillRect(self.rect(), QColor("#f4f6f6"))
+        if len(self.values) > 1:
+            top = self.ceiling or max(max(self.values), 1e-9)
+            step = (w - 1) / max(self.capacity - 1, 1)
+            x0 = w - 1 - step * (len(self.values) - 1)
+            p.setPen(QPen(self.color, 1.5))
+            p.drawPolyline([QPointF(x0 + i * step, h - 2 - min(v / top, 1.0) * (h - 4)) for i, v in enumerate(self.values)])
+        if self.values:
+            p.setPen(QColor("#2c3e50"))
+            p.drawText(self.rect().adjusted(2, 0, -3, 0), Qt.AlignRight | Qt.AlignTop, self.fmt(self.values[-1]))
+        p.end()
+
+class TelemetryPanel(QGroupBox):
+    """主窗口中的容器资源面板: 每个容器一行 (CPU / 内存 / 磁盘 I/O 走势图); 取消勾选时停止数据流"""
+    def __init__(self, parent=None):
+        super().__init__("🖥 容器资源 (CPU / 内存 / 磁盘 I/O)", parent)
+        self.setCheckable(True)
+        self.setChecked(True)
+        self.monitor = None
+        self.rows = {}
+        self.alerts = {}
+        layout = QVBoxLayout()
+        self.grid = QGridLayout()
+        for col, text in enumerate(("容器", "CPU", "内存", "磁盘 I/O")):
+            header = QLabel(text)
+            header.setStyleSheet("color: #7f8c8d;")
+            self.grid.addWidget(header, 0, col)
+        layout.addLayout(self.grid)
+        self.lbl_state = QLabel("等待数据...")
+        self.lbl_state.setStyleSheet("color: #7f8c8d;")
+        layout.addWidget(self.lbl_state)
+        self.setLayout(layout)
+        # 每个采样都会发信号, 界面合并后按固定间隔刷新
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(TELEMETRY_REFRESH_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.toggled.connect(self.on_toggled)
+
+    def attach(self, monitor):
+        self.monitor = monitor
+        monitor.sample_signal.connect(lambda _: self.refresh_timer.isActive() or self.refresh_timer.start())
+        monitor.alert_signal.connect(self.on_alert)
+        monitor.set_active(self.isChecked())
+
+    def on_toggled(self, on):
+        if self.monitor: self.monitor.set_active(on)
+        self.lbl_state.setText("等待数据..." if on else "已暂停")
+
+    def refresh(self):
+        if not self.monitor: return
+        snap = self.monitor.engine.snapshot()
+        if snap.keys() != self.rows.keys():  # 容器增减时按名称重新排列各行
+            for name, widgets in list(self.rows.items()):
+                for widget in widgets:
+                    self.grid.removeWidget(widget)
+                    if name not in snap: widget.deleteLater()
+                if name not in snap: del self.rows[name]
+            for row, name in enumerate(sorted(snap), 1):
+                if name not in self.rows:
+                    self.rows[name] = (QLabel(name), Sparkline("#2980b9", lambda v: f"{v:.0f}%"),
+                                       Sparkline("#8e44ad", lambda v: f"{v:.0f}%", ceiling=100),
+                                       Sparkline("#16a085", lambda v: f"{format_size(v)}/s"))
+                for col, widget in enumerate(self.rows[name]): self.grid.addWidget(widget, row, col)
+        for name, data in snap.items():
+            label, cpu, mem, io = self.rows[name]
+            latest = data["latest"]
+            label.setStyleSheet(STYLE_SVC_OFF if data["alert"] else "")
+            label.setToolTip(f"内存 {format_size(latest.get('mem', 0))} / {format_size(latest.get('mem_limit', 0))}\n"
+                             f"网络累计 {format_size(latest.get('net', 0))}, 进程数 {latest.get('pids', 0)}")
+            cpu.set_values(data["cpu"])
+            mem.set_values(data["mem"])
+            io.set_values(data["io"])
+        if self.alerts:
+            self.lbl_state.setText("⚠️ " + "; ".join(self.alerts.values()))
+            self.lbl_state.setStyleSheet(STYLE_SVC_OFF)
+        else:
+            self.lbl_state.setText(f"🟢 {len(snap)} 个容器, 更新于 {datetime.now().strftime('%H:%M:%S')}" if snap
+                                   else "没有运行中的容器")
+            self.lbl_state.setStyleSheet("color: #7f8c8d;")
+
+    @Slot(str, bool, str)
+    def on_alert(self, name, on, text):
+        if on: self.alerts[name] = text
+        else: self.alerts.pop(name, None)
+        self.refresh()
 
 class FreqtradeManager(QWidget):
-    def __init__(self):
+    def __init__(self, profiler=None):
         super().__init__()
         self.setWindowTitle("Freqtrade 懒人管家 (V6.4 历史增强版)")
         self.setGeometry(300, 300, 400, 520)
+        self.profiler = profiler or StartupProfiler()
         
         self.check_env()
+        # [新增] config.json 的读写统一经过配置存储 (缓存 + 防抖原子写入 + 外部修改检测)
+        self.config = config_store()
+        self.config.changed.connect(self.on_config_changed)
+        self.config.error.connect(self.on_config_error)
         self.init_ui()
         self.load_config()
-        
+        self.profiler.mark("主窗口构建")
+
+        # [修改] 调度器、状态监视和接口轮询在窗口显示之后再启动 (见 start_services), 实验室窗口首次打开时才创建
+        self.scheduler = None
+        self.monitor = None
+        self.api_poller = None
+        self.telemetry = None
+        self.bt_window = None
+        self.monitor_hint = ""
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if self.scheduler is None: QTimer.singleShot(0, self.start_services)
+
+    def start_services(self):
+        """窗口首次绘制后启动后台服务 (幂等)"""
+        if self.scheduler is not None: return
+        self.profiler.mark("首次显示")
+        if "--bench-startup" in sys.argv:  # [新增] 基准测试只测到首次显示: 输出各阶段耗时后退出, 不启动后台服务
+            print(json.dumps(self.profiler.summary(), ensure_ascii=False), flush=True)
+            QApplication.quit()
+            return
+        # [新增] 实验室任务调度器随主程序常驻, 重启后自动恢复排队中的任务
+        self.scheduler = JobScheduler(self)
+        # [新增] 未完成的滚动窗口优化在恢复的任务开始运行前重新接上 (关闭期间结束的任务同时收取结果)
+        WalkForwardRun.reattach_all(self.scheduler)
+        self.scheduler.schedule()
+
+        # [新增] 机器人运行时轮询 REST 接口, 电源关闭时自动暂停
+        self.api_poller = ApiPoller()
+        self.api_poller.data_signal.connect(self.api_panel.update_data)
+        self.api_poller.start()
+
         self.monitor = DockerMonitor()
         self.monitor.status_signal.connect(self.update_power_light)
+        self.monitor.service_signal.connect(self.update_service_state)
+        self.monitor.mode_signal.connect(self.update_monitor_mode)
         self.monitor.start()
 
+        self.telemetry = TelemetryMonitor()
+        self.telemetry_panel.attach(self.telemetry)
+        self.telemetry.start()
+        self.profiler.mark("后台服务启动")
+        self.profiler.save()
+        if "--profile-startup" in sys.argv:
+            QMessageBox.information(self, "启动耗时", self.profiler.report())
+
     def check_env(self):
         if not os.path.exists(CONFIG_PATH):
             QMessageBox.critical(self, "错误", f"找不到配置文件：\n{CONFIG_PATH}")
@@ -462,9 +5184,22 @@ class FreqtradeManager(QWidget):
         lay_status.addWidget(QLabel("Docker 电源状态"))
         
         lay_status.addStretch()
-        grp_status.setLayout(lay_status)
+        # [新增] 每个服务一个状态标签, 由事件流实时更新
+        self.lay_services = QHBoxLayout()
+        self.svc_labels = {}
+        lay_status_all = QVBoxLayout()
+        lay_status_all.addLayout(lay_status)
+        lay_status_all.addLayout(self.lay_services)
+        grp_status.setLayout(lay_status_all)
         layout.addWidget(grp_status)
 
+        self.api_panel = ApiPanel()
+        layout.addWidget(self.api_panel)
+
+        # [新增] 容器资源遥测 (数据流在 start_services 中启动)
+        self.telemetry_panel = TelemetryPanel()
+        layout.addWidget(self.telemetry_panel)
+
         # --- 2. 电源与日志控制 ---
         grp_ctrl = QGroupBox("🔌 电源与日志")
         lay_ctrl = QVBoxLayout()
@@ -531,7 +5266,7 @@ class FreqtradeManager(QWidget):
         grp_link = QGroupBox("🚀 快捷入口")
         lay_link = QHBoxLayout()
         b1 = QPushButton("🌐 FreqUI (网页)")
-        b1.clicked.connect(lambda: webbrowser.open("http://127.0.0.1:8080"))
+        b1.clicked.connect(self.open_frequi)
         b2 = QPushButton("📂 打开文件夹")
         b2.clicked.connect(lambda: subprocess.Popen(f'explorer "{APP_ROOT}"'))
         lay_link.addWidget(b1)
@@ -543,8 +5278,18 @@ class FreqtradeManager(QWidget):
 
     # --- 功能函数 ---
     def open_backtest_window(self):
-        self.bt_window = BacktestWindow(self)
+        # [修改] 实验室窗口只创建一次, 之后复用 (重新打开时只刷新策略/配置列表)
+        self.start_services()
+        if self.bt_window is None:
+            self.bt_window = BacktestWindow(self.scheduler, self)
+        else:
+            self.bt_window.scan_files()
         self.bt_window.show()
+        self.bt_window.raise_()
+
+    def open_frequi(self):
+        import webbrowser
+        webbrowser.open("http://127.0.0.1:8080")
 
     def open_terminal(self):
         subprocess.Popen(f'start powershell -NoExit -Command "cd \'{APP_ROOT}\'"', shell=True)
@@ -552,16 +5297,45 @@ class FreqtradeManager(QWidget):
     @Slot(bool)
     def update_power_light(self, on):
         self.light_p.setStyleSheet(STYLE_LIGHT_ON if on else STYLE_LIGHT_OFF)
-        self.light_p.setToolTip("运行中" if on else "已停止")
+        self.light_p.setToolTip(("运行中" if on else "已停止") + self.monitor_hint)
+        self.api_panel.set_running(on)
+        self.api_poller.set_active(on)
+
+    @Slot(str, str)
+    def update_service_state(self, service, state):
+        label = self.svc_labels.get(service)
+        if label is None:
+            label = QLabel()
+            self.svc_labels[service] = label
+            self.lay_services.addWidget(label)
+        text, style = SERVICE_STATE_TEXT.get(state, (state, STYLE_SVC_WARN))
+        label.setText(f"● {service}: {text}")
+        label.setStyleSheet(style)
+
+    @Slot(str)
+    def update_monitor_mode(self, mode):
+        self.monitor_hint = "\n状态来源: 事件流 (实时)" if mode == "events" else "\n状态来源: 轮询 (事件流重连中)"
+        self.light_p.setToolTip(self.light_p.toolTip().split("\n")[0] + self.monitor_hint)
+
+    def closeEvent(self, event):
+        if getattr(self, "log_window", None): self.log_window.reject()
+        self.config.flush()
+        if self.monitor: self.monitor.stop()
+        if self.api_poller: self.api_poller.stop()
+        if self.telemetry: self.telemetry.stop()
+        if self.scheduler: self.scheduler.shutdown()
+        super().closeEvent(event)
 
     def view_logs(self):
-        cmd = f'start powershell -NoExit -Command "cd \'{APP_ROOT}\'; echo 正在连接日志...; docker compose logs -f"'
-        subprocess.Popen(cmd, shell=True, cwd=APP_ROOT)
+        # [修改] 内嵌日志窗口代替外部 PowerShell (可搜索/过滤, 内存有上限, Linux 同样可用)
+        if not getattr(self, "log_window", None):
+            self.log_window = LogTailWindow(self)
+        self.log_window.show()
+        self.log_window.raise_()
 
     def load_config(self):
         try:
-            with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = self.config.get(CONFIG_PATH)
             is_dry = data.get("dry_run", True)
             self.chk_dry.blockSignals(True)
             self.chk_dry.setChecked(is_dry)
@@ -587,25 +5361,33 @@ class FreqtradeManager(QWidget):
         port = self.line_port.text().strip()
         if not port.isdigit(): return
         proxy_str = f"http://host.docker.internal:{port}"
-        try:
-            with open(CONFIG_PATH, 'r', encoding='utf-8') as f: data = json.load(f)
+
+        def set_proxy(data):
             if "exchange" not in data: data["exchange"] = {}
             if "ccxt_config" not in data["exchange"]: data["exchange"]["ccxt_config"] = {"enableRateLimit": True}
             data["exchange"]["ccxt_config"]["proxies"] = {"http": proxy_str, "https": proxy_str}
-            with open(CONFIG_PATH, 'w', encoding='utf-8') as f: json.dump(data, f, indent=4, ensure_ascii=False)
+        try:
+            self.config.update(CONFIG_PATH, set_proxy)
             QMessageBox.information(self, "成功", "端口已保存，请点击【重启生效】。")
         except Exception as e: QMessageBox.critical(self, "错误", str(e))
 
     def update_json(self, k, v):
+        # [修改] 写入交给配置存储: 防抖合并 + 原子替换, 不在界面线程里反复整文件重写
         try:
-            with open(CONFIG_PATH, 'r', encoding='utf-8') as f: d=json.load(f)
-            d[k]=v
-            with open(CONFIG_PATH, 'w', encoding='utf-8') as f: json.dump(d,f,indent=4,ensure_ascii=False)
+            self.config.set(CONFIG_PATH, k, v)
             return True
         except Exception as e: return False
 
+    def on_config_error(self, text):
+        QMessageBox.critical(self, "错误", f"配置保存失败: {text}")
+
+    def on_config_changed(self, path):
+        """config.json 被外部修改 (手工编辑/机器人写入) 时刷新界面"""
+        if path == ConfigStore._key(CONFIG_PATH): self.load_config()
+
     def run_bg(self, cmd, msg):
-        threading.Thread(target=lambda: subprocess.run(cmd,shell=True,cwd=APP_ROOT,creationflags=subprocess.CREATE_NO_WINDOW)).start()
+        self.config.flush()  # 启动/关闭容器前确保配置已写入
+        threading.Thread(target=lambda: subprocess.run(cmd,shell=True,cwd=APP_ROOT,creationflags=NO_WINDOW)).start()
         if msg: QMessageBox.information(self,"提示",msg)
 
     def confirm_stop(self):
@@ -614,10 +5396,681 @@ class FreqtradeManager(QWidget):
 
     def confirm_restart(self):
         if QMessageBox.question(self,"重启","确定重启容器吗？")==QMessageBox.Yes:
+            self.config.flush()
             subprocess.Popen(f'start powershell -NoExit -Command "cd \'{APP_ROOT}\'; docker compose restart; echo 重启完成"', shell=True)
 
+# ==========================================
+# 4. [新增] 无界面模式 (命令行 / 本地 HTTP): 不创建 QApplication, 指令与实验室按钮生成的完全一致
+# ==========================================
+HEADLESS_COMMANDS = ("download", "backtest", "hyperopt", "run", "serve", "bench")
+
+# 任务描述的字段会拼进 shell 命令, 每个词只允许 shlex.quote 无需加引号的字符, 且不能以 - 开头 (防止混入选项)
+SPEC_TOKEN = re.compile(r"[\w@%+=:,./]+(?:-[\w@%+=:,./]*)*")
+
+def spec_tokens(value, field):
+    """字段值 (字符串按空白拆分, 或列表) -> 校验过的词列表"""
+    tokens = value.split() if isinstance(value, str) else [str(v) for v in value or []]
+    for tok in tokens:
+        if not SPEC_TOKEN.fullmatch(tok) or ".." in tok:
+            raise ValueError(f"{field} 含有不允许的字符: {tok!r}")
+    return tokens
+
+def spec_token(value, field):
+    tokens = spec_tokens(value, field)
+    if len(tokens) != 1: raise ValueError(f"{field} 需要且只能有一个值")
+    return tokens[0]
+
+def spec_int(value, field):
+    if value is None or value == "": return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} 需要整数: {value!r}")
+
+def build_job_cmds(spec, allow_cmd=False):
+    """
+    任务描述 -> docker 指令列表。spec 的键与命令行参数同名 (kind/config/pairs/days/timerange/strategy/...),
+    每个字段都经过校验后才拼进命令。allow_cmd 为 True 时 (只用于本地任务文件) 也可以直接给出 cmd。
+    参数不完整或不合法时抛出 ValueError。
+    """
+    if spec.get("cmd"):
+        if not allow_cmd: raise ValueError("不接受 cmd 字段, 请用 kind 和参数描述任务")
+        return [spec["cmd"]] if isinstance(spec["cmd"], str) else list(spec["cmd"])
+    kind = spec.get("kind")
+    config = spec_token(spec.get("config") or "config.json", "config")
+    pairs = spec_tokens(spec.get("pairs"), "pairs")
+    days = spec_int(spec.get("days"), "days")
+    timerange = spec_token(spec["timerange"], "timerange") if spec.get("timerange") else None
+    if kind == "download":
+        tfs = spec_tokens(spec.get("timeframes") or HEADLESS_TIMEFRAMES, "timeframes")
+        units = [(tfs, time_flags(days, timerange), pairs)]
+        return build_download_cmds(config, units, trading_mode_flag(spec.get("futures", True)), bool(spec.get("shard")))
+    if kind not in ("backtest", "hyperopt"): raise ValueError(f"未知任务类型: {kind}")
+    if not spec.get("strategy"): raise ValueError(f"{kind} 需要 strategy")
+    strategy = spec_token(spec["strategy"], "strategy")
+    flag = time_flags(days, timerange, is_backtest=True)
+    if kind == "backtest":
+        timeframe = spec_token(spec["timeframe"], "timeframe") if spec.get("timeframe") else None
+        return [build_backtest_cmd(config, flag, pairs, strategy, spec.get("export", True), timeframe)]
+    spaces = spec_tokens(spec.get("spaces"), "spaces")
+    loss = spec_token(spec.get("loss") or "SharpeHyperOptLoss", "loss")
+    # 未指定 -j 时与实验室一样取资源调度的分配 (无界面模式看不到图形界面中正在运行的任务, 按空闲主机计算)
+    jobs = spec_int(spec.get("jobs"), "jobs") or ResourceGovernor(max_concurrent_jobs()).plan("hyperopt")["jobs"]
+    return [build_hyperopt_cmd(config, flag, pairs, strategy, loss, spaces, str(spec_int(spec.get("epochs"), "epochs") or 100),
+                               str(jobs), bool(spec.get("print_all")))]
+
+def run_headless(cmd, outs=(), log_path=None, cancel=None):
+    """
+    运行一条指令: 输出逐行写到 outs 中的每个文本流并归档到任务日志, 返回可 JSON 序列化的结果。
+    Ctrl+C 或 cancel (threading.Event) 置位时先发 SIGINT 让 freqtrade 保存结果, JOB_CANCEL_GRACE 秒后结束进程树。
+    """
+    kind = job_kind(cmd)
+    log_path = log_path or os.path.join(JOB_LOG_DIR, f"{datetime.now():%Y%m%d_%H%M%S}_cli_{uuid.uuid4().hex[:8]}")
+    log = JobLog(log_path)
+    hooks = {"backtest": [BacktestMetrics(), ExportCollector()], "download": [DownloadCounter()]}.get(kind, [])
+    fthypt = []
+    if kind == "hyperopt":
+        _, opts = parse_cmd_args(cmd)
+        epochs = (opts.get("--epochs") or opts.get("-e") or ["0"])[0]
+        hooks.append(HyperoptProgress(int(epochs) if epochs.isdigit() else 0))
+        hooks.append(lambda lines: fthypt.extend(m.group(1) for l in lines for m in [FTHYPT_PATH.search(l)] if m))
+    state = {}
+
+    def on_lines(lines):
+        log.write_lines(lines)
+        text = "\n".join(lines) + "\n"
+        for out in outs:
+            out.write(text)
+            out.flush()
+        for hook in hooks: hook(lines)
+
+    def target():
+        try:
+            state["rc"] = stream_command(cmd, on_lines, lambda p: state.setdefault("process", p))
+        except Exception as e:
+            state["error"] = str(e)
+
+    started = time.time()
+    write_rate_limit_configs(cmd)
+    on_lines(["🚀 执行命令:", cmd, "=" * 40])
+    t = threading.Thread(target=target, daemon=True)
+    t.start()
+    interrupted = None
+    while t.is_alive():
+        try:
+            t.join(0.2)
+            if cancel is not None and cancel.is_set() and interrupted is None: raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            if interrupted is None:
+                interrupted = time.monotonic()
+                kill_process_tree(state.get("process"), getattr(signal, "SIGINT", None))
+                continue
+            kill_process_tree(state.get("process"))  # 第二次 Ctrl+C: 不再等待
+        if interrupted and time.monotonic() - interrupted > JOB_CANCEL_GRACE: kill_process_tree(state.get("process"))
+    rc = state.get("rc")
+    on_lines(["=" * 40, f"✅ 任务结束 (退出码 {rc})" if "error" not in state else f"❌ 发生错误: {state['error']}"])
+    log.close()
+    status = "cancelled" if interrupted else ("done" if rc == 0 else "failed")
+    result = {"cmd": cmd, "kind": kind, "status": status, "returncode": rc, "started": datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+              "duration": round(time.time() - started, 3), "log": log_path}
+    if "error" in state: result["error"] = state["error"]
+    if kind == "backtest":
+        result["metrics"] = hooks[0].metrics
+        result["exports"] = hooks[1].exports() if rc == 0 else []
+    elif kind == "download":
+        result["candles"] = hooks[0].candles
+    elif kind == "hyperopt":
+        result["progress"] = hooks[0].snapshot()
+        if fthypt:
+            result["fthypt"] = host_path(fthypt[-1])
+            best = best_fthypt_epoch(result["fthypt"]) if rc == 0 and os.path.exists(result["fthypt"]) else None
+            if best: result["best"] = {"loss": best["loss"], "params": best.get("params_details", {})}
+    return result
+
+def headless_parser():
+    import argparse
+    parser = argparse.ArgumentParser(prog="kq4", description="Freqtrade 懒人管家 - 无界面模式 (不带子命令时启动图形界面)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def output_args(p):
+        p.add_argument("--dry-run", action="store_true", help="只输出指令, 不运行")
+        p.add_argument("--json", action="store_true", help="标准输出只写 JSON 结果, 日志改写到标准错误")
+        p.add_argument("--log-file", help="日志同时追加到此文件")
+        p.add_argument("--quiet", action="store_true", help="不在终端输出日志")
+
+    def common_args(p):
+        p.add_argument("--config", default="config.json", help="user_data 下的配置文件名")
+        p.add_argument("--pairs", nargs="*", default=[], help="强制币种 (默认使用配置中的白名单)")
+        p.add_argument("--days", type=int, help="最近 N 天 (回测/优化换算为截至今天的 --timerange)")
+        p.add_argument("--timerange", help="YYYYMMDD-YYYYMMDD")
+        output_args(p)
+
+    p = sub.add_parser("download", help="下载K线数据")
+    common_args(p)
+    p.add_argument("--timeframes", nargs="+", default=HEADLESS_TIMEFRAMES)
+    p.add_argument("--spot", dest="futures", action="store_false", help="现货模式 (默认与实验室一致为合约)")
+    p.add_argument("--shard", action="store_true", help="按 周期 × 币种块 分片 (叠加交易所限速配置)")
+    p = sub.add_parser("backtest", help="回测")
+    common_args(p)
+    p.add_argument("--strategy", required=True, help="策略类名")
+    p.add_argument("--timeframe")
+    p.add_argument("--no-export", dest="export", action="store_false")
+    p = sub.add_parser("hyperopt", help="参数优化")
+    common_args(p)
+    p.add_argument("--strategy", required=True, help="策略类名")
+    p.add_argument("--loss", default="SharpeHyperOptLoss")
+    p.add_argument("--spaces", nargs="+", default=[])
+    p.add_argument("--epochs", type=int, default=100)
+    p.add_argument("--jobs", type=int, help="优化进程数 (默认与实验室一样按资源调度分配, -1 为占满所有核心)")
+    p.add_argument("--print-all", action="store_true")
+    p = sub.add_parser("run", help="按任务文件 (JSON 列表或 {\"jobs\": [...]}) 依次运行")
+    p.add_argument("job_file")
+    output_args(p)
+    p = sub.add_parser("serve", help="启动本地 HTTP 接口 (只监听 127.0.0.1)")
+    p.add_argument("--port", type=int, default=HEADLESS_PORT)
+    p = sub.add_parser("bench", help="基准测试 (用假 docker compose, 不需要 Docker 和网络)")
+    p.add_argument("--lines", type=int, default=BENCH_LOG_LINES, help="每轮日志行数")
+    p.add_argument("--line-bytes", type=int, default=BENCH_LINE_BYTES)
+    p.add_argument("--rounds", type=int, default=BENCH_ROUNDS, help="日志轮数 (用于观察内存增长)")
+    p.add_argument("--events", type=int, default=BENCH_STATUS_EVENTS, help="状态事件数")
+    p.add_argument("--startup-runs", type=int, default=BENCH_STARTUP_RUNS, help="启动测试次数, 0 为跳过")
+    p.add_argument("--baseline", default=BENCH_BASELINE_PATH)
+    p.add_argument("--save-baseline", action="store_true", help="把本次结果保存为基线")
+    p.add_argument("--tolerance", type=float, default=BENCH_TOLERANCE, help="变差超过基线的这个比例算回归")
+    p.add_argument("--out", help="结果 JSON 另存到此文件")
+    return parser
+
+OUTPUT_ARGS = ("command", "dry_run", "json", "log_file", "quiet", "job_file")
+
+def cli_main(argv):
+    """命令行入口, 返回进程退出码: 0 全部成功, 1 有任务失败, 2 参数错误, 130 被中断"""
+    for stream in (sys.stdout, sys.stderr):
+        if hasattr(stream, "reconfigure"): stream.reconfigure(errors="replace")
+    args = headless_parser().parse_args(argv)
+    if args.command == "serve": return serve_headless(args.port)
+    if args.command == "bench": return bench_main(args)
+    try:
+        if args.command == "run":
+            with open(args.job_file, 'r', encoding='utf-8') as f: data = json.load(f)
+            specs = data.get("jobs", []) if isinstance(data, dict) else data
+        else:
+            specs = [dict({k: v for k, v in vars(args).items() if k not in OUTPUT_ARGS}, kind=args.command)]
+        cmds = [cmd for spec in specs for cmd in build_job_cmds(spec, allow_cmd=args.command == "run")]
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 2
+    if args.dry_run:
+        print(json.dumps({"cmds": cmds}, ensure_ascii=False) if args.json else "\n".join(cmds))
+        return 0
+    outs = [] if args.quiet else [sys.stderr if args.json else sys.stdout]
+    log_file = open(args.log_file, 'a', encoding='utf-8') if args.log_file else None
+    if log_file: outs.append(log_file)
+    results = []
+    try:
+        for cmd in cmds:
+            results.append(run_headless(cmd, [o for o in outs if o]))
+            if results[-1]["status"] == "cancelled": break
+    finally:
+        if log_file: log_file.close()
+    ok = len(results) == len(cmds) and all(r["status"] == "done" for r in results)
+    if args.json:
+        print(json.dumps({"ok": ok, "results": results}, ensure_ascii=False, indent=2))
+    else:
+        for r in results:
+            extra = r.get("metrics") or ({"candles": r["candles"]} if "candles" in r else r.get("best", {}).get("loss"))
+            print(f"{'✅' if r['status'] == 'done' else '❌'} {r['kind']} {r['status']} ({r['duration']:.1f}s)"
+                  f"{f' {extra}' if extra else ''}  日志: {r['log']}")
+    if results and results[-1]["status"] == "cancelled": return 130
+    return 0 if ok else 1
+
+class HeadlessServer:
+    """本地 HTTP 接口的任务表: 提交的任务在一个后台线程中按顺序运行"""
+    def __init__(self):
+        import queue
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        threading.Thread(target=self.worker, daemon=True).start()
+
+    def get(self, job_id):
+        with self.lock: return self.jobs.get(job_id)
+
+    def describe(self, job=None):
+        """任务 (或全部任务) 的可序列化副本, 在锁内复制, 不会读到工作线程写了一半的状态"""
+        with self.lock:
+            return [dict(self.public(j), results=list(j["results"])) for j in ([job] if job else self.jobs.values())]
+
+    def submit(self, spec):
+        cmds = build_job_cmds(spec)
+        job_id = uuid.uuid4().hex[:8]
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        job = {"id": job_id, "status": "queued", "cmds": cmds, "results": [],
+               "logs": [os.path.join(JOB_LOG_DIR, f"{stamp}_http_{job_id}_{i}") for i in range(len(cmds))],
+               "cancel": threading.Event()}
+        with self.lock: self.jobs[job_id] = job
+        self.queue.put(job_id)
+        return self.describe(job)[0]
+
+    @staticmethod
+    def public(job):
+        return {k: v for k, v in job.items() if k != "cancel"}
+
+    def worker(self):
+        while True:
+            job = self.get(self.queue.get())
+            if job["cancel"].is_set():
+                with self.lock:
+                    job["status"] = "cancelled"
+                    self.trim()
+                continue
+            with self.lock: job["status"] = "running"
+            for cmd, log_path in zip(job["cmds"], job["logs"]):
+                result = run_headless(cmd, (), log_path, job["cancel"])
+                with self.lock: job["results"].append(result)
+                if result["status"] != "done": break
+            statuses = [r["status"] for r in job["results"]]
+            with self.lock:
+                job["status"] = "cancelled" if "cancelled" in statuses else (
+                    "done" if len(statuses) == len(job["cmds"]) and set(statuses) == {"done"} else "failed")
+                self.trim()
+
+    def log_lines(self, job, offset=0):
+        """从第 offset 行开始的日志 (任务的多条指令日志依次拼接), 只读取 offset 之后的部分"""
+        out = []
+        for path in job["logs"]:
+            if not os.path.exists(path): break
+            lines, total = read_log_from(path, offset)
+            out += lines
+            offset = max(0, offset - total)
+        return out
+
+    def trim(self):
+        """已结束的任务最多保留 JOB_HISTORY_MAX 条 (在锁内调用)"""
+        ended = [j for j in self.jobs.values() if j["status"] not in ("queued", "running")]
+        for job in ended[:-JOB_HISTORY_MAX]: del self.jobs[job["id"]]
+
+LOOPBACK_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+def serve_headless(port=HEADLESS_PORT, ready=None, token=None):
+    """
+    本地 HTTP 接口 (127.0.0.1), 每个请求都要带启动时打印的令牌 (Authorization: Bearer <令牌>);
+    Host/Origin 不是本机的请求一律拒绝 (防止网页跨站请求和 DNS 重绑定), 也不接受直接给出的 cmd:
+      POST /build            任务描述 -> 指令 (不运行)
+      POST /jobs             提交任务, 返回任务 ID
+      GET  /jobs[/<ID>]      任务列表 / 状态与结果
+      GET  /jobs/<ID>/log?offset=N   从第 N 行开始的日志
+      POST /jobs/<ID>/cancel 取消
+    """
+    from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+    from urllib.parse import urlparse, parse_qs
+    import secrets
+    import hmac
+    token = token or secrets.token_urlsafe(24)
+    jobs = HeadlessServer()
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args): pass
+
+        def reply(self, code, data, content_type="application/json"):
+            body = (json.dumps(data, ensure_ascii=False) if content_type == "application/json" else data).encode('utf-8')
+            self.send_response(code)
+            self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def allowed(self):
+            host = urlparse(f"//{self.headers.get('Host') or ''}").hostname
+            origin = self.headers.get("Origin")
+            if host not in LOOPBACK_HOSTS or (origin and urlparse(origin).hostname not in LOOPBACK_HOSTS):
+                self.reply(403, {"error": "forbidden"})
+                return False
+            if not hmac.compare_digest(self.headers.get("Authorization") or "", f"Bearer {token}"):
+                self.reply(401, {"error": "unauthorized"})
+                return False
+            return True
+
+        def route(self):
+            url = urlparse(self.path)
+            parts = [p for p in url.path.split("/") if p]
+            job = jobs.get(parts[1]) if len(parts) > 1 and parts[0] == "jobs" else None
+            return url, parts, job
+
+        def do_GET(self):
+            if not self.allowed(): return
+            url, parts, job = self.route()
+            if parts == ["jobs"]:
+                return self.reply(200, jobs.describe())
+            if not job: return self.reply(404, {"error": "not found"})
+            if len(parts) == 2: return self.reply(200, jobs.describe(job)[0])
+            if parts[2:] == ["log"]:
+                try:
+                    offset = int(parse_qs(url.query).get("offset", ["0"])[0])
+                    if offset < 0: raise ValueError
+                except ValueError:
+                    return self.reply(400, {"error": "offset 必须是非负整数"})
+                return self.reply(200, "\n".join(jobs.log_lines(job, offset)), "text/plain")
+            self.reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if not self.allowed(): return
+            url, parts, job = self.route()
+            if job and parts[2:] == ["cancel"]:
+                job["cancel"].set()
+                return self.reply(200, jobs.describe(job)[0])
+            try:
+                spec = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+                if parts == ["build"]: return self.reply(200, {"cmds": build_job_cmds(spec)})
+                if parts == ["jobs"]: return self.reply(202, jobs.submit(spec))
+            except (ValueError, AttributeError) as e:
+                return self.reply(400, {"error": str(e)})
+            self.reply(404, {"error": "not found"})
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.token = token
+    print(f"🌐 无界面模式 HTTP 接口: http://127.0.0.1:{server.server_address[1]}\n🔑 令牌 (本次运行有效): {token}",
+          file=sys.stderr, flush=True)
+    if ready: ready(server)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+# ==========================================
+# 5. [新增] 基准测试: docker 换成本地假命令 (可配置输出量/延迟/退出码), 结果与基线比较
+# ==========================================
+# 假 docker: compose ps 返回运行中的服务, compose events 按间隔发出状态事件 (timeNano 为发出时间),
+# compose run / exec 在延迟后输出指定数量的 freqtrade 格式日志行
+FAKE_DOCKER = r"""
+import json, os, sys, time
+args, env = sys.argv[1:], os.environ.get
+services = env("KQ4_FAKE_SERVICES", "freqtrade").split(",")
+if args[:2] == ["compose", "ps"]:
+    for svc in services: print(json.dumps({"Service": svc, "State": "running", "Health": ""}))
+elif args[:2] == ["compose", "events"]:
+    time.sleep(float(env("KQ4_FAKE_DELAY", "0")))
+    for i in range(int(env("KQ4_FAKE_EVENTS", "0"))):
+        time.sleep(float(env("KQ4_FAKE_EVENT_GAP", "0.01")))
+        print(json.dumps({"type": "container", "service": services[0], "action": "start" if i % 2 else "die",
+                          "timeNano": time.time_ns()}), flush=True)
+    time.sleep(3600)
+elif args[:2] == ["compose", "run"] or args[:1] == ["exec"]:
+    time.sleep(float(env("KQ4_FAKE_DELAY", "0")))
+    n, width = int(env("KQ4_FAKE_LINES", "1000")), int(env("KQ4_FAKE_LINE_BYTES", "120"))
+    head = "2026-01-01 00:00:00,000 - freqtrade.optimize.backtesting - INFO - bench "
+    for start in range(0, n, 1000):
+        sys.stdout.buffer.write("".join(f"{head}{i:09d} ".ljust(width, "x") + "\n"
+                                        for i in range(start, min(n, start + 1000))).encode())
+    sys.stdout.flush()
+    sys.exit(int(env("KQ4_FAKE_EXIT", "0")))
+"""
+
+# 指标 -> (越大越好, 绝对余量): 变差同时超过 基线 × 容差 和 绝对余量 才算回归 (避免小数值的抖动误报)
+BENCH_METRICS = {
+    "cmd_build_us": (False, 20), "log_lines_per_sec": (True, 0), "log_mb_per_sec": (True, 0),
+    "loop_lag_p99_ms": (False, 10), "status_latency_p50_ms": (False, 5), "status_latency_p99_ms": (False, 10),
+    "status_poll_ms": (False, 20), "rss_growth_mb": (False, 10), "peak_rss_mb": (False, 20), "startup_ms": (False, 100),
+}
+
+def install_fake_docker(folder):
+    """在 folder 中写入假 docker 命令, 返回应加到 PATH 最前面的目录"""
+    script = os.path.join(folder, "docker.py")
+    with open(script, 'w', encoding='utf-8') as f: f.write(FAKE_DOCKER)
+    if sys.platform == "win32":
+        with open(os.path.join(folder, "docker.cmd"), 'w', encoding='utf-8') as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        path = os.path.join(folder, "docker")
+        with open(path, 'w', encoding='utf-8') as f: f.write(f"#!{sys.executable}\n{FAKE_DOCKER}")
+        os.chmod(path, 0o755)
+    return folder
+
+def set_fake(**settings):
+    os.environ.update({f"KQ4_FAKE_{k.upper()}": str(v) for k, v in settings.items()})
+
+def process_memory():
+    """(当前 RSS, 峰值 RSS) 字节数, 取不到时为 (None, None)"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            class Counters(ctypes.Structure):
+                _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong)] + [(n, ctypes.c_size_t) for n in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+            c = Counters()
+            c.cb = ctypes.sizeof(c)
+            ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(c), c.cb)
+            return c.WorkingSetSize, c.PeakWorkingSetSize
+        import resource
+        with open("/proc/self/statm") as f: rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        return rss, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    except (OSError, ValueError, AttributeError, ImportError):
+        return None, None
+
+def percentile(values, q):
+    if not values: return None
+    values = sorted(values)
+    return values[min(len(values) - 1, round(q / 100 * (len(values) - 1)))]
+
+class LoopProbe(QObject):
+    """事件循环延迟探针: 高精度定时器每 BENCH_PROBE_MS 毫秒触发一次, 记录实际间隔超出的毫秒数"""
+    def __init__(self, interval=BENCH_PROBE_MS):
+        super().__init__()
+        self.interval = interval
+        self.lags = []
+        self.last = None
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.tick)
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def tick(self):
+        now = time.perf_counter()
+        self.lags.append(max(0.0, (now - self.last) * 1000 - self.interval))
+        self.last = now
+
+def run_loop(connect, timeout):
+    """运行局部事件循环, 直到 connect(quit) 注册的信号触发或超时"""
+    loop = QEventLoop()
+    connect(loop.quit)
+    QTimer.singleShot(int(timeout * 1000), loop.quit)
+    loop.exec()
+
+def bench_cmd_build(n=2000):
+    """
+    只测指令拼接本身: 不分片 (分片要读取合并配置), 优化任务给出 jobs (不查询主机资源),
+    循环中没有任何磁盘或系统调用, 结果只反映 build_job_cmds 的开销。
+    """
+    specs = [{"kind": "download", "days": 30, "pairs": ["BTC/USDT", "ETH/USDT"]},
+             {"kind": "backtest", "strategy": "SampleStrategy", "timerange": "20240101-20240601", "pairs": ["BTC/USDT"]},
+             {"kind": "hyperopt", "strategy": "SampleStrategy", "days": 90, "spaces": ["buy", "sell"], "epochs": 500,
+              "jobs": 4}]
+    t = time.perf_counter()
+    for _ in range(n):
+        for spec in specs: build_job_cmds(spec)
+    return {"cmd_build_us": round((time.perf_counter() - t) / (n * len(specs)) * 1e6, 2)}
+
+def bench_log_pipeline(folder, lines, line_bytes, rounds):
+    """
+    日志管线: 假 docker 输出 -> DockerWorker (分块读取 + 磁盘归档) -> 定时取出 -> 日志框,
+    与实验室任务的刷新方式相同。同时用探针测量界面事件循环的延迟, 每轮结束后记录 RSS。
+    """
+    set_fake(lines=lines, line_bytes=line_bytes, delay=0, exit=0)
+    view = QPlainTextEdit()
+    view.setMaximumBlockCount(LOG_VIEW_MAX_LINES)
+    view.resize(800, 600)
+    view.show()
+    probe = LoopProbe()
+    rates, dropped, rss = [], 0, []
+    for i in range(rounds):
+        worker = DockerWorker(COMPOSE_RUN_PREFIX + "backtesting --bench", os.path.join(folder, f"log_{i}"))
+
+        def flush():
+            shown = worker.log.drain()
+            if shown: view.appendPlainText("\n".join(shown))
+
+        timer = QTimer()
+        timer.setInterval(LOG_FLUSH_MS)
+        timer.timeout.connect(flush)
+        probe.start()
+        timer.start()
+        t = time.perf_counter()
+        worker.start()
+        run_loop(worker.finished.connect, 600)
+        elapsed = time.perf_counter() - t
+        timer.stop()
+        probe.stop()
+        worker.wait()
+        flush()
+        if worker.returncode != 0 or worker.log.total < lines:
+            raise RuntimeError(f"假 docker 输出不完整: 退出码 {worker.returncode}, {worker.log.total}/{lines} 行")
+        rates.append(worker.log.total / elapsed)
+        dropped += worker.log.dropped
+        rss.append(process_memory()[0])
+    view.close()
+    rate = percentile(rates, 50)
+    return {"log_lines_per_sec": round(rate), "log_mb_per_sec": round(rate * line_bytes / 1e6, 2),
+            "log_dropped_lines": dropped, "loop_lag_p50_ms": round(percentile(probe.lags, 50), 2),
+            "loop_lag_p99_ms": round(percentile(probe.lags, 99), 2), "loop_lag_max_ms": round(max(probe.lags), 2),
+            "rss_growth_mb": round((rss[-1] - rss[0]) / 2**20, 1) if None not in rss else None}
+
+class TimedEventSource(ComposeEventSource):
+    """记录每个事件的发出时间 (假 docker 写在 timeNano 字段), 用于测量状态延迟"""
+    def __init__(self, sent):
+        super().__init__()
+        self.sent = sent
+
+    def __iter__(self):
+        for event in super().__iter__():
+            self.sent.append(event.get("timeNano"))
+            yield event
+
+def bench_status(events, gap=0.01, polls=10):
+    """状态延迟: 假事件流 -> DockerMonitor 线程 -> 跨线程信号 -> 界面槽函数; 另测一次全量查询的耗时"""
+    set_fake(events=events, event_gap=gap, delay=0.2)
+    sent, latencies = deque(), []
+    monitor = DockerMonitor(event_source_factory=lambda: TimedEventSource(sent))
+    done = []
+
+    def on_state(service, state):
+        if not sent: return  # 启动时的全量同步, 不是事件
+        latencies.append((time.time_ns() - sent.popleft()) / 1e6)
+        if len(latencies) >= events and not done:
+            done.append(True)
+            monitor.mode_signal.emit("done")
+
+    monitor.service_signal.connect(on_state)
+    monitor.start()
+    run_loop(lambda quit: monitor.mode_signal.connect(lambda mode: mode == "done" and quit()), 30 + events * gap * 5)
+    monitor.stop()
+    if len(latencies) < events: raise RuntimeError(f"状态事件丢失: 收到 {len(latencies)}/{events}")
+    times = []
+    for _ in range(polls):
+        t = time.perf_counter()
+        compose_snapshot()
+        times.append((time.perf_counter() - t) * 1000)
+    return {"status_latency_p50_ms": round(percentile(latencies, 50), 2),
+            "status_latency_p99_ms": round(percentile(latencies, 99), 2),
+            "status_poll_ms": round(percentile(times, 50), 2)}
+
+def bench_startup(runs):
+    """冷启动: 新进程打开主窗口到首次显示的墙钟时间 (取中位数), 以及最后一次的分阶段耗时"""
+    cmd = [sys.executable] + ([] if getattr(sys, "frozen", False) else [os.path.abspath(__file__)]) + ["--bench-startup"]
+    walls, phases = [], {}
+    for _ in range(runs):
+        t = time.perf_counter()
+        result = subprocess.run(cmd, cwd=APP_ROOT, capture_output=True, text=True, encoding='utf-8',
+                                errors='replace', timeout=120, creationflags=NO_WINDOW)
+        walls.append((time.perf_counter() - t) * 1000)
+        if result.returncode != 0 or not result.stdout.strip():
+            raise RuntimeError(f"启动测试失败 (退出码 {result.returncode}): {result.stderr.strip()[-500:]}")
+        phases = json.loads(result.stdout.strip().splitlines()[-1])
+    return {"startup_ms": round(percentile(walls, 50), 1), "startup_phases_ms": phases}
+
+def compare_bench(metrics, baseline, tolerance=BENCH_TOLERANCE):
+    """与基线比较, 返回回归列表"""
+    regressions = []
+    for name, (higher, slack) in BENCH_METRICS.items():
+        old, new = baseline.get(name), metrics.get(name)
+        if old is None or new is None: continue
+        worse = (old - new) if higher else (new - old)
+        if worse > max(abs(old) * tolerance, slack):
+            regressions.append({"metric": name, "baseline": old, "value": new,
+                                "change": round((new - old) / old, 3) if old else None})
+    return regressions
+
+def bench_main(args):
+    """运行全部基准测试, 结果 JSON 写到标准输出 (摘要写到标准错误); 相对基线有回归时退出码为 1"""
+    import tempfile
+    import platform
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")  # 测试窗口不显示出来 (启动测试的子进程同样继承)
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    folder = tempfile.mkdtemp(prefix="kq4_bench_")
+    os.environ["PATH"] = install_fake_docker(folder) + os.pathsep + os.environ.get("PATH", "")
+    metrics = {}
+    try:
+        metrics.update(bench_cmd_build())
+        print("⏱ 指令构建完成", file=sys.stderr, flush=True)
+        metrics.update(bench_log_pipeline(folder, args.lines, args.line_bytes, max(1, args.rounds)))
+        print("⏱ 日志管线完成", file=sys.stderr, flush=True)
+        metrics.update(bench_status(args.events))
+        print("⏱ 状态延迟完成", file=sys.stderr, flush=True)
+        if args.startup_runs > 0:
+            metrics.update(bench_startup(args.startup_runs))
+            print("⏱ 启动测试完成", file=sys.stderr, flush=True)
+    except (RuntimeError, OSError, ValueError, subprocess.TimeoutExpired) as e:
+        print(f"❌ 基准测试失败: {e}", file=sys.stderr)
+        return 2
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+    peak = process_memory()[1]
+    metrics["peak_rss_mb"] = round(peak / 2**20, 1) if peak else None
+    result = {"created": datetime.now().isoformat(timespec="seconds"),
+              "env": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+              "params": {"lines": args.lines, "line_bytes": args.line_bytes, "rounds": args.rounds,
+                         "events": args.events, "startup_runs": args.startup_runs},
+              "metrics": metrics, "baseline": None, "regressions": []}
+    try:
+        with open(args.baseline, 'r', encoding='utf-8') as f: baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = None
+    if baseline:
+        result["baseline"] = args.baseline
+        scale = ("lines", "line_bytes", "rounds", "events")
+        if any(baseline.get("params", {}).get(k) != result["params"][k] for k in scale):
+            result["warning"] = "参数与基线不同, 比较结果仅供参考"
+        result["regressions"] = compare_bench(metrics, baseline.get("metrics", {}), args.tolerance)
+    if args.save_baseline:
+        write_json_atomic(args.baseline, {k: result[k] for k in ("created", "env", "params", "metrics")})
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f: f.write(text)
+    for name in BENCH_METRICS:
+        if name in metrics: print(f"  {name}: {metrics[name]}", file=sys.stderr)
+    for r in result["regressions"]:
+        print(f"⚠️ 回归: {r['metric']} {r['baseline']} -> {r['value']}", file=sys.stderr)
+    if args.save_baseline: print(f"💾 已保存基线: {args.baseline}", file=sys.stderr)
+    elif not baseline: print(f"ℹ️ 没有基线 ({args.baseline}), 用 --save-baseline 保存本次结果", file=sys.stderr)
+    return 1 if result["regressions"] and not args.save_baseline else 0
+
 if __name__ == "__main__":
+    # [新增] 带子命令时走无界面模式 (不创建 QApplication)
+    if len(sys.argv) > 1 and sys.argv[1] in HEADLESS_COMMANDS: sys.exit(cli_main(sys.argv[1:]))
+    profiler = StartupProfiler()
+    profiler.mark("导入模块")
     app = QApplication(sys.argv)
-    w = FreqtradeManager()
+    profiler.mark("创建 QApplication")
+    w = FreqtradeManager(profiler)
     w.show()
     sys.exit(app.exec())
\ No newline at end of file
@@ -10,23 +10,29 @@ a = Analysis(
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    # 只用到 QtCore/QtGui/QtWidgets, 其余 Qt 模块和 tkinter 不打包 (减小目录体积)
+    excludes=['tkinter', 'PySide6.QtNetwork', 'PySide6.QtQml', 'PySide6.QtQuick', 'PySide6.QtQuickWidgets',
+              'PySide6.QtWebEngineCore', 'PySide6.QtWebEngineWidgets', 'PySide6.QtWebChannel',
+              'PySide6.QtMultimedia', 'PySide6.QtPdf', 'PySide6.QtSql', 'PySide6.QtOpenGL',
+              'PySide6.QtOpenGLWidgets', 'PySide6.QtSvg', 'PySide6.Qt3DCore', 'PySide6.QtCharts',
+              'PySide6.QtDataVisualization', 'PySide6.QtBluetooth', 'PySide6.QtPositioning'],
     noarchive=False,
     optimize=0,
 )
 pyz = PYZ(a.pure)
 
+# [修改] 目录版 (one-dir): 单文件版每次启动都要把整个 Qt 运行库解压到临时目录, 冷启动最慢的就是这一步;
+# 目录版的 DLL 直接从 dist/kq4/_internal 加载。把整个 dist/kq4 文件夹放到 freqtrade 根目录下即可。
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='kq4',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
+    upx=False,  # UPX 压缩后每次启动都要解压 DLL, 还容易被杀毒软件拦截扫描, 启动反而更慢
     upx_exclude=[],
     runtime_tmpdir=None,
     console=False,
@@ -36,3 +42,12 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='kq4',
+)
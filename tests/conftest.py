@@ -0,0 +1,6 @@
+import os
+import sys
+
+# 测试只用到不依赖 Qt 的引擎类, 但导入 kq4 会加载 PySide6; 无显示环境下用 offscreen 平台
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,133 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import kq4
+
+RESPONSES = {
+    "status": [{"pair": "BTC/USDT", "profit_ratio": 0.01, "open_date": "2026-01-01 10:00:00"}],
+    "profit": {"profit_all_coin": 12.5, "profit_all_percent": 1.25, "winning_trades": 3, "losing_trades": 1},
+    "balance": {"total": 1012.5, "symbol": "USDT"},
+    "daily": {"data": [{"abs_profit": 2.5, "trade_count": 2}], "stake_currency": "USDT"},
+}
+
+
+@pytest.fixture
+def stub():
+    """本地 freqtrade REST 桩服务: 账号 u/p, failing 中的接口返回 500; 记录请求路径与客户端连接"""
+    state = {"hits": [], "conns": set(), "failing": set(), "slow": set()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # 支持长连接
+
+        def log_message(self, *args): pass
+
+        def reply(self, code, body=b""):
+            self.send_response(code)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            state["hits"].append(self.path)
+            state["conns"].add(self.client_address)
+            endpoint = self.path.split("?")[0].rsplit("/", 1)[-1]
+            if self.headers.get("Authorization") != "Basic dTpw": return self.reply(401)
+            if endpoint in state["failing"]: return self.reply(500)
+            if endpoint in state["slow"]: time.sleep(0.5)
+            self.reply(200, json.dumps(RESPONSES[endpoint]).encode())
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["port"] = server.server_address[1]
+    yield state
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_all_uses_cache(stub):
+    client = kq4.FreqtradeApiClient("127.0.0.1", stub["port"], "u", "p")
+    data, errors = client.fetch_all()
+    assert errors == {} and data == RESPONSES
+    for _ in range(10): client.fetch_all()  # 全部在 TTL 内, 不再发请求
+    client.close()
+    assert client.requests == 4 and len(stub["hits"]) == 4
+    assert "/api/v1/daily?timescale=7" in stub["hits"]
+
+
+def test_connections_are_kept_alive_per_worker(stub):
+    ttl = {ep: 0 for ep in RESPONSES}
+    client = kq4.FreqtradeApiClient("127.0.0.1", stub["port"], "u", "p", ttl=ttl, workers=2)
+    for _ in range(5): client.fetch_all()
+    client.close()
+    assert len(stub["hits"]) == 20
+    assert len(stub["conns"]) <= 2  # 每个工作线程一条长连接, 轮询之间复用
+
+
+def test_slow_endpoint_does_not_delay_others(stub):
+    stub["slow"].update({"status", "profit"})
+    client = kq4.FreqtradeApiClient("127.0.0.1", stub["port"], "u", "p", workers=4)
+    t = time.monotonic()
+    data, errors = client.fetch_all()
+    elapsed = time.monotonic() - t
+    client.close()
+    assert errors == {} and len(data) == 4
+    assert elapsed < 0.9  # 两个慢接口 (各 0.5 秒) 并发执行
+
+
+def test_zero_ttl_requests_every_time(stub):
+    client = kq4.FreqtradeApiClient("127.0.0.1", stub["port"], "u", "p", ttl={"status": 0})
+    for _ in range(3): client.fetch_all()
+    client.close()
+    assert stub["hits"] == ["/api/v1/status"] * 3
+
+
+def test_failing_endpoint_backs_off_without_requests(stub):
+    client = kq4.FreqtradeApiClient("127.0.0.1", stub["port"], "u", "p")
+    stub["failing"].add("balance")
+    data, errors = client.fetch_all()
+    assert errors == {"balance": "HTTP 500"} and set(data) == {"status", "profit", "daily"}
+    _, errors = client.fetch_all()
+    assert errors["balance"].startswith("退避中")
+    assert stub["hits"].count("/api/v1/balance") == 1  # 退避期间不请求
+    # 退避到期后恢复, 成功一次即清除失败计数
+    client._failures["balance"] = (1, 0)
+    stub["failing"].clear()
+    data, errors = client.fetch_all()
+    client.close()
+    assert errors == {} and data["balance"] == RESPONSES["balance"]
+    assert "balance" not in client._failures
+
+
+def test_backoff_grows_exponentially_and_is_capped(stub):
+    client = kq4.FreqtradeApiClient("127.0.0.1", stub["port"], "u", "p")
+    stub["failing"].add("status")
+    delays = []
+    for _ in range(8):
+        client._failures["status"] = (client._failures.get("status", (0, 0))[0], 0)  # 跳过等待
+        with pytest.raises(kq4.ApiError):
+            client.get("status")
+        fails, retry_at = client._failures["status"]
+        delays.append(round(retry_at - kq4.time.monotonic()))
+    client.close()
+    assert delays == [min(2 ** i, kq4.API_BACKOFF_MAX) for i in range(8)]
+
+
+def test_auth_and_connection_errors(stub):
+    bad = kq4.FreqtradeApiClient("127.0.0.1", stub["port"], "u", "wrong")
+    assert bad.fetch_all(["profit"])[1]["profit"].startswith("认证失败")
+    bad.close()
+    down = kq4.FreqtradeApiClient("127.0.0.1", free_port(), "u", "p", timeout=1)
+    assert down.fetch_all(["profit"])[1]["profit"].startswith("连接失败")
+    down.close()
+
+
+def free_port():
+    """取一个当前没有监听的本地端口"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
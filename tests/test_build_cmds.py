@@ -0,0 +1,82 @@
+import json
+import os
+
+import pytest
+
+import kq4
+
+PAIRS = ["BTC/USDT:USDT", "ETH/USDT:USDT"]
+
+
+def dry_run(capsys, *argv):
+    assert kq4.cli_main([*argv, "--dry-run", "--json"]) == 0
+    return json.loads(capsys.readouterr().out)["cmds"]
+
+
+def test_cli_matches_lab_builders(capsys):
+    # 实验室按钮: 最近 30 天, 合约模式, 指令由同一组构建函数生成
+    args = ["--config", "config_x.json", "--pairs", *PAIRS, "--days", "30"]
+    lab_dl = kq4.build_download_cmds("config_x.json", [(["5m", "1h"], kq4.time_flags(30), PAIRS)], kq4.trading_mode_flag(True))
+    assert dry_run(capsys, "download", *args, "--timeframes", "5m", "1h") == lab_dl
+    flag = kq4.time_flags(30, is_backtest=True)
+    assert flag.startswith("--timerange ")
+    lab_bt = kq4.build_backtest_cmd("config_x.json", flag, PAIRS, "MyStrat", True)
+    assert dry_run(capsys, "backtest", *args, "--strategy", "MyStrat") == [lab_bt]
+    lab_ho = kq4.build_hyperopt_cmd("config_x.json", flag, PAIRS, "MyStrat", "SharpeHyperOptLoss", ["buy"], "200", "3")
+    assert dry_run(capsys, "hyperopt", *args, "--strategy", "MyStrat", "--spaces", "buy", "--epochs", "200",
+                   "--jobs", "3") == [lab_ho]
+
+
+def test_spec_defaults_follow_lab():
+    spec = {"kind": "hyperopt", "strategy": "S", "timerange": "20240101-20240201"}
+    jobs = kq4.ResourceGovernor(kq4.max_concurrent_jobs()).plan("hyperopt")["jobs"]
+    assert kq4.build_job_cmds(spec) == [kq4.build_hyperopt_cmd("config.json", "--timerange 20240101-20240201", [], "S",
+                                                               "SharpeHyperOptLoss", [], "100", str(jobs))]
+    dl = kq4.build_job_cmds({"kind": "download", "days": 2})[0]
+    assert "--trading-mode futures" in dl and dl.endswith("-t " + " ".join(kq4.HEADLESS_TIMEFRAMES))
+
+
+@pytest.mark.parametrize("spec", [
+    {"kind": "backtest", "strategy": "S; rm -rf /", "days": 1},
+    {"kind": "backtest", "strategy": "S", "days": 1, "config": "../../etc/passwd"},
+    {"kind": "backtest", "strategy": "S", "days": 1, "pairs": ["BTC/USDT", "--export-filename=/tmp/x"]},
+    {"kind": "backtest", "strategy": "S", "days": 1, "timeframe": "5m 1h"},
+    {"kind": "backtest", "strategy": "S $(id)", "days": 1},
+    {"kind": "hyperopt", "strategy": "S", "days": 1, "loss": "L`id`"},
+    {"kind": "hyperopt", "strategy": "S", "days": 1, "epochs": "ten"},
+    {"kind": "download", "timerange": "2024|2025"},
+    {"kind": "download"},
+    {"kind": "backtest", "days": 1},
+    {"kind": "shell", "days": 1},
+    {"cmd": "touch /tmp/x"},
+])
+def test_invalid_specs_are_rejected(spec):
+    with pytest.raises(ValueError):
+        kq4.build_job_cmds(spec)
+
+
+def test_spec_tokens():
+    assert kq4.spec_tokens("BTC/USDT:USDT  ETH/USDT", "pairs") == ["BTC/USDT:USDT", "ETH/USDT"]
+    assert kq4.spec_tokens(["1m", 5], "timeframes") == ["1m", "5"]
+    assert kq4.spec_tokens(None, "pairs") == []
+    assert kq4.spec_token("20240101-20240201", "timerange") == "20240101-20240201"
+    for bad in ("-x", "a'b", 'a"b', "a\\b", "a>b", "a..b", "~/x"):
+        with pytest.raises(ValueError):
+            kq4.spec_tokens([bad], "f")
+    with pytest.raises(ValueError):
+        kq4.spec_token("", "strategy")
+    assert kq4.build_job_cmds({"cmd": "echo hi"}, allow_cmd=True) == ["echo hi"]
+
+
+def test_shard_build_is_pure_and_files_are_written_at_run_time(tmp_path, monkeypatch):
+    monkeypatch.setattr(kq4, "APP_ROOT", str(tmp_path))
+    monkeypatch.setattr(kq4, "SHARD_DIR", str(tmp_path / "user_data" / "kq4_shards"))
+    pairs = [f"P{i}/USDT" for i in range(25)]
+    cmds = kq4.build_job_cmds({"kind": "download", "days": 1, "pairs": pairs, "timeframes": ["5m", "1h"], "shard": True})
+    # 2 个周期 × 3 个币种块, 每条叠加 4 路并行的限速配置; 构建时不写文件
+    assert len(cmds) == 6 and all("--config user_data/kq4_shards/ratelimit_default_4.json" in c for c in cmds)
+    assert not os.path.exists(tmp_path / "user_data")
+    kq4.write_rate_limit_configs(cmds[0])
+    with open(tmp_path / "user_data" / "kq4_shards" / "ratelimit_default_4.json", encoding="utf-8") as f:
+        limits = json.load(f)["exchange"]["ccxt_config"]
+    assert limits == {"enableRateLimit": True, "rateLimit": 1000 * 4 // kq4.DL_DEFAULT_RATE}
@@ -0,0 +1,107 @@
+import json
+import os
+import time
+
+import pytest
+from PySide6.QtCore import QCoreApplication
+from PySide6.QtWidgets import QApplication
+
+import kq4
+
+
+@pytest.fixture
+def store():
+    app = QCoreApplication.instance() or QApplication([])
+    s = kq4.ConfigStore()
+    yield s
+    s.timer.stop()
+    del app
+
+
+def write(path, data):
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+
+def read(path):
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def wait_until(cond, timeout=3):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        QCoreApplication.processEvents()
+        if cond(): return True
+        time.sleep(0.01)
+    return False
+
+
+def test_get_parses_once_and_returns_copies(tmp_path, store):
+    path = tmp_path / "config.json"
+    write(path, {"a": {"b": 1}})
+    first = store.get(str(path))
+    first["a"]["b"] = 99
+    assert store.get(str(path)) == {"a": {"b": 1}} and store.loads == 1
+    write(path, {"a": {"b": 22}})  # 大小变化: 重新解析
+    assert store.get(str(path)) == {"a": {"b": 22}} and store.loads == 2
+    with pytest.raises(OSError):
+        store.get(str(tmp_path / "missing.json"))
+
+
+def test_updates_are_debounced_into_one_atomic_write(tmp_path, store):
+    path = tmp_path / "config.json"
+    write(path, {"dry_run": True, "max_open_trades": 3})
+    for n in range(5): store.set(str(path), "max_open_trades", n)
+    store.set(str(path), "dry_run", False)
+    # 防抖期间磁盘不变, 但 get() 已包含排队的修改
+    assert read(path)["max_open_trades"] == 3
+    assert store.get(str(path)) == {"dry_run": False, "max_open_trades": 4}
+    assert wait_until(lambda: store.writes == 1)
+    assert read(path) == {"dry_run": False, "max_open_trades": 4}
+    assert store.writes == 1 and os.listdir(tmp_path) == ["config.json"]  # 临时文件已替换掉
+
+
+def test_flush_applies_edits_on_top_of_external_changes(tmp_path, store):
+    path = tmp_path / "config.json"
+    write(path, {"a": 1})
+    store.get(str(path))
+    store.set(str(path), "b", 2)
+    write(path, {"a": 10, "bot": "edited"})  # 防抖期间机器人/手工修改了文件
+    store.flush()
+    assert read(path) == {"a": 10, "bot": "edited", "b": 2} and not store.pending
+
+
+def test_failed_write_keeps_original_and_pending_edits(tmp_path, store, monkeypatch):
+    path = tmp_path / "config.json"
+    write(path, {"a": 1})
+    errors = []
+    store.error.connect(errors.append)
+    store.set(str(path), "a", 2)
+
+    def broken_replace(src, dst):
+        raise OSError("disk full")
+    monkeypatch.setattr(kq4.os, "replace", broken_replace)
+    store.flush()
+    assert read(path) == {"a": 1} and errors and os.listdir(tmp_path) == ["config.json"]
+    monkeypatch.undo()
+    store.flush()
+    assert read(path) == {"a": 2}
+
+
+def test_external_change_emits_changed(tmp_path, store):
+    path = tmp_path / "config.json"
+    write(path, {"a": 1})
+    changed = []
+    store.changed.connect(changed.append)
+    store.set(str(path), "a", 2)
+    store.flush()
+    QCoreApplication.processEvents()
+    assert changed == []  # 自己写入的不算外部修改
+    write(path, {"a": 3, "note": "hand edit"})
+    assert wait_until(lambda: changed)
+    assert changed[0] == store._key(str(path)) and store.get(str(path))["a"] == 3
+
+
+def test_list_configs_skips_state_files(tmp_path, store):
+    for name in ("config.json", "config_x.json", os.path.basename(kq4.JOBS_PATH), "notes.txt"):
+        (tmp_path / name).write_text("{}", encoding="utf-8")
+    assert store.list_configs(str(tmp_path)) == ["config.json", "config_x.json"]
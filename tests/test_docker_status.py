@@ -0,0 +1,97 @@
+import threading
+import time
+
+import kq4
+
+
+class FakeEvents:
+    """假事件源: 依次给出 events; hold=True 时之后一直阻塞, 直到 close() (模拟 docker compose events)"""
+    def __init__(self, events, hold=True):
+        self.events = events
+        self.hold = hold
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        yield from self.events
+        if self.hold: self.closed.wait(5)
+
+    def close(self):
+        self.closed.set()
+
+
+def wait_until(cond, timeout=3):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if cond(): return True
+        time.sleep(0.01)
+    return False
+
+
+def make_engine(snapshot=lambda: {}, factory=lambda: FakeEvents([]), **kw):
+    changes, modes = [], []
+    engine = kq4.DockerStatusEngine(lambda svc, st: changes.append((svc, st)), modes.append,
+                                    event_source_factory=factory, snapshot=snapshot, **kw)
+    return engine, changes, modes
+
+
+def test_apply_event_maps_actions_and_skips_duplicates():
+    engine, changes, _ = make_engine()
+    engine.apply_event({"service": "freqtrade", "action": "start"})
+    engine.apply_event({"service": "freqtrade", "action": "start"})  # 状态未变, 不通知
+    engine.apply_event({"service": "freqtrade", "action": "health_status: healthy"})
+    engine.apply_event({"attributes": {"com.docker.compose.service": "freqtrade"}, "status": "die"})
+    engine.apply_event({"type": "network", "service": "freqtrade", "action": "destroy"})  # 非容器事件忽略
+    engine.apply_event({"service": "freqtrade", "action": "exec_start: sh"})              # 无关动作忽略
+    assert changes == [("freqtrade", "running"), ("freqtrade", "healthy"), ("freqtrade", "exited")]
+
+
+def test_sync_marks_missing_services_removed_and_errors_unknown():
+    snapshots = [{"freqtrade": "running", "db": "running"}, {"freqtrade": "running"}]
+    engine, changes, _ = make_engine(snapshot=lambda: snapshots.pop(0))
+    engine.sync()
+    engine.sync()
+    assert changes[-1] == ("db", "removed")
+
+    def broken():
+        raise RuntimeError("docker 未启动")
+    engine.snapshot = broken
+    engine.sync()
+    assert engine.states == {"freqtrade": "unknown", "db": "unknown"}
+
+
+def test_run_follows_event_stream_and_stop_closes_it():
+    sources = []
+
+    def factory():
+        sources.append(FakeEvents([{"service": "freqtrade", "action": "die"}]))
+        return sources[-1]
+    engine, changes, modes = make_engine(snapshot=lambda: {"freqtrade": "running"}, factory=factory)
+    thread = threading.Thread(target=engine.run)
+    thread.start()
+    assert wait_until(lambda: ("freqtrade", "exited") in changes)
+    assert modes == ["events"] and changes[0] == ("freqtrade", "running")
+    engine.stop()
+    thread.join(2)
+    assert not thread.is_alive() and sources[0].closed.is_set()
+
+
+def test_run_falls_back_to_polling_and_reconnects():
+    calls = []
+
+    def snapshot():
+        calls.append(time.monotonic())
+        return {"freqtrade": "running"}
+    # 事件流立即结束: 退避 1 秒内按 poll_sec 轮询, 然后重新连接事件流
+    factories = []
+
+    def factory():
+        factories.append(1)
+        return FakeEvents([], hold=False)
+    engine, _, modes = make_engine(snapshot=snapshot, factory=factory, poll_sec=0.05, backoff_max=1)
+    thread = threading.Thread(target=engine.run)
+    thread.start()
+    assert wait_until(lambda: len(factories) >= 2)
+    engine.stop()
+    thread.join(2)
+    assert modes[:3] == ["events", "polling", "events"]
+    assert len(calls) >= 5  # 降级期间持续轮询
@@ -0,0 +1,56 @@
+import json
+import random
+
+import kq4
+
+
+def write_fthypt(path, epochs):
+    with open(path, "w", encoding="utf-8") as f:
+        for e in epochs: f.write((json.dumps(e) if isinstance(e, dict) else e) + "\n")
+    return str(path)
+
+
+def test_top_n_matches_full_sort(tmp_path):
+    rnd = random.Random(3)
+    epochs = [{"current_epoch": i, "loss": rnd.uniform(-5, 5)} for i in range(1, 501)]
+    path = write_fthypt(tmp_path / "a.fthypt", epochs)
+    top, count = kq4.top_fthypt_epochs(path, 10)
+    assert count == 500
+    assert [e["current_epoch"] for _, e in top] == [e["current_epoch"] for e in sorted(epochs, key=lambda e: e["loss"])[:10]]
+    assert [s for s, _ in top] == sorted(s for s, _ in top)
+    assert kq4.best_fthypt_epoch(path) == top[0][1]
+
+
+def test_skips_bad_lines_and_keeps_earliest_on_ties(tmp_path):
+    path = write_fthypt(tmp_path / "b.fthypt", [
+        {"current_epoch": 1, "loss": 2.0}, "{broken", "", {"current_epoch": 2, "loss": None},
+        {"current_epoch": 3, "loss": 1.0}, {"current_epoch": 4, "loss": float("nan")},
+        {"current_epoch": 5, "loss": 1.0}, {"current_epoch": 6, "loss": 1.0}])
+    top, count = kq4.top_fthypt_epochs(path, 2)
+    assert count == 6  # 无法解析的行不计入
+    assert [(s, e["current_epoch"]) for s, e in top] == [(1.0, 3), (1.0, 5)]
+    assert kq4.top_fthypt_epochs(str(tmp_path / "b.fthypt"), 10)[0][-1][1]["current_epoch"] == 1
+
+
+def test_rescore_with_selected_loss(tmp_path):
+    metrics = [{"sharpe": 1.0, "profit_total_abs": 50}, {"sharpe": 3.0, "profit_total_abs": 10},
+               {"sharpe": 2.0, "profit_total_abs": 90}, {}]
+    path = write_fthypt(tmp_path / "c.fthypt", [{"current_epoch": i, "loss": 10 - i, "results_metrics": m}
+                                                for i, m in enumerate(metrics)])
+    by_sharpe = kq4.top_fthypt_epochs(path, 3, "SharpeHyperOptLoss")[0]
+    assert [(s, e["current_epoch"]) for s, e in by_sharpe] == [(-3.0, 1), (-2.0, 2), (-1.0, 0)]
+    # 缺少指标的 epoch 退回文件中的 loss
+    by_profit = kq4.top_fthypt_epochs(path, 4, "OnlyProfitHyperOptLoss")[0]
+    assert [e["current_epoch"] for _, e in by_profit] == [2, 0, 1, 3]
+
+
+def test_progress_can_stop_reading(tmp_path, monkeypatch):
+    monkeypatch.setattr(kq4, "FTHYPT_PROGRESS_LINES", 10)
+    path = write_fthypt(tmp_path / "d.fthypt", [{"loss": float(i)} for i in range(100)])
+    seen = []
+
+    def progress(done, total):
+        seen.append((done, total))
+        return len(seen) < 3
+    _, count = kq4.top_fthypt_epochs(path, 5, progress=progress)
+    assert count == 29 and len(seen) == 3 and all(0 < d < t for d, t in seen)
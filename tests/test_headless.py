@@ -0,0 +1,98 @@
+import http.client
+import json
+import threading
+import time
+
+import pytest
+
+import kq4
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """无界面 HTTP 接口: run_headless 换成假实现 (每条指令写 3 行日志), 日志写到临时目录"""
+    monkeypatch.setattr(kq4, "JOB_LOG_DIR", str(tmp_path))
+
+    def fake_run(cmd, outs=(), log_path=None, cancel=None):
+        log = kq4.JobLog(log_path)
+        log.write_lines([f"{cmd.split()[-1]} {i}" for i in range(3)])
+        log.close()
+        return {"cmd": cmd, "status": "done", "log": log_path}
+    monkeypatch.setattr(kq4, "run_headless", fake_run)
+    ready = threading.Event()
+    holder = {}
+
+    def on_ready(srv):
+        holder["srv"] = srv
+        ready.set()
+    threading.Thread(target=kq4.serve_headless, kwargs={"port": 0, "ready": on_ready, "token": "t0ken"},
+                     daemon=True).start()
+    assert ready.wait(5)
+    yield holder["srv"]
+    holder["srv"].shutdown()
+
+
+def call(srv, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", srv.server_address[1], timeout=5)
+    conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                 headers=headers or {"Authorization": "Bearer t0ken"})
+    resp = conn.getresponse()
+    data = resp.read().decode()
+    conn.close()
+    return resp.status, data
+
+
+def submit_and_wait(srv, spec):
+    status, data = call(srv, "POST", "/jobs", spec)
+    assert status == 202
+    job_id = json.loads(data)["id"]
+    deadline = time.monotonic() + 5
+    while json.loads(call(srv, "GET", f"/jobs/{job_id}")[1])["status"] in ("queued", "running"):
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    return job_id
+
+
+def test_log_offset_across_commands_and_bad_offset(server):
+    job_id = submit_and_wait(server, {"kind": "download", "days": 1, "timeframes": ["5m", "1h"], "shard": True})
+    status, text = call(server, "GET", f"/jobs/{job_id}/log")
+    assert status == 200 and text.splitlines() == ["5m 0", "5m 1", "5m 2", "1h 0", "1h 1", "1h 2"]
+    assert call(server, "GET", f"/jobs/{job_id}/log?offset=4")[1].splitlines() == ["1h 1", "1h 2"]
+    assert call(server, "GET", f"/jobs/{job_id}/log?offset=6")[1] == ""
+    assert call(server, "GET", f"/jobs/{job_id}/log?offset=abc")[0] == 400
+    assert call(server, "GET", f"/jobs/{job_id}/log?offset=-1")[0] == 400
+
+
+def test_finished_jobs_are_capped(server, monkeypatch):
+    monkeypatch.setattr(kq4, "JOB_HISTORY_MAX", 2)
+    ids = [submit_and_wait(server, {"kind": "backtest", "strategy": "S", "days": 1}) for _ in range(4)]
+    listed = [j["id"] for j in json.loads(call(server, "GET", "/jobs")[1])]
+    assert listed == ids[-2:]
+    assert call(server, "GET", f"/jobs/{ids[0]}")[0] == 404
+
+
+def test_requests_need_token_and_loopback_host(server):
+    assert call(server, "GET", "/jobs", headers={"Authorization": "Bearer nope"})[0] == 401
+    assert call(server, "GET", "/jobs", headers={"Authorization": "Bearer t0ken", "Host": "evil.com"})[0] == 403
+    assert call(server, "POST", "/build", {"cmd": "touch /tmp/x"})[0] == 400
+
+
+def test_read_log_from_rotated_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(kq4, "LOG_SEGMENT_BYTES", 200)
+    monkeypatch.setattr(kq4, "LOG_INDEX_STRIDE", 5)
+    path = str(tmp_path / "job")
+    log = kq4.JobLog(path)
+    expected = [f"line {i:03d}" for i in range(100)]
+    for i in range(0, 100, 7): log.write_lines(expected[i:i + 7])
+    log.close()
+    assert len(kq4.log_segments(path)) > 3
+    for offset in (0, 1, 17, 55, 99, 100, 150):
+        assert kq4.read_log_from(path, offset) == (expected[offset:], 100)
+    assert kq4.read_log_context(path, 50, 2, 2) == [(i, expected[i]) for i in range(48, 53)]
+
+
+def test_read_log_from_skips_partial_last_line(tmp_path):
+    path = tmp_path / "lab_old.log"  # 旧版单文件日志, 正在写入
+    path.write_bytes(b"a\nb\nhalf")
+    assert kq4.read_log_from(str(path), 0) == (["a", "b"], 2)
+    assert kq4.read_log_from(str(path), 2) == ([], 2)
@@ -0,0 +1,47 @@
+import re
+
+import kq4
+
+
+def write_log(path, lines, batch=7):
+    log = kq4.JobLog(str(path))
+    for i in range(0, len(lines), batch): log.write_lines(lines[i:i + batch])
+    log.close()
+
+
+def test_rotation_compresses_old_segments_and_keeps_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(kq4, "LOG_SEGMENT_BYTES", 200)
+    lines = [f"line {i:03d}" for i in range(100)]
+    write_log(tmp_path / "job", lines)
+    segs = kq4.log_segments(str(tmp_path / "job"))
+    # 除最后一段外都已压缩; 段的起始行号首尾相接
+    assert len(segs) > 3 and all(s.endswith(".gz") for s in segs[:-1]) and segs[-1].endswith(".log")
+    index = kq4.load_log_index(str(tmp_path / "job"))["segments"]
+    firsts = [meta["first_line"] for _, meta in sorted(index.items())]
+    assert firsts[0] == 0 and firsts == sorted(firsts) and sum(m["lines"] for m in index.values()) == 100
+    assert list(kq4.iter_log_lines(str(tmp_path / "job"))) == lines
+
+    # 任务重新运行时接着写, 行号继续累加
+    write_log(tmp_path / "job", ["again"])
+    assert kq4.read_log_from(str(tmp_path / "job"), 100) == (["again"], 101)
+
+
+def test_search_across_plain_and_compressed_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(kq4, "LOG_SEGMENT_BYTES", 300)
+    monkeypatch.setattr(kq4, "LOG_READ_CHUNK", 16)  # 换行计数也要跨块
+    lines = [f"{'ERROR' if i % 13 == 0 else 'info'} step {i}" for i in range(120)]
+    write_log(tmp_path / "job", lines)
+    hits, scanned = kq4.search_log(str(tmp_path / "job"), re.compile(rb"error", re.I))
+    assert hits == [(i, lines[i]) for i in range(0, 120, 13)] and scanned > 0
+    hits, _ = kq4.search_log(str(tmp_path / "job"), re.compile(rb"ERROR"), limit=3)
+    assert [n for n, _ in hits] == [0, 13, 26]
+    assert kq4.search_log(str(tmp_path / "missing"), re.compile(rb"x")) == ([], 0)
+
+
+def test_scan_buffer_counts_lines_without_hits(monkeypatch):
+    monkeypatch.setattr(kq4, "LOG_READ_CHUNK", 4)
+    buf = b"aa\nbb\nxx cc\ndd\n" * 3
+    hits = []
+    assert kq4._scan_buffer(buf, re.compile(rb"cc"), 10, hits, 100) == 12
+    assert hits == [(12, "xx cc"), (16, "xx cc"), (20, "xx cc")]
+    assert kq4._scan_buffer(bytearray(buf), re.compile(rb"zz"), 0, [], 100) == 12
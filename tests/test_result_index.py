@@ -0,0 +1,84 @@
+import json
+import os
+import sqlite3
+import zipfile
+
+import pytest
+
+import kq4
+
+
+def backtest_export(profit=0.12, trades=2):
+    return {"strategy": {"MyStrat": {
+        "timeframe": "5m", "backtest_start": "2024-01-01 00:00:00", "backtest_end": "2024-02-01 00:00:00",
+        "backtest_run_end_ts": 1_700_000_000, "total_trades": trades, "wins": 1, "profit_total": profit,
+        "profit_total_abs": profit * 1000, "max_drawdown_account": 0.05, "sharpe": 1.5,
+        "results_per_pair": [{"key": "BTC/USDT", "trades": trades, "profit_total": profit, "profit_total_abs": 120,
+                              "wins": 1, "duration_avg": "1:00:00"},
+                             {"key": "TOTAL", "trades": trades}],
+        "trades": [{"pair": "BTC/USDT", "open_date": "2024-01-02", "close_date": "2024-01-03", "profit_ratio": 0.1,
+                    "profit_abs": 100, "trade_duration": 60, "exit_reason": "roi"}] * trades}}}
+
+
+@pytest.fixture
+def results(tmp_path, monkeypatch):
+    """临时 user_data: 一个 zip 导出、一个旧版 json 导出、一个优化结果"""
+    monkeypatch.setattr(kq4, "USER_DATA_DIR", str(tmp_path))
+    bt, ho = tmp_path / "backtest_results", tmp_path / "hyperopt_results"
+    bt.mkdir()
+    ho.mkdir()
+    with zipfile.ZipFile(bt / "backtest-result-2024-01-01_00-00-00.zip", "w") as zf:
+        zf.writestr("backtest-result-2024-01-01_00-00-00.json", json.dumps(backtest_export()))
+        zf.writestr("backtest-result-2024-01-01_00-00-00_config.json", "{}")
+    (bt / "backtest-result-2024-01-02_00-00-00.json").write_text(json.dumps(backtest_export(0.3, 3)), encoding="utf-8")
+    (bt / "backtest-result-2024-01-02_00-00-00.meta.json").write_text("{}", encoding="utf-8")
+    epochs = [{"loss": loss, "results_metrics": {"total_trades": 7, "profit_total": 0.2, "profit_total_abs": 200,
+                                                 "max_drawdown_account": 0.1}} for loss in (-1.0, -3.0, -2.0)]
+    (ho / "strategy_MyStrat_2024-01-05_10-00-00.fthypt").write_text("\n".join(map(json.dumps, epochs)), encoding="utf-8")
+    monkeypatch.setattr(kq4, "BACKTEST_RESULTS_DIR", str(bt))
+    monkeypatch.setattr(kq4, "HYPEROPT_RESULTS_DIR", str(ho))
+    return tmp_path
+
+
+def query(db, sql):
+    conn = sqlite3.connect(db)
+    rows = conn.execute(sql).fetchall()
+    conn.close()
+    return rows
+
+
+def test_ingest_backtests_and_hyperopt(results):
+    db = str(results / "index.sqlite")
+    assert kq4.ResultIndex(db).ingest() == (3, 0, 0, 0)
+    runs = query(db, "SELECT kind, strategy, trades, profit_pct, winrate, best_loss, epochs FROM runs ORDER BY kind, trades")
+    assert runs[0][:5] == ("backtest", "MyStrat", 2, 12.0, 50.0)
+    assert runs[1][2:4] == (3, 30.0)
+    assert runs[2] == ("hyperopt", "MyStrat", 7, 20.0, None, -3.0, 3)
+    # TOTAL 行不算作币种
+    assert query(db, "SELECT pair, COUNT(*) FROM pair_stats GROUP BY pair") == [("BTC/USDT", 2)]
+    assert query(db, "SELECT COUNT(*) FROM trades") == [(5,)]
+
+
+def test_reingest_skips_unchanged_and_replaces_changed(results):
+    db = str(results / "index.sqlite")
+    index = kq4.ResultIndex(db)
+    index.ingest()
+    assert index.ingest() == (0, 3, 0, 0)
+    legacy = results / "backtest_results" / "backtest-result-2024-01-02_00-00-00.json"
+    os.utime(legacy, ns=(1, 1))  # 只改修改时间: 哈希相同, 不重新导入
+    assert index.ingest() == (0, 3, 0, 0)
+    legacy.write_text(json.dumps(backtest_export(0.5, 4)), encoding="utf-8")
+    assert index.ingest() == (1, 2, 0, 0)
+    assert query(db, "SELECT trades, profit_pct FROM runs WHERE file LIKE '%01-02%'") == [(4, 50.0)]
+    assert query(db, "SELECT COUNT(*) FROM trades") == [(6,)]  # 旧明细已删除
+
+
+def test_deleted_and_broken_files(results):
+    db = str(results / "index.sqlite")
+    index = kq4.ResultIndex(db)
+    index.ingest()
+    os.remove(results / "hyperopt_results" / "strategy_MyStrat_2024-01-05_10-00-00.fthypt")
+    (results / "backtest_results" / "backtest-result-2024-01-03_00-00-00.zip").write_bytes(b"not a zip")
+    assert index.ingest() == (0, 2, 1, 1)
+    assert query(db, "SELECT kind FROM runs") == [("backtest",), ("backtest",)]
+    assert query(db, "SELECT COUNT(*) FROM files") == [(2,)]
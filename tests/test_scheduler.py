@@ -0,0 +1,86 @@
+import json
+
+import pytest
+from PySide6.QtCore import QCoreApplication
+
+import kq4
+
+BACKTEST = "docker compose run --rm freqtrade backtesting --config user_data/config.json --strategy S"
+
+
+@pytest.fixture
+def scheduler_at(tmp_path, monkeypatch):
+    """在临时目录中创建调度器 (任务日志清理也只作用于临时目录)"""
+    app = QCoreApplication.instance() or QCoreApplication([])
+    monkeypatch.setattr(kq4, "JOB_LOG_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setattr(kq4, "LOG_DIR", str(tmp_path / "logs"))
+    made = []
+
+    def make(path, **kw):
+        made.append(kq4.JobScheduler(path=str(path), **kw))
+        return made[-1]
+    yield make
+    for s in made: s.watchdog.stop()
+    del app
+
+
+def job_dict(cmd, status, priority=1, created=0.0, **fields):
+    job = kq4.LabJob(cmd, priority, **fields)
+    job.status, job.created = status, created
+    if status != "queued": job.started = created + 1
+    return job.to_dict()
+
+
+def test_unfinished_jobs_resume_as_queued(tmp_path, scheduler_at):
+    path = tmp_path / "lab_jobs.json"
+    saved = [job_dict(BACKTEST, "running", created=1.0, timeout=60),
+             job_dict(BACKTEST + " --timeframe 1h", "done", created=2.0, returncode=0, metrics={"profit": 1.5}),
+             job_dict(BACKTEST + " --timeframe 4h", "queued", priority=0, created=3.0, force=True)]
+    path.write_text(json.dumps(saved), encoding="utf-8")
+    jobs = scheduler_at(path).jobs
+    running, done, queued = (jobs[d["id"]] for d in saved)
+    # 上次退出时在运行的任务重新排队; 其余字段原样恢复
+    assert (running.status, running.started, running.timeout) == ("queued", None, 60)
+    assert (done.status, done.returncode, done.metrics) == ("done", 0, {"profit": 1.5})
+    assert (queued.priority, queued.force, queued.kind) == (0, True, "backtest")
+
+
+def test_save_and_reload_round_trip(tmp_path, scheduler_at):
+    path = tmp_path / "sub" / "lab_jobs.json"
+    first = scheduler_at(path)
+    for d in (job_dict(BACKTEST, "failed", returncode=2, group="g1"), job_dict(BACKTEST, "queued", patience=50)):
+        job = kq4.LabJob(d.pop("cmd"), **d)
+        first.jobs[job.id] = job
+    first.save()
+    assert not (tmp_path / "sub" / "lab_jobs.json.tmp").exists()
+    again = scheduler_at(path)
+    assert {k: j.to_dict() for k, j in again.jobs.items()} == {k: j.to_dict() for k, j in first.jobs.items()}
+
+    first.clear_finished()
+    assert [j.status for j in scheduler_at(path).jobs.values()] == ["queued"]
+
+
+def test_corrupt_or_missing_file_starts_empty(tmp_path, scheduler_at):
+    assert scheduler_at(tmp_path / "none.json").jobs == {}
+    (tmp_path / "bad.json").write_text("[{", encoding="utf-8")
+    assert scheduler_at(tmp_path / "bad.json").jobs == {}
+
+
+def test_resumed_queue_starts_by_priority(tmp_path, scheduler_at, monkeypatch):
+    path = tmp_path / "lab_jobs.json"
+    saved = [job_dict(BACKTEST, "running", priority=1, created=1.0),
+             job_dict(BACKTEST, "queued", priority=0, created=2.0),
+             job_dict(BACKTEST, "queued", priority=1, created=0.5)]
+    path.write_text(json.dumps(saved), encoding="utf-8")
+    scheduler = scheduler_at(path, max_running=1)
+    started = []
+
+    def fake_start(job):
+        job.status = "running"
+        started.append(job.id)
+    monkeypatch.setattr(scheduler, "start_job", fake_start)
+    scheduler.schedule()
+    assert started == [saved[1]["id"]]  # 并发上限 1: 只启动优先级最高的
+    scheduler.jobs[started[0]].status = "done"
+    scheduler.schedule()
+    assert started == [saved[1]["id"], saved[2]["id"]]  # 同优先级按提交时间
@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+
+import kq4
+
+
+def stats_line(name, mem_pct, cpu=10.0, block_in="0B", pids="5"):
+    return json.dumps({"Name": name, "CPUPerc": f"{cpu}%", "MemPerc": f"{mem_pct}%",
+                       "MemUsage": "900MiB / 1GiB", "BlockIO": f"{block_in} / 0B", "NetIO": "0B / 0B",
+                       "PIDs": pids})
+
+
+def make_engine(**kw):
+    alerts = []
+    engine = kq4.TelemetryEngine(on_alert=lambda *a: alerts.append(a[:2]), alert_pct=90, clear_pct=80,
+                                 clock=lambda: 0.0, **kw)
+    return engine, alerts
+
+
+def test_parse_stats_line():
+    sample = kq4.parse_stats_line("\x1b[2J\x1b[H" + stats_line("ft", 45.5, cpu=123.4, block_in="1.5MB"))
+    assert sample["name"] == "ft" and sample["cpu"] == 123.4 and sample["mem_pct"] == 45.5
+    assert sample["mem"] == 900 * 2**20 and sample["mem_limit"] == 2**30 and sample["io"] == 1.5e6
+    assert kq4.parse_stats_line("NAME   CPU %") is None
+    assert kq4.parse_stats_line(json.dumps({"Name": "ft", "CPUPerc": "--", "MemPerc": "--"}))["cpu"] == 0.0
+
+
+def test_memory_alert_hysteresis():
+    engine, alerts = make_engine()
+    for t, pct in enumerate([85, 91, 95, 85, 89, 91, 79, 85, 92]):
+        engine.feed(stats_line("ft", pct), now=float(t))
+    # 达到 90% 告警, 回落到 80% 以下才解除; 80~90 之间的波动不重复告警
+    assert alerts == [("ft", True), ("ft", False), ("ft", True)]
+    assert engine.snapshot()["ft"]["alert"] is True
+
+
+def test_stale_container_is_dropped_and_alert_cleared():
+    engine, alerts = make_engine(stale_sec=10)
+    engine.feed(stats_line("ft", 95), now=0.0)
+    engine.feed(stats_line("db", 10), now=5.0)
+    engine.feed(stats_line("db", 10), now=20.0)
+    assert set(engine.snapshot()) == {"db"}
+    assert alerts == [("ft", True), ("ft", False)]
+
+
+def test_sweep_without_new_samples():
+    clock = [0.0]
+    alerts, samples = [], []
+    engine = kq4.TelemetryEngine(on_sample=samples.append, on_alert=lambda *a: alerts.append(a[:2]),
+                                 alert_pct=90, clear_pct=80, stale_sec=10, clock=lambda: clock[0])
+    engine.feed(stats_line("ft", 95))
+    clock[0] = 5.0
+    assert engine.sweep() == []
+    clock[0] = 11.0  # 最后一个容器停止后不再有数据行
+    assert engine.sweep() == ["ft"]
+    assert engine.snapshot() == {} and alerts == [("ft", True), ("ft", False)] and samples == ["ft", "ft"]
+
+
+def test_run_sweeps_when_stream_goes_quiet():
+    alerts = []
+    engine = kq4.TelemetryEngine(on_alert=lambda *a: alerts.append(a[:2]), source_factory=lambda: FakeStats([stats_line("ft", 95)]),
+                                 alert_pct=90, clear_pct=80, stale_sec=0.2)
+    thread = threading.Thread(target=engine.run)
+    thread.start()
+    deadline = time.monotonic() + 3
+    while len(alerts) < 2 and time.monotonic() < deadline: time.sleep(0.01)
+    engine.stop()
+    thread.join(2)
+    assert alerts == [("ft", True), ("ft", False)] and engine.snapshot() == {}
+
+
+def test_ring_history_and_io_rate():
+    engine, _ = make_engine(history=3)
+    for t, (cpu, block) in enumerate([(1, "0B"), (2, "1MB"), (3, "3MB"), (4, "3MB"), (5, "4MB")]):
+        engine.feed(stats_line("ft", 50, cpu=cpu, block_in=block), now=t * 2.0)
+    snap = engine.snapshot()["ft"]
+    assert snap["cpu"] == [3.0, 4.0, 5.0]  # 只保留最近 history 个, 旧 -> 新
+    assert snap["io"] == [1e6, 0.0, 5e5]    # 字节/秒 (采样间隔 2 秒)
+    assert snap["latest"]["io_rate"] == 5e5
+
+
+def test_ring_series_fixed_size():
+    ring = kq4.RingSeries(4)
+    for v in range(10): ring.push(v)
+    assert ring.values() == [6.0, 7.0, 8.0, 9.0] and len(ring.data) == 4
+
+
+class FakeStats:
+    """假 docker stats 数据流: 给出 lines 后阻塞到 close()"""
+    def __init__(self, lines):
+        self.lines = lines
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        yield from self.lines
+        self.closed.wait(5)
+
+    def close(self):
+        self.closed.set()
+
+
+def test_run_pauses_and_resumes_stream():
+    sources, samples = [], []
+
+    def factory():
+        sources.append(FakeStats([stats_line("ft", 50)]))
+        return sources[-1]
+    engine = kq4.TelemetryEngine(on_sample=samples.append, source_factory=factory)
+    thread = threading.Thread(target=engine.run)
+    thread.start()
+    deadline = time.monotonic() + 3
+    while not samples and time.monotonic() < deadline: time.sleep(0.01)
+    engine.set_active(False)  # 关闭时结束数据流
+    assert sources[0].closed.wait(2)
+    engine.set_active(True)   # 打开时立即重连
+    while len(sources) < 2 and time.monotonic() < deadline: time.sleep(0.01)
+    engine.stop()
+    thread.join(2)
+    assert not thread.is_alive() and len(sources) == 2 and samples[0] == "ft"
@@ -0,0 +1,83 @@
+import math
+import random
+
+import pytest
+
+import kq4
+
+pytest.importorskip("numpy")  # 没有 NumPy 时 analyze_trades 本身就退回纯 Python 实现, 比较无意义
+
+
+def random_trades(n, days, seed=7):
+    rnd = random.Random(seed)
+    start = 1_700_000_000_000
+    cols = {"pair": [], "close_ts": [], "profit_abs": [], "profit_ratio": []}
+    for _ in range(n):
+        ratio = rnd.gauss(0.001, 0.02)
+        cols["pair"].append(f"P{rnd.randrange(12)}/USDT")
+        cols["close_ts"].append(start + rnd.randrange(days * kq4.DAY_MS))
+        cols["profit_ratio"].append(ratio)
+        cols["profit_abs"].append(ratio * 100)
+    return cols
+
+
+@pytest.mark.parametrize("n, days", [(1, 1), (50, 10), (3000, 400)])
+def test_numpy_matches_reference(n, days):
+    cols = random_trades(n, days)
+    fast = kq4.analyze_trades(cols, 10_000)
+    ref = kq4.analyze_trades_py(cols, 10_000)
+    assert kq4.same_result(fast, ref)
+    assert fast["trades"] == n
+    # 天数少于滚动窗口时没有滚动指标
+    assert (len(fast["rolling"]["sharpe"]) == 0) == (fast["days"] < kq4.ROLLING_DAYS)
+
+
+def test_unsorted_input_and_losing_streak():
+    # 乱序输入按平仓时间排序; 全部亏损时回撤等于总亏损
+    cols = {"pair": ["A/USDT", "B/USDT", "A/USDT"], "close_ts": [3 * kq4.DAY_MS, kq4.DAY_MS, 2 * kq4.DAY_MS],
+            "profit_abs": [-30.0, -10.0, -20.0], "profit_ratio": [-0.03, -0.01, -0.02]}
+    fast = kq4.analyze_trades(cols, 1000)
+    assert kq4.same_result(fast, kq4.analyze_trades_py(cols, 1000))
+    assert fast["equity"] == [990.0, 970.0, 940.0]
+    assert fast["max_dd_abs"] == pytest.approx(60.0)
+
+
+def test_near_constant_returns():
+    # 每天一笔相同 (或只差浮点噪声) 的收益: 滚动标准差应为 0, 夏普为 NaN, 两种实现一致
+    for noise in (0.0, 1e-13):
+        cols = {"pair": ["A/USDT"] * 90, "close_ts": [i * kq4.DAY_MS for i in range(90)],
+                "profit_abs": [1.0 + noise * (i % 3) for i in range(90)], "profit_ratio": [0.001] * 90}
+        fast = kq4.analyze_trades(cols, 10_000, window=30)
+        assert kq4.same_result(fast, kq4.analyze_trades_py(cols, 10_000, window=30))
+        assert len(fast["rolling"]["sharpe"]) == 61
+        assert all(math.isnan(v) for v in fast["rolling"]["sharpe"] + fast["rolling"]["sortino"])
+
+
+def test_equal_profit_pairs_sorted_by_name():
+    cols = {"pair": ["C/USDT", "B/USDT", "A/USDT", "D/USDT"], "close_ts": [kq4.DAY_MS * i for i in range(4)],
+            "profit_abs": [5.0, 5.0, 5.0, 9.0], "profit_ratio": [0.01] * 4}
+    fast, ref = kq4.analyze_trades(cols, 1000), kq4.analyze_trades_py(cols, 1000)
+    assert [p[0] for p in fast["pairs"]] == [p[0] for p in ref["pairs"]] == ["D/USDT", "A/USDT", "B/USDT", "C/USDT"]
+
+
+def test_load_trade_columns_from_parsed_export():
+    data = {"strategy": {"S": {"starting_balance": 500, "trades": [
+        {"pair": "A/USDT", "close_timestamp": 2 * kq4.DAY_MS, "profit_abs": 1.5, "profit_ratio": 0.003},
+        {"pair": "B/USDT", "close_date": "1970-01-02T00:00:00+00:00", "profit_abs": -1, "profit_ratio": None}]}}}
+    cols, balance, strategy = kq4.load_trade_columns(data, "missing")
+    assert (balance, strategy) == (500.0, "S")
+    assert cols == {"pair": ["A/USDT", "B/USDT"], "close_ts": [2 * kq4.DAY_MS, kq4.DAY_MS],
+                    "profit_abs": [1.5, -1.0], "profit_ratio": [0.003, 0.0]}
+
+
+def test_empty_input():
+    cols = {"pair": [], "close_ts": [], "profit_abs": [], "profit_ratio": []}
+    assert kq4.analyze_trades(cols, 1000) is None and kq4.analyze_trades_py(cols, 1000) is None
+
+
+def test_same_result_detects_differences():
+    ref = kq4.analyze_trades_py(random_trades(200, 60), 10_000)
+    changed = dict(ref, equity=ref["equity"][:-1] + [ref["equity"][-1] + 1])
+    assert kq4.same_result(ref, ref)
+    assert not kq4.same_result(ref, changed)
+    assert kq4.same_result({"x": float("nan")}, {"x": float("nan")})